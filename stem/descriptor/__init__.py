@@ -33,10 +33,14 @@ Package for parsing and processing descriptor data.
   **ENTRIES**         Iterates over the contained :class:`~stem.descriptor.router_status_entry.RouterStatusEntry`. Each has a reference to the bare document it came from (through its **document** attribute).
   **DOCUMENT**        :class:`~stem.descriptor.networkstatus.NetworkStatusDocument` with the :class:`~stem.descriptor.router_status_entry.RouterStatusEntry` it contains (through its **routers** attribute).
   **BARE_DOCUMENT**   :class:`~stem.descriptor.networkstatus.NetworkStatusDocument` **without** a reference to its contents (the :class:`~stem.descriptor.router_status_entry.RouterStatusEntry` are unread).
+  **COLUMNAR**        :class:`~stem.descriptor.router_status_table.RouterStatusTable` with the attributes of the router status entries in parallel columns. This has a reference to the bare document it came from (through its **document** attribute).
   =================== ===========
 """
 
 __all__ = [
+  'cache',
+  'consensus_history',
+  'descriptor_store',
   'export',
   'reader',
   'remote',
@@ -44,16 +48,28 @@ __all__ = [
   'server_descriptor',
   'microdescriptor',
   'networkstatus',
+  'profiler',
+  'relay_selection',
   'router_status_entry',
+  'router_status_table',
+  'router_status_index',
   'tordnsel',
+  'vote_aggregation',
   'parse_file',
   'Descriptor',
 ]
 
+import base64
+import binascii
 import copy
+import functools
+import io
+import mmap
+import multiprocessing
 import os
 import re
 import tarfile
+import threading
 
 import stem.prereq
 import stem.util.enum
@@ -75,14 +91,62 @@ SPECIFIC_KEYWORD_LINE = '^(%%s)(?:[%s]+(.*))?$' % WHITESPACE
 PGP_BLOCK_START = re.compile('^-----BEGIN ([%s%s]+)-----$' % (KEYWORD_CHAR, WHITESPACE))
 PGP_BLOCK_END = '-----END %s-----'
 
+# Characters that are valid in keywords and pgp block types. The tokenizer
+# works on bytes and checks these with translate() rather than matching against
+# the above regexes, which is considerably faster.
+
+_KEYWORD_CHAR_BYTES = b'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-'
+_BLOCK_TYPE_CHAR_BYTES = _KEYWORD_CHAR_BYTES + b' \t'
+
+_KEYWORD_CACHE = {}  # mapping of keyword bytes to their unicode form
+
 DocumentHandler = stem.util.enum.UppercaseEnum(
   'ENTRIES',
   'DOCUMENT',
   'BARE_DOCUMENT',
+  'COLUMNAR',
 )
 
 
-def parse_file(descriptor_file, descriptor_type = None, validate = False, document_handler = DocumentHandler.ENTRIES, **kwargs):
+# Descriptor types for the files in tor's data directory, these can contain
+# multiple descriptors.
+
+CACHED_FILE_TYPES = {
+  'cached-descriptors': ('server-descriptor', 1, 0),
+  'cached-descriptors.new': ('server-descriptor', 1, 0),
+  'cached-extrainfo': ('extra-info', 1, 0),
+  'cached-extrainfo.new': ('extra-info', 1, 0),
+  'cached-microdescs': ('microdescriptor', 1, 0),
+  'cached-microdescs.new': ('microdescriptor', 1, 0),
+  'cached-consensus': ('network-status-consensus-3', 1, 0),
+  'cached-microdesc-consensus': ('network-status-microdesc-consensus-3', 1, 0),
+}
+
+# Content we aim to provide each parsing process at a time. Smaller chunks
+# balance better across processes but each has some overhead.
+
+POOL_CHUNK_SIZE = 1024 * 1024
+
+# Content we read from descriptor files at a time when finding where their
+# descriptors are. Files that are memory mapped are searched in place instead.
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+# ParserProfiler that's collecting statistics for our parsing functions, if
+# there is one (see stem.descriptor.profiler).
+
+_PROFILER = None
+
+# Values that many descriptors have in common (platforms, country codes,
+# unrecognized flags, etc) so descriptors can reference a single copy of them.
+# This is bounded, and reset with each network status document.
+
+INTERN_POOL_SIZE = 10000
+
+_INTERNED = {}  # mapping of value types to a {value => value} pool
+
+
+def parse_file(descriptor_file, descriptor_type = None, validate = False, document_handler = DocumentHandler.ENTRIES, use_mmap = False, workers = None, ordered = True, compact = False, cache = None, **kwargs):
   """
   Simple function to read the descriptor contents from a file, providing an
   iterator for its :class:`~stem.descriptor.__init__.Descriptor` contents.
@@ -133,22 +197,150 @@ def parse_file(descriptor_file, descriptor_type = None, validate = False, docume
 
     my_descriptor_file = open(descriptor_path, 'rb')
 
+  Large files, such as tor's cached-descriptors or monthly CollecTor archives,
+  can be read with **use_mmap**. This memory maps the file and finds descriptor
+  boundaries directly within the mapping. Descriptors then reference their
+  section of the mapping rather than holding a copy of their content. This is
+  only applicable if **descriptor_file** is a path.
+
+  Parsing is pure python, so it's limited to a single core. If you have more
+  at your disposal then **workers** can parse in a process pool. Files are
+  split at descriptor boundaries (or for archives, grouped by their members)
+  and these chunks are parsed in parallel. Descriptors are fully parsed by the
+  pool rather than lazy loaded. By default we provide them in the order they
+  appear, but if you don't care about order then **ordered** can be set to
+  **False** so we provide them as soon as they're available.
+
+  ::
+
+    for desc in parse_file('/tmp/server-descriptors-2014-12.tar', workers = 8):
+      print desc.nickname
+
+  If you only need a few attributes from server, extra-info, or
+  microdescriptors then you can provide them as **fields**. Only the lines
+  those attributes come from are parsed, other lines are skipped as we read
+  the descriptor and their attributes are left with default values. Network
+  status documents and their router status entries don't support this, so
+  providing fields for them raises a **ValueError**.
+
+  ::
+
+    for desc in parse_file('cached-descriptors', fields = ('fingerprint', 'published', 'exit_policy')):
+      print '%s: %s' % (desc.fingerprint, desc.exit_policy)
+
+  If you're keeping a lot of descriptors in memory then **compact** fully
+  parses each descriptor, then discards what was only needed to parse it and
+  any attributes that are empty or unset. Their attributes are the same as
+  they'd otherwise be. This is a modest saving: router status entries of a
+  consensus take around 1.1 KB apiece rather than 1.4 KB when validated (or
+  2.7 KB when lazy loaded), and entries of a vote take 1.8 KB rather than 2.0
+  KB (or 3.2 KB).
+
+  If you need a much smaller footprint (for instance, to keep a month of
+  consensuses in memory) then read documents with
+  **DocumentHandler.COLUMNAR** instead. This provides a
+  :class:`~stem.descriptor.router_status_table.RouterStatusTable` which takes
+  around 100 bytes per router status entry.
+
+  If you repeatedly read the same files then a
+  :class:`~stem.descriptor.cache.DescriptorCache` can persist their parsed
+  descriptors, so later reads load them rather than parsing them again. This
+  is only applicable if **descriptor_file** is a path.
+
+  ::
+
+    cache = DescriptorCache('/tmp/descriptor_cache')
+
+    for desc in parse_file('/tmp/server-descriptors-2014-12.tar', cache = cache):
+      print desc.nickname
+
   :param str,file,tarfile descriptor_file: path or opened file with the descriptor contents
   :param str descriptor_type: `descriptor type <https://collector.torproject.org/formats.html>`_, this is guessed if not provided
   :param bool validate: checks the validity of the descriptor's content if
     **True**, skips these checks otherwise
   :param stem.descriptor.__init__.DocumentHandler document_handler: method in
     which to parse the :class:`~stem.descriptor.networkstatus.NetworkStatusDocument`
+  :param bool use_mmap: memory maps the file rather than reading it if this
+    is a path
+  :param int workers: number of processes to parse with, if more than one
+  :param bool ordered: provides descriptors in the order they appear if
+    parsing with multiple processes, otherwise provides them as soon as
+    they're available
+  :param bool compact: fully parses descriptors and discards content that's
+    only needed for parsing them
+  :param stem.descriptor.cache.DescriptorCache cache: persistent cache to
+    load and save descriptors with if this is a path
   :param dict kwargs: additional arguments for the descriptor constructor
 
   :returns: iterator for :class:`~stem.descriptor.__init__.Descriptor` instances in the file
 
   :raises:
-    * **ValueError** if the contents is malformed and validate is True
+    * **ValueError** if the contents is malformed and validate is True, or
+      fields are provided for a network status document
     * **TypeError** if we can't match the contents of the file to a descriptor type
     * **IOError** if unable to read from the descriptor_file
   """
 
+  pool = _ParsingPool(workers, ordered) if (workers is not None and workers > 1) else None
+
+  try:
+    if cache is not None and isinstance(descriptor_file, (bytes, str_type)):
+      descriptors = _parse_file_with_cache(cache, descriptor_file, descriptor_type, validate, document_handler, use_mmap, pool, **kwargs)
+    else:
+      descriptors = _parse_file(descriptor_file, descriptor_type, validate, document_handler, use_mmap, pool, **kwargs)
+
+    for desc in descriptors:
+      if compact:
+        desc._compact()
+
+      yield desc
+  finally:
+    if pool:
+      pool.close()
+
+
+def _parse_file_with_cache(cache, descriptor_path, descriptor_type, validate, document_handler, use_mmap, pool, **kwargs):
+  """
+  Provides the descriptors of a file from our cache, or parses and caches them
+  if they aren't already there.
+
+  :param stem.descriptor.cache.DescriptorCache cache: cache for the file
+  :param str descriptor_path: file with the descriptor contents
+
+  :returns: iterator for :class:`~stem.descriptor.__init__.Descriptor` instances in the file
+  """
+
+  descriptors = cache.get(descriptor_path, descriptor_type, validate, document_handler, kwargs)
+
+  if descriptors is not None:
+    absolute_path = os.path.abspath(descriptor_path)
+
+    for desc in descriptors:
+      desc._set_path(absolute_path)
+      yield desc
+
+    return
+
+  writer = cache._writer(descriptor_path, descriptor_type, validate, document_handler, kwargs)
+
+  if writer is None:
+    for desc in _parse_file(descriptor_path, descriptor_type, validate, document_handler, use_mmap, pool, **kwargs):
+      yield desc
+
+    return
+
+  try:
+    for desc in _parse_file(descriptor_path, descriptor_type, validate, document_handler, use_mmap, pool, **kwargs):
+      writer.add(desc)
+      yield desc
+  except:
+    writer.discard()
+    raise
+
+  writer.commit()
+
+
+def _parse_file(descriptor_file, descriptor_type, validate, document_handler, use_mmap, pool, **kwargs):
   # Delegate to a helper if this is a path or tarfile.
 
   handler = None
@@ -162,7 +354,7 @@ def parse_file(descriptor_file, descriptor_type = None, validate = False, docume
     handler = _parse_file_for_tarfile
 
   if handler:
-    for desc in handler(descriptor_file, descriptor_type, validate, document_handler, **kwargs):
+    for desc in handler(descriptor_file, descriptor_type, validate, document_handler, use_mmap, pool, **kwargs):
       yield desc
 
     return
@@ -182,39 +374,37 @@ def parse_file(descriptor_file, descriptor_type = None, validate = False, docume
 
   descriptor_path = getattr(descriptor_file, 'name', None)
   filename = '<undefined>' if descriptor_path is None else os.path.basename(descriptor_file.name)
-  file_parser = None
+  metrics_type = None
 
   if descriptor_type is not None:
     descriptor_type_match = re.match('^(\S+) (\d+).(\d+)$', descriptor_type)
 
     if descriptor_type_match:
       desc_type, major_version, minor_version = descriptor_type_match.groups()
-      file_parser = lambda f: _parse_metrics_file(desc_type, int(major_version), int(minor_version), f, validate, document_handler, **kwargs)
+      metrics_type = (desc_type, int(major_version), int(minor_version))
     else:
       raise ValueError("The descriptor_type must be of the form '<type> <major_version>.<minor_version>'")
   elif metrics_header_match:
     # Metrics descriptor handling
 
     desc_type, major_version, minor_version = metrics_header_match.groups()
-    file_parser = lambda f: _parse_metrics_file(desc_type, int(major_version), int(minor_version), f, validate, document_handler, **kwargs)
+    metrics_type = (desc_type, int(major_version), int(minor_version))
   else:
     # Cached descriptor handling. These contain multiple descriptors per file.
 
-    if filename == 'cached-descriptors' or filename == 'cached-descriptors.new':
-      file_parser = lambda f: stem.descriptor.server_descriptor._parse_file(f, validate = validate, **kwargs)
-    elif filename == 'cached-extrainfo' or filename == 'cached-extrainfo.new':
-      file_parser = lambda f: stem.descriptor.extrainfo_descriptor._parse_file(f, validate = validate, **kwargs)
-    elif filename == 'cached-microdescs' or filename == 'cached-microdescs.new':
-      file_parser = lambda f: stem.descriptor.microdescriptor._parse_file(f, validate = validate, **kwargs)
-    elif filename == 'cached-consensus':
-      file_parser = lambda f: stem.descriptor.networkstatus._parse_file(f, validate = validate, document_handler = document_handler, **kwargs)
-    elif filename == 'cached-microdesc-consensus':
-      file_parser = lambda f: stem.descriptor.networkstatus._parse_file(f, is_microdescriptor = True, validate = validate, document_handler = document_handler, **kwargs)
-
-  if file_parser:
-    for desc in file_parser(descriptor_file):
-      if descriptor_path is not None:
-        desc._set_path(os.path.abspath(descriptor_path))
+    metrics_type = CACHED_FILE_TYPES.get(filename)
+
+  if metrics_type:
+    if pool:
+      descriptors = _parse_file_in_pool(pool, descriptor_file, metrics_type, validate, document_handler, **kwargs)
+    else:
+      descriptors = _parse_metrics_file(metrics_type[0], metrics_type[1], metrics_type[2], descriptor_file, validate, document_handler, **kwargs)
+
+    absolute_path = None if descriptor_path is None else os.path.abspath(descriptor_path)
+
+    for desc in descriptors:
+      if absolute_path is not None:
+        desc._set_path(absolute_path)
 
       yield desc
 
@@ -225,38 +415,430 @@ def parse_file(descriptor_file, descriptor_type = None, validate = False, docume
   raise TypeError("Unable to determine the descriptor's type. filename: '%s', first line: '%s'" % (filename, first_line))
 
 
-def _parse_file_for_path(descriptor_file, *args, **kwargs):
+def _parse_file_for_path(descriptor_file, descriptor_type, validate, document_handler, use_mmap, pool, **kwargs):
+  if use_mmap:
+    mapping = _MappedFile.for_path(descriptor_file)
+
+    if mapping is not None:
+      try:
+        for desc in _parse_file(mapping, descriptor_type, validate, document_handler, use_mmap, pool, **kwargs):
+          yield desc
+      finally:
+        mapping.release()
+
+      return
+
   with open(descriptor_file, 'rb') as desc_file:
-    for desc in parse_file(desc_file, *args, **kwargs):
+    for desc in _parse_file(desc_file, descriptor_type, validate, document_handler, use_mmap, pool, **kwargs):
       yield desc
 
 
-def _parse_file_for_tar_path(descriptor_file, *args, **kwargs):
+def _parse_file_for_tar_path(descriptor_file, descriptor_type, validate, document_handler, use_mmap, pool, **kwargs):
   # TODO: use 'with' for tarfile after dropping python 2.6 support
   tar_file = tarfile.open(descriptor_file)
 
   try:
-    for desc in parse_file(tar_file, *args, **kwargs):
-      desc._set_path(os.path.abspath(descriptor_file))
+    absolute_path = os.path.abspath(descriptor_file)
+
+    for desc in _parse_file(tar_file, descriptor_type, validate, document_handler, use_mmap, pool, **kwargs):
+      desc._set_path(absolute_path)
       yield desc
   finally:
     if tar_file:
       tar_file.close()
 
 
-def _parse_file_for_tarfile(descriptor_file, *args, **kwargs):
+def _parse_file_for_tarfile(descriptor_file, descriptor_type, validate, document_handler, use_mmap, pool, **kwargs):
+  if pool:
+    for archive_path, descriptors, exc in _parse_tarfile_in_pool(pool, descriptor_file, descriptor_type, validate, document_handler, **kwargs):
+      for desc in descriptors:
+        desc._set_archive_path(archive_path)
+        yield desc
+
+      if exc:
+        raise exc
+
+    return
+
   for tar_entry in descriptor_file:
     if tar_entry.isfile():
       entry = descriptor_file.extractfile(tar_entry)
 
       try:
-        for desc in parse_file(entry, *args, **kwargs):
+        for desc in _parse_file(entry, descriptor_type, validate, document_handler, use_mmap, pool, **kwargs):
           desc._set_archive_path(entry.name)
           yield desc
       finally:
         entry.close()
 
 
+def _parse_file_in_pool(pool, descriptor_file, metrics_type, validate, document_handler, **kwargs):
+  """
+  Parses a descriptor file by splitting it into chunks at descriptor
+  boundaries, and parsing these in a process pool.
+
+  :param stem.descriptor._ParsingPool pool: processes to parse with
+  :param file descriptor_file: file with the descriptor content
+  :param tuple metrics_type: (type, major_version, minor_version) of the
+    descriptors in the file
+  :param bool validate: checks the validity of the descriptor's content if
+    **True**, skips these checks otherwise
+  :param stem.descriptor.__init__.DocumentHandler document_handler: method in
+    which to parse the :class:`~stem.descriptor.networkstatus.NetworkStatusDocument`
+  :param dict kwargs: additional arguments for the descriptor constructor
+
+  :returns: iterator for :class:`~stem.descriptor.__init__.Descriptor` instances in the file
+  """
+
+  desc_type, major_version, minor_version = metrics_type
+  parser = functools.partial(_parse_metrics_file, desc_type, major_version, minor_version, validate = validate, document_handler = document_handler, **kwargs)
+  document = None
+
+  if major_version != 1 or not (desc_type in _SPLITTABLE_TYPES or (desc_type in _NETWORK_STATUS_TYPES and document_handler == DocumentHandler.ENTRIES)):
+    # single documents and unrecognized types are parsed in our own process
+
+    for desc in parser(descriptor_file):
+      yield desc
+
+    return
+
+  if desc_type in _NETWORK_STATUS_TYPES:
+    # Router status entries reference the document they came from so we
+    # parse its header and footer here, then the entries in the pool.
+
+    if kwargs.get('fields') is not None:
+      raise ValueError("Network status documents and their router status entries can't be parsed for only some fields")
+
+    content, position = _descriptor_content(descriptor_file)
+    header_start, routers_start, routers_end = stem.descriptor.networkstatus._document_sections(content, position)
+    document_content = content[header_start:routers_start] + content[routers_end:]
+    document = next(_parse_metrics_file(desc_type, major_version, minor_version, io.BytesIO(document_content), validate, DocumentHandler.BARE_DOCUMENT))
+
+    if desc_type == 'network-status-microdesc-consensus-3':
+      router_type = stem.descriptor.router_status_entry.RouterStatusEntryMicroV3
+    elif desc_type in ('network-status-consensus-3', 'network-status-vote-3'):
+      router_type = stem.descriptor.router_status_entry.RouterStatusEntryV3
+    else:
+      router_type = stem.descriptor.router_status_entry.RouterStatusEntryV2
+
+    parser = functools.partial(stem.descriptor.router_status_entry._parse_file, validate = validate, entry_class = router_type, extra_args = (document,))
+    spans = ((content, start, start, end) for (start, end) in _entry_spans(content, ('r',), routers_start, routers_end))
+    content_size = routers_end - routers_start
+  else:
+    if desc_type in ('server-descriptor', 'bridge-server-descriptor'):
+      span_finder = stem.descriptor.server_descriptor._descriptor_spans
+    elif desc_type in ('extra-info', 'bridge-extra-info'):
+      span_finder = stem.descriptor.extrainfo_descriptor._descriptor_spans
+    elif desc_type == 'dir-key-certificate-3':
+      span_finder = stem.descriptor.networkstatus._key_certificate_spans
+    elif desc_type == 'microdescriptor':
+      span_finder = stem.descriptor.microdescriptor._descriptor_spans
+    else:
+      span_finder = stem.descriptor.tordnsel._entry_spans
+
+    content_size = _remaining_size(descriptor_file)
+    spans = _SpanReader(descriptor_file, span_finder)
+
+  # Groups descriptors into chunks as we find them. The last chunk includes
+  # any content after the last descriptor so we'll still note it.
+
+  if content_size is None:
+    chunk_size = POOL_CHUNK_SIZE
+  else:
+    chunk_size = max(16 * 1024, min(POOL_CHUNK_SIZE, content_size // (pool.workers * 4)))
+
+  def chunks():
+    pieces, pieces_size, is_empty = [], 0, True
+
+    for content, start, _, end in spans:
+      pieces.append(content[start:end])
+      pieces_size += end - start
+
+      if pieces_size >= chunk_size:
+        yield [(None, b''.join(pieces))]
+        pieces, pieces_size, is_empty = [], 0, False
+
+    if getattr(spans, 'remainder', None):
+      pieces.append(spans.remainder)
+
+    if pieces or is_empty:
+      yield [(None, b''.join(pieces))]
+
+  for descriptors, exc in pool.parse(parser, chunks()):
+    for desc in descriptors:
+      if document is not None:
+        desc.document = document
+
+      yield desc
+
+    if exc:
+      raise exc
+
+
+def _parse_tarfile_in_pool(pool, tar_file, descriptor_type, validate, document_handler, **kwargs):
+  """
+  Parses the members of an archive in a process pool. Members are grouped
+  together so each process is provided a reasonable amount of content at a
+  time.
+
+  :param stem.descriptor._ParsingPool pool: processes to parse with
+  :param tarfile tar_file: archive to be read
+  :param str descriptor_type: descriptor type of the members, this is guessed
+    if not provided
+  :param bool validate: checks the validity of the descriptor's content if
+    **True**, skips these checks otherwise
+  :param stem.descriptor.__init__.DocumentHandler document_handler: method in
+    which to parse the :class:`~stem.descriptor.networkstatus.NetworkStatusDocument`
+  :param dict kwargs: additional arguments for the descriptor constructor
+
+  :returns: iterator for (archive_path, descriptors, exception) tuples for
+    each member of the archive, the exception being **None** if we parsed it
+    successfully
+  """
+
+  def chunks():
+    chunk, chunk_size = [], 0
+
+    for tar_entry in tar_file:
+      if tar_entry.isfile():
+        entry = tar_file.extractfile(tar_entry)
+
+        try:
+          content = entry.read()
+          chunk.append((entry.name, content))
+          chunk_size += len(content)
+        finally:
+          entry.close()
+
+        if chunk_size >= POOL_CHUNK_SIZE:
+          yield chunk
+          chunk, chunk_size = [], 0
+
+    if chunk:
+      yield chunk
+
+  parser = functools.partial(parse_file, descriptor_type = descriptor_type, validate = validate, document_handler = document_handler, **kwargs)
+
+  for archive_path, descriptors, exc in pool.parse(parser, chunks(), include_names = True):
+    yield archive_path, descriptors, exc
+
+
+def _parse_chunk(parser, chunk):
+  """
+  Parses a chunk of descriptor content within a pool process.
+
+  :param functor parser: provides an iterator of descriptors for a file
+  :param list chunk: (name, content) tuples to be parsed
+
+  :returns: **list** of (name, descriptors, exception) tuples for each piece
+    of content
+  """
+
+  results = []
+
+  for name, content in chunk:
+    content_file = io.BytesIO(content)
+    descriptors, exc = [], None
+
+    if name is not None:
+      content_file.name = name
+
+    try:
+      for desc in parser(content_file):
+        # Fully parse the descriptor since there's no point in doing so lazily
+        # once we're back in the main process. This also lets us drop its
+        # entries, making it cheaper to send back.
+
+        if desc._lazy_loading:
+          desc.get_unrecognized_lines()
+          desc._entries = {}
+
+        descriptors.append(desc)
+    except Exception as error:
+      exc = error
+
+    results.append((name, descriptors, exc))
+
+  return results
+
+
+class _ParsingPool(object):
+  """
+  Processes for parsing descriptor content in parallel.
+
+  :var int workers: number of processes in the pool
+  :var bool ordered: provides results in the order chunks were provided if
+    **True**, otherwise as soon as they're available
+  """
+
+  def __init__(self, workers, ordered = True):
+    self.workers = workers
+    self.ordered = ordered
+    self._pool = multiprocessing.Pool(workers)
+    self._is_closed = threading.Event()
+    self._throttles = []
+
+  def parse(self, parser, chunks, include_names = False):
+    """
+    Parses chunks of descriptor content. We only read ahead a few chunks for
+    each process so large files aren't buffered in memory.
+
+    :param functor parser: picklable function that provides an iterator of
+      descriptors for a file
+    :param iterator chunks: lists of (name, content) tuples to be parsed, the
+      name is used as the file's name if it's not **None**
+    :param bool include_names: provides the names of each piece of content
+      if **True**
+
+    :returns: iterator for (descriptors, exception) tuples for each piece of
+      content, the exception being **None** if it was parsed successfully,
+      if include_names is **True** these are prefixed with the name
+    """
+
+    unstarted = threading.Semaphore(self.workers * 2)
+    is_done = threading.Event()
+    self._throttles.append(unstarted)
+
+    def limited_chunks():
+      for chunk in chunks:
+        unstarted.acquire()
+
+        if is_done.is_set() or self._is_closed.is_set():
+          break
+
+        yield chunk
+
+    if self.ordered:
+      results = self._pool.imap(functools.partial(_parse_chunk, parser), limited_chunks())
+    else:
+      results = self._pool.imap_unordered(functools.partial(_parse_chunk, parser), limited_chunks())
+
+    try:
+      for chunk_results in results:
+        unstarted.release()
+
+        for name, descriptors, exc in chunk_results:
+          if include_names:
+            yield name, descriptors, exc
+          else:
+            yield descriptors, exc
+    finally:
+      is_done.set()
+      unstarted.release()
+      self._throttles.remove(unstarted)
+
+  def close(self):
+    """
+    Terminates our processes.
+    """
+
+    self._is_closed.set()
+
+    for throttle in list(self._throttles):
+      throttle.release()
+
+    self._pool.terminate()
+    self._pool.join()
+
+
+_SPLITTABLE_TYPES = (
+  'server-descriptor',
+  'bridge-server-descriptor',
+  'extra-info',
+  'bridge-extra-info',
+  'microdescriptor',
+  'dir-key-certificate-3',
+  'tordnsel',
+)
+
+_NETWORK_STATUS_TYPES = (
+  'network-status-2',
+  'network-status-consensus-3',
+  'network-status-vote-3',
+  'network-status-microdesc-consensus-3',
+  'bridge-network-status',
+)
+
+
+class _MappedFile(mmap.mmap):
+  """
+  Read-only memory mapping of a descriptor file. This has the file-like
+  methods our parsers use (read, readline, readlines, seek, and tell) so parsers without
+  a mapping specific code path can use it like any other file.
+
+  :var str name: path of the file we've mapped
+  """
+
+  @staticmethod
+  def for_path(path):
+    """
+    Memory maps the given file.
+
+    :param str path: file to be mapped
+
+    :returns: :class:`~stem.descriptor._MappedFile` for the file, or **None**
+      if it can't be mapped (for instance because it's empty)
+
+    :raises: **IOError** if the file can't be read
+    """
+
+    if not stem.prereq.is_python_27():
+      return None  # python 2.6 lacks memoryviews
+
+    with open(path, 'rb') as desc_file:
+      if os.fstat(desc_file.fileno()).st_size == 0:
+        return None  # empty files can't be mapped
+
+      try:
+        mapping = _MappedFile(desc_file.fileno(), 0, access = mmap.ACCESS_READ)
+      except (ValueError, mmap.error):
+        return None
+
+    mapping.name = path
+    return mapping
+
+  def readlines(self):
+    """
+    Reads the remaining lines of the mapping.
+
+    :returns: **list** of **bytes** for the remaining lines, including their
+      newlines
+    """
+
+    lines = []
+
+    while True:
+      line = self.readline()
+
+      if not line:
+        return lines
+
+      lines.append(line)
+
+  def view(self, start, end):
+    """
+    Provides a section of the mapping without copying it.
+
+    :param int start: offset where the section begins
+    :param int end: offset where the section ends
+
+    :returns: **memoryview** for this section of the mapping
+    """
+
+    return memoryview(self)[start:end]
+
+  def release(self):
+    """
+    Closes the mapping if nothing still references it. Otherwise it's released
+    when the last descriptor referencing it is garbage collected.
+    """
+
+    try:
+      self.close()
+    except BufferError:
+      pass  # descriptors are still referencing the mapping
+
+
 def _parse_metrics_file(descriptor_type, major_version, minor_version, descriptor_file, validate, document_handler, **kwargs):
   # Parses descriptor files from metrics, yielding individual descriptors. This
   # throws a TypeError if the descriptor_type or version isn't recognized.
@@ -326,8 +908,20 @@ def _parse_simple_line(keyword, attribute):
   return _parse
 
 
-def _parse_bytes_line(keyword, attribute):
+def _parse_bytes_line(keyword, attribute, shared = False):
   def _parse(descriptor, entries):
+    if keyword not in entries:
+      setattr(descriptor, attribute, None)
+      return
+
+    value_span = descriptor._keyword_span(keyword)
+
+    if value_span:
+      value = descriptor._raw_contents[value_span[1]:value_span[2]]
+      value = value if isinstance(value, bytes) else value.tobytes()
+      setattr(descriptor, attribute, _intern_value(value) if shared else value)
+      return
+
     line_match = re.search(stem.util.str_tools._to_bytes('^(opt )?%s(?:[%s]+(.*))?$' % (keyword, WHITESPACE)), descriptor.get_bytes(), re.MULTILINE)
     result = None
 
@@ -335,11 +929,52 @@ def _parse_bytes_line(keyword, attribute):
       value = line_match.groups()[1]
       result = b'' if value is None else value
 
+      if shared:
+        result = _intern_value(result)
+
     setattr(descriptor, attribute, result)
 
   return _parse
 
 
+def _intern_value(value):
+  """
+  Provides a copy of the value that's shared with other descriptors. Our pool
+  is emptied when it reaches its INTERN_POOL_SIZE, so this is only worthwhile
+  for values that many descriptors have in common.
+
+  :param str,bytes value: value to provide a shared copy of
+
+  :returns: value equal to the one provided
+  """
+
+  # Pools are kept by type since on python 2 unicode and ascii strings can be
+  # equal, and we shouldn't change the value's type.
+
+  pool = _INTERNED.get(type(value))
+
+  if pool is None:
+    pool = _INTERNED.setdefault(type(value), {})
+
+  interned = pool.get(value)
+
+  if interned is None:
+    if len(pool) >= INTERN_POOL_SIZE:
+      pool.clear()
+
+    pool[value] = interned = value
+
+  return interned
+
+
+def _reset_interned_values():
+  """
+  Empties the pool of shared values.
+  """
+
+  _INTERNED.clear()
+
+
 def _parse_timestamp_line(keyword, attribute):
   # "<keyword>" YYYY-MM-DD HH:MM:SS
 
@@ -391,6 +1026,24 @@ class Descriptor(object):
   ATTRIBUTES = {}  # mapping of 'attribute' => (default_value, parsing_function)
   PARSER_FOR_LINE = {}  # line keyword to its associated parsing function
 
+  _FIELD_KEYWORDS = {}  # mapping of (class, fields) => keywords they need
+
+  # Keywords whose byte offsets we record when tokenizing so their lines can
+  # be sliced out of our content rather than searched for. This is populated
+  # as a '_offsets' dict, which is a class attribute so descriptors without
+  # them don't each need an instance attribute.
+
+  _OFFSET_KEYWORDS = ()
+  _offsets = None
+
+  # Compact descriptors drop instance attributes that have these values, so
+  # these class attributes provide them instead.
+
+  _path = None
+  _archive_path = None
+  _lazy_loading = False
+  _unrecognized_lines = ()
+
   def __init__(self, contents, lazy_load = False):
     self._path = None
     self._archive_path = None
@@ -429,7 +1082,12 @@ class Descriptor(object):
     :returns: **bytes** for the descriptor's contents
     """
 
-    return self._raw_contents
+    if isinstance(self._raw_contents, bytes):
+      return self._raw_contents
+    elif stem.prereq.is_python_27() and isinstance(self._raw_contents, memoryview):
+      return self._raw_contents.tobytes()  # section of a memory mapped file
+    else:
+      return self._raw_contents
 
   def get_unrecognized_lines(self):
     """
@@ -462,16 +1120,23 @@ class Descriptor(object):
     if parser_for_line is None:
       parser_for_line = self.PARSER_FOR_LINE
 
-    # set defaults
+    # set defaults, checking our __dict__ rather than hasattr() so we don't
+    # lazy load attributes we're about to parse anyway
 
-    for attr in self.ATTRIBUTES:
-      if not hasattr(self, attr):
-        setattr(self, attr, copy.copy(self.ATTRIBUTES[attr][0]))
+    attributes = self.__dict__
+    profiler = _PROFILER
+
+    for attr, (default, _) in self.ATTRIBUTES.items():
+      if attr not in attributes:
+        attributes[attr] = default if default is None else copy.copy(default)
 
     for keyword, values in list(entries.items()):
       try:
         if keyword in parser_for_line:
-          parser_for_line[keyword](self, entries)
+          if profiler is None:
+            parser_for_line[keyword](self, entries)
+          else:
+            profiler._call(self, parser_for_line[keyword], entries)
         else:
           for value, block_type, block_contents in values:
             line = '%s %s' % (keyword, value)
@@ -484,6 +1149,121 @@ class Descriptor(object):
         if validate:
           raise exc
 
+  @classmethod
+  def _keywords_for(cls, fields):
+    """
+    Provides the keywords we need to parse to populate the given attributes.
+
+    :param list fields: attributes to provide keywords for
+
+    :returns: **frozenset** of the keywords needed for these attributes
+
+    :raises: **ValueError** if any of the fields aren't attributes of this
+      descriptor type
+    """
+
+    cache_key = (cls, tuple(fields))
+    keywords = Descriptor._FIELD_KEYWORDS.get(cache_key)
+
+    if keywords is None:
+      keywords = set()
+
+      for field in fields:
+        if field not in cls.ATTRIBUTES:
+          raise ValueError("'%s' isn't an attribute of %s descriptors" % (field, cls.__name__))
+
+        keywords.update(cls._keywords_for_attribute(field))
+
+      keywords = frozenset(keywords)
+      Descriptor._FIELD_KEYWORDS[cache_key] = keywords
+
+    return keywords
+
+  @classmethod
+  def _keywords_for_attribute(cls, attribute):
+    """
+    Provides the keywords of the lines that are parsed for an attribute.
+
+    :param str attribute: attribute to provide the keywords for
+
+    :returns: **list** of keywords the attribute is derived from
+    """
+
+    parsing_function = cls.ATTRIBUTES[attribute][1]
+    return [keyword for keyword, line_parser in cls.PARSER_FOR_LINE.items() if line_parser == parsing_function]
+
+  def _keyword_span(self, keyword):
+    """
+    Provides the byte offsets of the first line with the given keyword, if
+    we recorded them when tokenizing our content.
+
+    :param str keyword: keyword of the line to provide
+
+    :returns: **tuple** of the form (line_start, value_start, line_end) for
+      offsets within our raw content, or **None** if we don't have them
+    """
+
+    if self._offsets is None or isinstance(self._raw_contents, str_type):
+      return None  # offsets are into our encoded bytes, not unicode
+
+    return self._offsets.get(keyword)
+
+  def _signed_content(self, start_keyword, signature_keyword):
+    """
+    Provides our content from the line with a given keyword through the
+    newline after our signature line, which is what signatures and digests
+    are calculated from.
+
+    :param str start_keyword: keyword of the line to start with, the
+      beginning of our content if **None**
+    :param str signature_keyword: keyword of the line to end with
+
+    :returns: **bytes** or **memoryview** with this section of our content,
+      or **None** if we didn't record offsets for these lines
+    """
+
+    start_span = (0, 0, 0) if start_keyword is None else self._keyword_span(start_keyword)
+    signature_span = self._keyword_span(signature_keyword)
+
+    if not start_span or not signature_span:
+      return None
+
+    signature_start, _, signature_end = signature_span
+
+    # The signature line must be just its keyword (without an 'opt ' prefix or
+    # trailing whitespace), and be followed by a newline.
+
+    if signature_start == 0 or signature_end - signature_start != len(signature_keyword) or signature_end >= len(self._raw_contents):
+      return None
+
+    return self._raw_contents[start_span[0]:signature_end + 1]
+
+  def _compact(self):
+    """
+    Parses anything we've been lazy loading, then drops the content we only
+    kept for parsing so we take as little memory as possible. Attributes that
+    are empty or unset are dropped too, and provided again when they're
+    requested, so they still behave as they otherwise would.
+    """
+
+    if self._lazy_loading:
+      self.get_unrecognized_lines()
+
+    attributes = self.__dict__
+    attributes.pop('_entries', None)
+    attributes.pop('_offsets', None)
+
+    for attr in ('_path', '_archive_path', '_lazy_loading', '_unrecognized_lines'):
+      if attr in attributes and not attributes[attr]:
+        del attributes[attr]
+
+    for attr, (default, _) in self.ATTRIBUTES.items():
+      if not default and attr in attributes:
+        value = attributes[attr]
+
+        if type(value) == type(default) and value == default:
+          del attributes[attr]
+
   def _set_path(self, path):
     self._path = path
 
@@ -493,137 +1273,541 @@ class Descriptor(object):
   def _name(self, is_plural = False):
     return str(type(self))
 
+  def __getstate__(self):
+    # sections of a memory mapped file can't be pickled, so provide a copy
+
+    state = dict(self.__dict__)
+
+    if stem.prereq.is_python_27() and isinstance(self._raw_contents, memoryview):
+      state['_raw_contents'] = self._raw_contents.tobytes()
+
+    return state
+
   def __getattr__(self, name):
-    # If attribute isn't already present we might be lazy loading it...
+    # If attribute isn't already present we might be lazy loading it. This
+    # checks our __dict__ directly since it's empty when we're unpickled.
 
-    if self._lazy_loading and name in self.ATTRIBUTES:
+    if self.__dict__.get('_lazy_loading') and name in self.ATTRIBUTES:
       default, parsing_function = self.ATTRIBUTES[name]
 
       try:
-        parsing_function(self, self._entries)
+        if _PROFILER is None:
+          parsing_function(self, self._entries)
+        else:
+          _PROFILER._call(self, parsing_function, self._entries)
       except (ValueError, KeyError):
-        try:
-          # despite having a validation failure check to see if we set something
-          return super(Descriptor, self).__getattribute__(name)
-        except AttributeError:
-          setattr(self, name, copy.copy(default))
+        pass
+
+      # despite a validation failure, or not having its line, check to see if
+      # we set something
+
+      if name not in self.__dict__:
+        setattr(self, name, copy.copy(default))
+    elif name in self.ATTRIBUTES and '_raw_contents' in self.__dict__:
+      # compact descriptors drop attributes with their default value
+
+      default = self.ATTRIBUTES[name][0]
+
+      if not isinstance(default, (list, dict, set)):
+        return default
+
+      setattr(self, name, copy.copy(default))
 
     return super(Descriptor, self).__getattribute__(name)
 
   def __str__(self):
     if stem.prereq.is_python_3():
-      return stem.util.str_tools._to_unicode(self._raw_contents)
+      return stem.util.str_tools._to_unicode(self.get_bytes())
     else:
-      return self._raw_contents
+      return self.get_bytes()
 
 
-def _read_until_keywords(keywords, descriptor_file, inclusive = False, ignore_first = False, skip = False, end_position = None, include_ending_keyword = False):
+def _descriptor_content(descriptor_file):
   """
-  Reads from the descriptor file until we get to one of the given keywords or reach the
-  end of the file.
+  Provides the remaining content of a descriptor file so our parsers can find
+  descriptor boundaries within it. If this is a memory mapped file then this
+  is the mapping itself rather than a copy of its content.
+
+  This reads the whole file, so it's only for content that needs to be
+  considered as a whole (such as network status documents). Files with a
+  series of descriptors should use :class:`_SpanReader`.
 
-  :param str,list keywords: keyword(s) we want to read until
   :param file descriptor_file: file with the descriptor content
-  :param bool inclusive: includes the line with the keyword if True
-  :param bool ignore_first: doesn't check if the first line read has one of the
-    given keywords
-  :param bool skip: skips buffering content, returning None
-  :param int end_position: end if we reach this point in the file
-  :param bool include_ending_keyword: provides the keyword we broke on if **True**
 
-  :returns: **list** with the lines until we find one of the keywords, this is
-    a two value tuple with the ending keyword if include_ending_keyword is
-    **True**
+  :returns: **tuple** of the form (content, position) where position is the
+    offset within the content that we should start parsing from
+
+  :raises: **IOError** if unable to read from the descriptor_file
   """
 
-  if skip:
-    content = None
-    content_append = lambda x: None
+  if isinstance(descriptor_file, _MappedFile):
+    return descriptor_file, descriptor_file.tell()
   else:
-    content = []
-    content_append = content.append
+    return stem.util.str_tools._to_bytes(descriptor_file.read()), 0
 
-  ending_keyword = None
 
-  if isinstance(keywords, (bytes, str_type)):
-    keywords = (keywords,)
+def _remaining_size(descriptor_file):
+  """
+  Provides how much content is left to be read from a descriptor file.
 
-  if ignore_first:
-    first_line = descriptor_file.readline()
+  :param file descriptor_file: file with the descriptor content
 
-    if first_line is not None:
-      content_append(first_line)
+  :returns: **int** for the number of bytes that remain, **None** if this
+    can't be determined
+  """
 
-  keyword_match = re.compile(SPECIFIC_KEYWORD_LINE % '|'.join(keywords))
+  if isinstance(descriptor_file, _MappedFile):
+    return len(descriptor_file) - descriptor_file.tell()
 
-  while True:
-    last_position = descriptor_file.tell()
+  try:
+    return os.fstat(descriptor_file.fileno()).st_size - descriptor_file.tell()
+  except (AttributeError, EnvironmentError, ValueError):
+    return None  # in-memory content, sockets, and such
 
-    if end_position and last_position >= end_position:
-      break
 
-    line = descriptor_file.readline()
+class _SpanReader(object):
+  """
+  Iterates over where the descriptors within a file are. Memory mapped files
+  are searched in place, and others are read a chunk at a time so we neither
+  buffer the whole file nor wait for it to be read before providing the first
+  descriptor.
 
-    if not line:
-      break  # EOF
+  When reading chunks the last descriptor we find might be cut short, so it's
+  carried forward and searched again along with the next chunk.
 
-    line_match = keyword_match.match(stem.util.str_tools._to_unicode(line))
+  :var bytes remainder: content after the last descriptor, this is available
+    once we've been iterated over
+  """
 
-    if line_match:
-      ending_keyword = line_match.groups()[0]
+  def __init__(self, descriptor_file, span_finder, chunk_size = READ_CHUNK_SIZE):
+    """
+    :param file descriptor_file: file with the descriptor content
+    :param functor span_finder: function that accepts content and an offset to
+      begin at, providing an iterator for (start, descriptor_start,
+      descriptor_end) tuples with the descriptors it finds
+    :param int chunk_size: content to read from the file at a time
+    """
 
-      if not inclusive:
-        descriptor_file.seek(last_position)
-      else:
-        content_append(line)
+    self._descriptor_file = descriptor_file
+    self._span_finder = span_finder
+    self._chunk_size = chunk_size
+    self.remainder = None
 
-      break
-    else:
-      content_append(line)
+  def __iter__(self):
+    """
+    Provides (content, start, descriptor_start, descriptor_end) tuples for each
+    descriptor, with the offsets being within that content. The content is the
+    memory mapping, or **bytes** we've read.
+
+    :raises: **IOError** if unable to read from the descriptor_file
+    """
+
+    if isinstance(self._descriptor_file, _MappedFile):
+      content, position = self._descriptor_file, self._descriptor_file.tell()
+
+      for start, descriptor_start, descriptor_end in self._span_finder(content, position):
+        yield content, start, descriptor_start, descriptor_end
+        position = descriptor_end
+
+      self.remainder = content[position:]
+      return
+
+    content, is_done = b'', False
+
+    while not is_done:
+      chunk = self._descriptor_file.read(self._chunk_size)
+      is_done = not chunk
+      content += stem.util.str_tools._to_bytes(chunk)
+
+      spans = list(self._span_finder(content, 0))
+      position = 0
+
+      if not is_done:
+        if len(spans) < 2:
+          continue  # might be cut short, read more before providing it
+
+        spans.pop()
+
+      for start, descriptor_start, descriptor_end in spans:
+        yield content, start, descriptor_start, descriptor_end
+        position = descriptor_end
+
+      content = content[position:]
 
-  if include_ending_keyword:
-    return (content, ending_keyword)
+    self.remainder = content
+
+
+def _content_span(content, start, end):
+  """
+  Provides a section of the content provided by :func:`_descriptor_content`
+  or :class:`_SpanReader`. This is a **memoryview** for memory mapped files,
+  and **bytes** otherwise.
+
+  :param bytes,mmap content: content to take a section of
+  :param int start: offset where the section begins
+  :param int end: offset where the section ends
+
+  :returns: **bytes** or **memoryview** for this section of the content
+  """
+
+  if isinstance(content, _MappedFile):
+    return content.view(start, end)
   else:
-    return content
+    return content[start:end]
+
+
+def _find_line_starting_with(content, prefixes, start = 0, end = None):
+  """
+  Finds the first line at or after the start offset which begins with one of
+  the given prefixes. This uses the content's find() method so it works with
+  both bytes and memory mappings without copying their content.
+
+  :param bytes,mmap content: content to search
+  :param tuple prefixes: **bytes** prefixes we're looking for
+  :param int start: offset to begin searching from, this should be the start
+    of a line
+  :param int end: offset to stop searching at, the end of the content if
+    **None**
+
+  :returns: **int** offset for the start of the matching line, -1 if there
+    isn't a match
+  """
+
+  if end is None:
+    end = len(content)
+
+  match = -1
+
+  for prefix in prefixes:
+    if start == 0 and len(prefix) <= end and content[:len(prefix)] == prefix:
+      return 0
+
+    limit = end if match == -1 else min(end, match + len(prefix))
+    index = content.find(b'\n' + prefix, max(0, start - 1), limit)
+
+    if index != -1:
+      match = index + 1
+
+  return match
+
+
+def _find_keyword_line(content, keywords, start = 0, end = None):
+  """
+  Finds the first line at or after the start offset which is for one of the
+  given keywords. That is to say, the line starts with the keyword and it's
+  followed by whitespace or the end of the line.
+
+  :param bytes,mmap content: content to search
+  :param tuple keywords: keywords we're looking for
+  :param int start: offset to begin searching from, this should be the start
+    of a line
+  :param int end: offset to stop searching at, the end of the content if
+    **None**
+
+  :returns: **int** offset for the start of the matching line, -1 if there
+    isn't a match
+  """
+
+  content_length = len(content)
+  match = -1
+
+  if end is None:
+    end = content_length
+
+  for keyword in keywords:
+    keyword = stem.util.str_tools._to_bytes(keyword)
+    limit = end if match == -1 else min(end, match + len(keyword))
+    position = start
+
+    while True:
+      index = _find_line_starting_with(content, (keyword,), position, limit)
+
+      if index == -1:
+        break
+
+      # keyword needs to be followed by whitespace or the end of the line
+
+      keyword_end = index + len(keyword)
+
+      if keyword_end == content_length or content[keyword_end:keyword_end + 1] in (b' ', b'\t', b'\n'):
+        match = index
+        break
 
+      position = index + 1
 
-def _get_pseudo_pgp_block(remaining_contents):
+  return match
+
+
+def _line_end(content, start):
+  """
+  Provides the offset just past the newline of the line at the given offset.
+
+  :param bytes,mmap content: content to search
+  :param int start: offset within the line
+
+  :returns: **int** offset for the start of the following line, or the length
+    of the content if this is the last line
+  """
+
+  index = content.find(b'\n', start)
+  return len(content) if index == -1 else index + 1
+
+
+def _split_lines(content):
+  """
+  Splits content into the lines readline() would have provided, without
+  their newlines.
+
+  :param bytes content: content to be split
+
+  :returns: **list** of **bytes** for the lines
+  """
+
+  if not content:
+    return []
+
+  lines = content.split(b'\n')
+
+  if content.endswith(b'\n'):
+    lines.pop()
+
+  return lines
+
+
+def _entry_spans(content, keywords, start = 0, end = None):
+  """
+  Splits a section of content into entries, each of which begins with a line
+  for one of the given keywords. The first entry begins at the start of the
+  section regardless of its keyword, and the last runs until its end.
+
+  :param bytes,mmap content: content to be split
+  :param tuple keywords: keywords that begin an entry
+  :param int start: offset where the section begins, this should be the start
+    of a line
+  :param int end: offset where the section ends, the end of the content if
+    **None**
+
+  :returns: iterator for (start, end) tuples with the offsets of each entry
+  """
+
+  if end is None:
+    end = len(content)
+
+  keywords = tuple(map(stem.util.str_tools._to_bytes, keywords))
+  entry_start = start
+
+  while entry_start < end:
+    entry_end = _find_keyword_line(content, keywords, min(_line_end(content, entry_start), end), end)
+
+    if entry_end == -1:
+      entry_end = end
+
+    yield entry_start, entry_end
+    entry_start = entry_end
+
+
+def _signed_spans(content, signature_keyword, start_keyword = None, start = 0, end = None):
+  """
+  Splits content into descriptors that end with a signature. That is to say,
+  each runs through the pgp style block that follows its signature_keyword.
+
+  If a start_keyword is provided then each descriptor begins with a line for
+  it, and any preceding content is provided as being prior to it (for
+  instance, annotations). Content after the last descriptor is ignored.
+
+  :param bytes,mmap content: content to be split
+  :param str signature_keyword: keyword with the descriptor's signature
+  :param str start_keyword: keyword that begins the descriptor
+  :param int start: offset to begin at, this should be the start of a line
+  :param int end: offset where the content ends, the end of the content if
+    **None**
+
+  :returns: iterator for (start, descriptor_start, descriptor_end) tuples,
+    where the content from start to descriptor_start is what came prior to the
+    descriptor
+  """
+
+  if end is None:
+    end = len(content)
+
+  block_end_prefix = PGP_BLOCK_END.split(' ', 1)[0]
+  position = start
+
+  while position < end:
+    if start_keyword:
+      descriptor_start = _find_keyword_line(content, (start_keyword,), position, end)
+
+      if descriptor_start == -1:
+        break
+    else:
+      descriptor_start = position
+
+    signature_start = _find_keyword_line(content, (signature_keyword,), descriptor_start, end)
+
+    if signature_start == -1:
+      descriptor_end = end
+    else:
+      block_end = _find_keyword_line(content, (block_end_prefix,), signature_start, end)
+      descriptor_end = end if block_end == -1 else min(_line_end(content, block_end), end)
+
+    yield position, descriptor_start, descriptor_end
+    position = descriptor_end
+
+
+def _pem_bytes(pem):
+  """
+  Decodes the base64 content of a PEM style block, such as an 'RSA PUBLIC KEY'
+  or 'SIGNATURE'.
+
+  :param str pem: block, including its BEGIN and END lines
+
+  :returns: **bytes** with the block's decoded content
+  """
+
+  lines = [line for line in stem.util.str_tools._to_unicode(pem).strip().split('\n') if not line.startswith('-----')]
+  return base64.b64decode(stem.util.str_tools._to_bytes(''.join(lines)))
+
+
+def _rsa_public_key(key_as_der):
+  """
+  Provides the modulus and exponent of an RSA public key. This requires
+  pycrypto.
+
+  :param bytes key_as_der: DER encoded 'RSA PUBLIC KEY'
+
+  :returns: **tuple** of the form (modulus, public_exponent)
+
+  :raises: **ValueError** if the key is malformed
+  """
+
+  from Crypto.Util import asn1
+
+  seq = asn1.DerSequence()
+
+  try:
+    seq.decode(key_as_der)
+    return seq[0], seq[1]
+  except (ValueError, IndexError, TypeError, EOFError):
+    raise ValueError('Malformed RSA public key')
+
+
+def _decrypt_signature(signature_as_bytes, modulus, public_exponent):
+  """
+  Provides the digest that a tor signature was made for. Tor signs digests with
+  PKCS#1 v1.5 padding, so the decrypted signature should have the form...
+
+  ::
+
+    1 byte  - [null '\\x00']
+    1 byte  - [block type identifier '\\x01'] - Should always be 1
+    N bytes - [padding '\\xFF' ]
+    1 byte  - [separator '\\x00' ]
+    M bytes - [message]
+
+  More info here http://www.ietf.org/rfc/rfc2313.txt esp the Notes in
+  section 8.1. This requires pycrypto.
+
+  :param bytes signature_as_bytes: decoded signature
+  :param int modulus: modulus of the key that made the signature
+  :param int public_exponent: public exponent of the key that made the signature
+
+  :returns: **str** with the signed digest encoded in uppercase hex
+
+  :raises: **ValueError** if the signature is malformed
+  """
+
+  from Crypto.Util.number import bytes_to_long, long_to_bytes
+
+  # use the public exponent[e] & the modulus[n] to decrypt the int, our block
+  # size is the modulus' length in bytes (python 2.6 lacks int.bit_length())
+
+  blocksize = (len('%x' % modulus) + 1) // 2
+  decrypted_bytes = long_to_bytes(pow(bytes_to_long(signature_as_bytes), public_exponent, modulus), blocksize)
+
+  if not decrypted_bytes.startswith(b'\x00\x01'):
+    raise ValueError('Verification failed, identifier missing')
+
+  separator_index = decrypted_bytes.find(b'\x00', 2)
+
+  if separator_index == -1:
+    raise ValueError('Verification failed, seperator not found')
+
+  return stem.util.str_tools._to_unicode(binascii.b2a_hex(decrypted_bytes[separator_index + 1:]).upper())
+
+
+def _decode_keyword(keyword):
+  """
+  Provides the unicode form of a keyword we've tokenized. Descriptors draw from
+  a small set of keywords so these are cached, saving us from decoding and
+  allocating the same strings for every line.
+
+  :param bytes keyword: keyword to be decoded
+
+  :returns: **unicode** for the keyword
   """
-  Checks if given contents begins with a pseudo-Open-PGP-style block and, if
-  so, pops it off and provides it back to the caller.
 
-  :param list remaining_contents: lines to be checked for a public key block
+  decoded = keyword.decode('utf-8', 'replace')
+
+  if len(_KEYWORD_CACHE) < 1000:
+    _KEYWORD_CACHE[keyword] = decoded
 
-  :returns: **tuple** of the (block_type, content) or None if it doesn't exist
+  return decoded
+
+
+def _get_pseudo_pgp_block(raw_contents, line_start, content_length):
+  """
+  Checks if the given content has a pseudo-Open-PGP-style block starting at the
+  given offset and, if so, provides its range.
+
+  :param bytes raw_contents: descriptor content being tokenized
+  :param int line_start: offset where the line we're checking starts
+  :param int content_length: length of the raw_contents
+
+  :returns: **tuple** of the form (block_type, block_end) where block_end is
+    the offset just past the block's ending line, or None if there isn't a
+    block at this offset
 
   :raises: **ValueError** if the contents starts with a key block but it's
     malformed (for instance, if it lacks an ending line)
   """
 
-  if not remaining_contents:
-    return None  # nothing left
+  if not raw_contents.startswith(b'-----BEGIN ', line_start):
+    return None
 
-  block_match = PGP_BLOCK_START.match(remaining_contents[0])
+  line_end = raw_contents.find(b'\n', line_start)
 
-  if block_match:
-    block_type = block_match.groups()[0]
-    block_lines = []
-    end_line = PGP_BLOCK_END % block_type
+  if line_end == -1:
+    line_end = content_length
 
-    while True:
-      if not remaining_contents:
-        raise ValueError("Unterminated pgp style block (looking for '%s'):\n%s" % (end_line, '\n'.join(block_lines)))
+  # equivalent to matching against PGP_BLOCK_START
 
-      line = remaining_contents.pop(0)
-      block_lines.append(line)
+  block_type = raw_contents[line_start + 11:line_end - 5]
 
-      if line == end_line:
-        return (block_type, '\n'.join(block_lines))
-  else:
+  if not block_type or not raw_contents.startswith(b'-----', line_end - 5, line_end) or block_type.translate(None, _BLOCK_TYPE_CHAR_BYTES):
     return None
 
+  end_line = b'\n-----END ' + block_type + b'-----'
+  search_start = line_end
+
+  while True:
+    end_start = raw_contents.find(end_line, search_start)
+
+    if end_start == -1:
+      block_type = block_type.decode('utf-8', 'replace')
+      block_lines = raw_contents[line_start:].decode('utf-8', 'replace')
+      raise ValueError("Unterminated pgp style block (looking for '%s'):\n%s" % (PGP_BLOCK_END % block_type, block_lines))
+
+    block_end = end_start + len(end_line)
+
+    # the ending needs to be its own line rather than a prefix of one
 
-def _get_descriptor_components(raw_contents, validate, extra_keywords = ()):
+    if block_end == content_length or raw_contents[block_end:block_end + 1] == b'\n':
+      return (block_type.decode('utf-8', 'replace'), block_end)
+
+    search_start = block_end
+
+
+def _get_descriptor_components(raw_contents, validate, extra_keywords = (), keywords = None, offsets = None):
   """
   Initial breakup of the server descriptor contents to make parsing easier.
 
@@ -637,11 +1821,20 @@ def _get_descriptor_components(raw_contents, validate, extra_keywords = ()):
   entries because this influences the resulting exit policy, but for everything
   else in server descriptors the order does not matter.
 
-  :param str raw_contents: descriptor content provided by the relay
+  This makes a single pass over the descriptor's bytes, only decoding the
+  keywords, values, and blocks that we provide back. If we're only interested
+  in some keywords then other lines are skipped without being decoded.
+
+  :param bytes,memoryview raw_contents: descriptor content provided by the relay
   :param bool validate: checks the validity of the descriptor's content if
     True, skips these checks otherwise
   :param list extra_keywords: entity keywords to put into a separate listing
     with ordering intact
+  :param set keywords: if set then only lines with these keywords are
+    provided, others are skipped
+  :param dict offsets: if set then for each keyword that's a key of this
+    dict we populate its value with the (line_start, value_start, line_end)
+    byte offsets of the keyword's first line
 
   :returns:
     **collections.OrderedDict** with the 'keyword => (value, pgp key) entries'
@@ -649,15 +1842,23 @@ def _get_descriptor_components(raw_contents, validate, extra_keywords = ()):
     value tuple, the second being a list of those entries.
   """
 
-  if isinstance(raw_contents, bytes):
-    raw_contents = stem.util.str_tools._to_unicode(raw_contents)
+  if isinstance(raw_contents, str_type):
+    raw_contents = raw_contents.encode('utf-8')
+  elif not isinstance(raw_contents, bytes):
+    raw_contents = raw_contents.tobytes()  # section of a memory mapped file
 
   entries = OrderedDict()
   extra_entries = []  # entries with a keyword in extra_keywords
-  remaining_lines = raw_contents.split('\n')
+  content_length = len(raw_contents)
+  line_start = 0
 
-  while remaining_lines:
-    line = remaining_lines.pop(0)
+  find, startswith = raw_contents.find, raw_contents.startswith
+
+  while line_start < content_length:
+    line_end = find(b'\n', line_start)
+
+    if line_end == -1:
+      line_end = content_length
 
     # V2 network status documents explicitly can contain blank lines...
     #
@@ -667,46 +1868,92 @@ def _get_descriptor_components(raw_contents, validate, extra_keywords = ()):
     # ... and server descriptors end with an extra newline. But other documents
     # don't say how blank lines should be handled so globally ignoring them.
 
-    if not line:
+    if line_start == line_end:
+      line_start += 1
       continue
 
+    keyword_line_start = line_start
+
     # Some lines have an 'opt ' for backward compatibility. They should be
     # ignored. This prefix is being removed in...
     # https://trac.torproject.org/projects/tor/ticket/5124
 
-    if line.startswith('opt '):
+    line = raw_contents[line_start:line_end]
+
+    if line.startswith(b'opt '):
       line = line[4:]
 
-    line_match = KEYWORD_LINE.match(line)
+    # Keywords are followed by whitespace and an optional value. This is
+    # equivalent to matching against KEYWORD_LINE, but considerably faster.
 
-    if not line_match:
-      if not validate:
-        continue
+    keyword_end = line.find(b' ')
 
-      raise ValueError('Line contains invalid characters: %s' % line)
+    if b'\t' in line:
+      tab_index = line.find(b'\t')
 
-    keyword, value = line_match.groups()
+      if keyword_end == -1 or tab_index < keyword_end:
+        keyword_end = tab_index
 
-    if value is None:
-      value = ''
+    keyword = line if keyword_end == -1 else line[:keyword_end]
+    keyword_str = _KEYWORD_CACHE.get(keyword)
 
-    try:
-      block_attr = _get_pseudo_pgp_block(remaining_lines)
+    if keyword_str is None:
+      if not keyword or keyword.translate(None, _KEYWORD_CHAR_BYTES):
+        if not validate:
+          line_start = line_end + 1
+          continue
 
-      if block_attr:
-        block_type, block_contents = block_attr
-      else:
-        block_type, block_contents = None, None
-    except ValueError as exc:
-      if not validate:
-        continue
+        raise ValueError('Line contains invalid characters: %s' % line.decode('utf-8', 'replace'))
 
-      raise exc
+      keyword_str = _decode_keyword(keyword)
+
+    block_type, block_contents = None, None
+    line_start = line_end + 1
 
-    if keyword in extra_keywords:
-      extra_entries.append('%s %s' % (keyword, value))
+    if keywords is not None and keyword_str not in keywords:
+      # skip this line and any block that follows it
+
+      if startswith(b'-----BEGIN ', line_start):
+        try:
+          block_attr = _get_pseudo_pgp_block(raw_contents, line_start, content_length)
+
+          if block_attr:
+            line_start = block_attr[1] + 1
+        except ValueError as exc:
+          if not validate:
+            break
+
+          raise exc
+
+      continue
+
+    value = b'' if keyword_end == -1 else line[keyword_end + 1:].lstrip(b' \t')
+    value_start = line_end - len(value)
+    value = value.decode('utf-8', 'replace')
+
+    if startswith(b'-----BEGIN ', line_start):
+      try:
+        block_attr = _get_pseudo_pgp_block(raw_contents, line_start, content_length)
+
+        if block_attr:
+          block_type, block_end = block_attr
+          block_contents = raw_contents[line_start:block_end].decode('utf-8', 'replace')
+          line_start = block_end + 1
+      except ValueError as exc:
+        if not validate:
+          break  # unterminated block consumes the rest of our content
+
+        raise exc
+
+    if keyword_str in extra_keywords:
+      extra_entries.append('%s %s' % (keyword_str, value))
+    elif keyword_str in entries:
+      entries[keyword_str].append((value, block_type, block_contents))
     else:
-      entries.setdefault(keyword, []).append((value, block_type, block_contents))
+      entries[keyword_str] = [(value, block_type, block_contents)]
+
+      if offsets is not None and keyword_str in offsets:
+        offsets[keyword_str] = (keyword_line_start, value_start, line_end)
 
   if extra_keywords:
     return entries, extra_entries
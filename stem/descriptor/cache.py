@@ -0,0 +1,401 @@
+# Copyright 2015, Damian Johnson and The Tor Project
+# See LICENSE for licensing information
+
+"""
+Persistent cache of parsed descriptors. Parsing is by far the most expensive
+part of reading descriptors, so if you're repeatedly reading the same files
+(for instance, running analytics over CollecTor archives each day) then a
+cache lets subsequent runs skip it...
+
+::
+
+  from stem.descriptor import parse_file
+  from stem.descriptor.cache import DescriptorCache
+
+  cache = DescriptorCache('/tmp/descriptor_cache', max_size = 2 * 1024 * 1024 * 1024)
+
+  # first run parses the archive, later runs load it from the cache
+  for desc in parse_file('/tmp/server-descriptors-2014-12.tar', cache = cache):
+    print desc.nickname
+
+The :class:`~stem.descriptor.reader.DescriptorReader` accepts a cache too.
+
+Cached files are identified by their path, size, modification time, and a hash
+of their content. If a file's size or modification time changes we check its
+content, so touching or copying a file doesn't invalidate its cached
+descriptors but modifying it does. Descriptors are keyed on how they were
+parsed as well (their descriptor type, validation, document handler, and
+other constructor arguments).
+
+Descriptors are stored with pickle, so only use a cache directory that you
+trust. Cached descriptors are fully parsed rather than lazy loaded.
+
+**Module Overview:**
+
+::
+
+  DescriptorCache - Persistent cache of parsed descriptors
+    |- get - provides the cached descriptors of a file
+    |- put - caches the descriptors of a file
+    |- size - total size of our cached descriptors
+    +- clear - removes all cached descriptors
+
+.. data:: DEFAULT_MAX_SIZE (int)
+
+  Default limit for the bytes of descriptors we'll cache (1 GB).
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+try:
+  import cPickle as pickle
+except ImportError:
+  import pickle
+
+import stem
+
+DEFAULT_MAX_SIZE = 1024 * 1024 * 1024
+INDEX_FILENAME = 'index'
+READ_SIZE = 1024 * 1024
+
+
+class DescriptorCache(object):
+  """
+  Directory of parsed descriptors, evicting the least recently used files
+  once they exceed our size limit. This is thread safe, but not safe to use
+  from multiple processes at once.
+
+  :var str path: directory our cache resides in
+  :var int max_size: bytes of descriptors we'll keep before evicting the
+    least recently used
+  """
+
+  def __init__(self, path, max_size = DEFAULT_MAX_SIZE):
+    """
+    Opens a cache, creating its directory if it doesn't already exist.
+
+    :param str path: directory to keep our cache in
+    :param int max_size: bytes of descriptors to keep before evicting the
+      least recently used
+
+    :raises: **IOError** if unable to create the directory
+    """
+
+    self.path = path
+    self.max_size = max_size
+    self._lock = threading.RLock()
+
+    # File identities ('path => (size, modification time, content digest)')
+    # and our cache entries ('key => (size, last used)').
+
+    self._files = {}
+    self._entries = {}
+
+    try:
+      if not os.path.exists(path):
+        os.makedirs(path)
+    except OSError as exc:
+      raise IOError(exc)
+
+    self._load_index()
+
+  def get(self, path, descriptor_type = None, validate = False, document_handler = 'ENTRIES', kwargs = None):
+    """
+    Provides the cached descriptors of a file.
+
+    :param str path: file the descriptors were read from
+    :param str descriptor_type: descriptor type the file was parsed as
+    :param bool validate: if the descriptors were validated
+    :param stem.descriptor.__init__.DocumentHandler document_handler: method
+      the file's network status documents were parsed with
+    :param dict kwargs: additional arguments for the descriptor constructor
+
+    :returns: iterator for the :class:`~stem.descriptor.__init__.Descriptor`
+      from the file, or **None** if it isn't in our cache
+
+    :raises: **IOError** from the iterator if the cached descriptors turn out
+      to be unreadable, in which case they're removed from our cache
+    """
+
+    with self._lock:
+      key = self._key(path, descriptor_type, validate, document_handler, kwargs)
+
+      if key is None or key not in self._entries:
+        return None
+
+      try:
+        entry_file = open(self._entry_path(key), 'rb')
+      except IOError:
+        self._remove(key)
+        self._save_index()
+        return None
+
+      self._entries[key] = (self._entries[key][0], time.time())
+      self._save_index()
+
+    return self._read_entry(key, entry_file)
+
+  def put(self, path, descriptors, descriptor_type = None, validate = False, document_handler = 'ENTRIES', kwargs = None):
+    """
+    Caches the descriptors of a file, evicting the least recently used files
+    if this takes us over our size limit. Lazy loaded descriptors are fully
+    parsed.
+
+    :param str path: file the descriptors were read from
+    :param list descriptors: :class:`~stem.descriptor.__init__.Descriptor`
+      from the file
+    :param str descriptor_type: descriptor type the file was parsed as
+    :param bool validate: if the descriptors were validated
+    :param stem.descriptor.__init__.DocumentHandler document_handler: method
+      the file's network status documents were parsed with
+    :param dict kwargs: additional arguments for the descriptor constructor
+
+    :returns: **True** if the descriptors were cached, **False** if they're
+      larger than our size limit or the file can't be read
+    """
+
+    writer = self._writer(path, descriptor_type, validate, document_handler, kwargs)
+
+    if writer is None:
+      return False
+
+    try:
+      for desc in descriptors:
+        writer.add(desc)
+    except:
+      writer.discard()
+      raise
+
+    return writer.commit()
+
+  def size(self):
+    """
+    Provides the total size of our cached descriptors.
+
+    :returns: **int** with the bytes of descriptors in our cache
+    """
+
+    with self._lock:
+      return sum([entry_size for (entry_size, _) in self._entries.values()])
+
+  def clear(self):
+    """
+    Removes all of our cached descriptors.
+    """
+
+    with self._lock:
+      for key in list(self._entries):
+        self._remove(key)
+
+      self._files = {}
+      self._save_index()
+
+  def _key(self, path, descriptor_type, validate, document_handler, kwargs):
+    """
+    Provides the cache key for a file, hashing its content if its size or
+    modification time has changed since we last saw it.
+
+    :returns: **str** key for the file, or **None** if it can't be read
+    """
+
+    path = os.path.abspath(path)
+
+    try:
+      stat = os.stat(path)
+      file_identity = self._files.get(path)
+
+      if file_identity and file_identity[:2] == (stat.st_size, stat.st_mtime):
+        content_digest = file_identity[2]
+      else:
+        content_digest = _file_digest(path)
+        self._files[path] = (stat.st_size, stat.st_mtime, content_digest)
+    except (IOError, OSError):
+      return None
+
+    parse_options = (stem.__version__, descriptor_type, validate, str(document_handler), sorted((kwargs or {}).items()))
+    return hashlib.sha1(('%s %r' % (content_digest, parse_options)).encode('utf-8')).hexdigest()
+
+  def _entry_path(self, key):
+    return os.path.join(self.path, '%s.pickle' % key)
+
+  def _writer(self, path, descriptor_type, validate, document_handler, kwargs):
+    """
+    Provides a writer that caches descriptors as they're parsed.
+
+    :returns: :class:`~stem.descriptor.cache._CacheWriter` for the file, or
+      **None** if it can't be read
+    """
+
+    with self._lock:
+      key = self._key(path, descriptor_type, validate, document_handler, kwargs)
+
+    return None if key is None else _CacheWriter(self, key)
+
+  def _commit(self, key, temp_path):
+    """
+    Adds a written entry to our cache, evicting the least recently used
+    entries if we're over our size limit.
+    """
+
+    entry_size = os.path.getsize(temp_path)
+
+    if entry_size > self.max_size:
+      os.remove(temp_path)
+      return False
+
+    with self._lock:
+      self._remove(key)
+      os.rename(temp_path, self._entry_path(key))
+      self._entries[key] = (entry_size, time.time())
+
+      cache_size = self.size()
+
+      for evicted_key, (evicted_size, _) in sorted(self._entries.items(), key = lambda entry: entry[1][1]):
+        if cache_size <= self.max_size:
+          break
+
+        self._remove(evicted_key)
+        cache_size -= evicted_size
+
+      self._save_index()
+      return True
+
+  def _read_entry(self, key, entry_file):
+    """
+    Unpickles the descriptors of a cache entry as they're requested.
+    """
+
+    try:
+      unpickler = pickle.Unpickler(entry_file)
+
+      while True:
+        try:
+          desc = unpickler.load()
+        except EOFError:
+          break
+        except Exception as exc:
+          with self._lock:
+            self._remove(key)
+            self._save_index()
+
+          raise IOError('Cached descriptors for this file are unreadable: %s' % exc)
+
+        yield desc
+    finally:
+      entry_file.close()
+
+  def _remove(self, key):
+    if self._entries.pop(key, None) is not None:
+      try:
+        os.remove(self._entry_path(key))
+      except OSError:
+        pass
+
+  def _load_index(self):
+    try:
+      with open(os.path.join(self.path, INDEX_FILENAME), 'rb') as index_file:
+        self._files, self._entries = pickle.load(index_file)
+    except Exception:
+      pass  # no index yet or it's unreadable, in which case we start fresh
+
+    # drops anything whose entry file is missing
+
+    for key in list(self._entries):
+      if not os.path.exists(self._entry_path(key)):
+        del self._entries[key]
+
+  def _save_index(self):
+    try:
+      _write_atomically(os.path.join(self.path, INDEX_FILENAME), pickle.dumps((self._files, self._entries), pickle.HIGHEST_PROTOCOL))
+    except (IOError, OSError):
+      pass
+
+
+class _CacheWriter(object):
+  """
+  Pickles descriptors to a temporary file as they're parsed, which becomes a
+  cache entry once we've read the whole file. Descriptors are written before
+  they're provided to the caller, so they're cached as they were parsed even
+  if the caller modifies (or compacts) them.
+  """
+
+  def __init__(self, cache, key):
+    self._cache = cache
+    self._key = key
+
+    file_descriptor, self._temp_path = tempfile.mkstemp(suffix = '.tmp', dir = cache.path)
+    self._temp_file = os.fdopen(file_descriptor, 'wb')
+    self._pickler = pickle.Pickler(self._temp_file, pickle.HIGHEST_PROTOCOL)
+
+  def add(self, desc):
+    """
+    Fully parses a descriptor and writes it to our temporary file.
+
+    :param stem.descriptor.__init__.Descriptor desc: descriptor to be cached
+    """
+
+    if getattr(desc, '_lazy_loading', False):
+      desc.get_unrecognized_lines()
+      desc._entries = {}
+
+    self._pickler.dump(desc)
+
+  def commit(self):
+    """
+    Adds the descriptors we've written to the cache.
+
+    :returns: **True** if the descriptors were cached, **False** if they're
+      larger than the cache's size limit
+    """
+
+    self._temp_file.close()
+    return self._cache._commit(self._key, self._temp_path)
+
+  def discard(self):
+    """
+    Drops the descriptors we've written.
+    """
+
+    self._temp_file.close()
+
+    try:
+      os.remove(self._temp_path)
+    except OSError:
+      pass
+
+
+def _file_digest(path):
+  """
+  Provides the sha1 digest of a file's content.
+  """
+
+  digest = hashlib.sha1()
+
+  with open(path, 'rb') as digest_file:
+    while True:
+      block = digest_file.read(READ_SIZE)
+
+      if not block:
+        break
+
+      digest.update(block)
+
+  return digest.hexdigest()
+
+
+def _write_atomically(path, content):
+  """
+  Writes to a temporary file then renames it so readers never see partially
+  written content.
+  """
+
+  temp_path = '%s.tmp' % path
+
+  with open(temp_path, 'wb') as output_file:
+    output_file.write(content)
+
+  os.rename(temp_path, path)
@@ -0,0 +1,413 @@
+# Copyright 2015, Damian Johnson and The Tor Project
+# See LICENSE for licensing information
+
+"""
+History of the relays across a series of v3 network status documents. Most
+router status entries are identical from one hourly consensus to the next, so
+rather than keeping every document we keep each distinct entry once, along
+with the periods where it appeared. Memory then scales with the number of
+distinct entries rather than the number of documents times relays...
+
+::
+
+  from stem.descriptor.consensus_history import ConsensusHistory
+  from stem.descriptor.reader import DescriptorReader
+
+  history = ConsensusHistory()
+
+  with DescriptorReader('/tmp/consensuses-2014-12.tar') as reader:
+    for router in reader:
+      history.add(router)
+
+  for valid_after, bandwidth in history.bandwidth_series('9695DFC35FFEB861329B9F1AB04C46397020CE31'):
+    print '%s: %s' % (valid_after, bandwidth)
+
+Entries are identified by a hash of their content. If a document's entry has
+already been seen then we use the prior instance, so an entry's **document**
+attribute is the first document it appeared in.
+
+Documents can be added in any order. When reading files directly,
+:func:`~stem.descriptor.consensus_history.ConsensusHistory.add_file` only
+parses entries we haven't seen before.
+
+**Module Overview:**
+
+::
+
+  ConsensusHistory - Relays across a series of network status documents
+    |- add - adds a document or router status entry
+    |- add_file - reads a network status document from disk
+    |- valid_afters - times of the documents we've read
+    |- fingerprints - relays that have appeared in our documents
+    |- entry_count - number of distinct router status entries
+    |- get_entry - router status entry of a relay in a document
+    |- periods - when each of a relay's entries were in the consensus
+    |- first_seen - first document with a relay
+    |- last_seen - last document with a relay
+    |- flag_changes - changes in a relay's flags
+    |- bandwidth_series - a relay's bandwidth in each document
+    +- __len__ - number of documents we've read
+
+.. data:: RelayPeriod (namedtuple)
+
+  Consecutive documents in which a relay had the same router status entry.
+
+  :var datetime start: valid-after time of the first document
+  :var datetime end: valid-after time of the last document
+  :var RouterStatusEntry entry: router status entry in these documents
+"""
+
+import bisect
+import collections
+import copy
+import datetime
+import hashlib
+import threading
+
+import stem.descriptor.networkstatus
+import stem.descriptor.router_status_entry
+import stem.util.str_tools
+
+from stem.descriptor import _entry_spans
+
+RelayPeriod = collections.namedtuple('RelayPeriod', [
+  'start',
+  'end',
+  'entry',
+])
+
+
+class ConsensusHistory(object):
+  """
+  Distinct router status entries across a series of v3 network status
+  documents, along with when they appeared. This is thread safe.
+  """
+
+  def __init__(self, validate = False):
+    """
+    :param bool validate: checks the validity of documents read by
+      :func:`~stem.descriptor.consensus_history.ConsensusHistory.add_file`
+      if **True**, skips these checks otherwise
+    """
+
+    self.validate = validate
+
+    self._lock = threading.RLock()
+    self._valid_afters = []  # sorted valid-after times of our documents
+    self._entries = {}  # content digest => router status entry
+
+    # Fingerprint => periods during which a relay had an entry, sorted and
+    # non-overlapping. Periods are mutable [start, end, entry] lists.
+
+    self._periods = {}
+
+  def add(self, descriptor):
+    """
+    Adds a network status document's router status entries, or a single
+    router status entry (such as those provided by the
+    :class:`~stem.descriptor.reader.DescriptorReader`). Entries we keep from a
+    document are copies that reference the document without its router status
+    entries, so we don't hold onto the whole document.
+
+    :param stem.descriptor.Descriptor descriptor:
+      :class:`~stem.descriptor.networkstatus.NetworkStatusDocumentV3` or
+      :class:`~stem.descriptor.router_status_entry.RouterStatusEntryV3` to add
+
+    :raises: **ValueError** if the descriptor isn't a document or router status
+      entry, or lacks a valid-after time
+    """
+
+    if isinstance(descriptor, stem.descriptor.networkstatus.NetworkStatusDocumentV3):
+      valid_after, entries = descriptor.valid_after, list(descriptor.routers.values())
+    elif isinstance(descriptor, stem.descriptor.router_status_entry.RouterStatusEntry):
+      valid_after, entries = getattr(descriptor.document, 'valid_after', None), [descriptor]
+    else:
+      raise ValueError('We can only add v3 network status documents and their router status entries, not %s' % type(descriptor).__name__)
+
+    if valid_after is None:
+      raise ValueError("Router status entries can only be added if they're from a document with a valid-after time")
+
+    with self._lock:
+      self._add_document(valid_after)
+      bare_document = None
+
+      for entry in entries:
+        digest = _digest(stem.util.str_tools._to_bytes(entry.get_bytes()))
+        stored_entry = self._entries.get(digest)
+
+        if stored_entry is None:
+          # Entries we keep reference a copy of the document without its
+          # router status entries, like those from add_file(), so we don't
+          # retain the whole document.
+
+          if entry.document is descriptor:
+            if bare_document is None:
+              bare_document = _bare_document(descriptor)
+
+            entry = copy.copy(entry)
+            entry.document = bare_document
+
+          stored_entry = self._entries[digest] = entry
+
+        self._add_entry(valid_after, stored_entry)
+
+  def add_file(self, path):
+    """
+    Reads a v3 network status document from disk, only parsing the router
+    status entries we haven't seen before.
+
+    :param str path: location of the document
+
+    :raises:
+      * **ValueError** if validate is **True** and the document is malformed
+      * **IOError** if the document can't be read
+    """
+
+    with open(path, 'rb') as document_file:
+      content = document_file.read()
+
+    header_start, routers_start, routers_end = stem.descriptor.networkstatus._document_sections(content)
+    document = stem.descriptor.networkstatus.NetworkStatusDocumentV3(content[header_start:routers_start] + content[routers_end:], self.validate)
+
+    if document.valid_after is None:
+      raise ValueError("%s doesn't have a valid-after time" % path)
+
+    if document.is_microdescriptor:
+      router_type = stem.descriptor.router_status_entry.RouterStatusEntryMicroV3
+    else:
+      router_type = stem.descriptor.router_status_entry.RouterStatusEntryV3
+
+    with self._lock:
+      self._add_document(document.valid_after)
+
+      for entry_start, entry_end in _entry_spans(content, (stem.descriptor.networkstatus.ROUTERS_START,), routers_start, routers_end):
+        entry_content = content[entry_start:entry_end]
+        digest = _digest(entry_content)
+        entry = self._entries.get(digest)
+
+        if entry is None:
+          entry = self._entries[digest] = router_type(entry_content, self.validate, document)
+
+        self._add_entry(document.valid_after, entry)
+
+  def valid_afters(self):
+    """
+    Provides the valid-after times of the documents we've read.
+
+    :returns: sorted **list** of **datetime** for our documents
+    """
+
+    with self._lock:
+      return list(self._valid_afters)
+
+  def fingerprints(self):
+    """
+    Provides the relays that have appeared in any of our documents.
+
+    :returns: **list** of relay fingerprints
+    """
+
+    with self._lock:
+      return list(self._periods.keys())
+
+  def entry_count(self):
+    """
+    Provides the number of distinct router status entries we have.
+
+    :returns: **int** for the number of distinct entries
+    """
+
+    with self._lock:
+      return len(self._entries)
+
+  def get_entry(self, fingerprint, valid_after, default = None):
+    """
+    Provides a relay's router status entry in a document.
+
+    :param str fingerprint: fingerprint of the relay
+    :param datetime valid_after: valid-after time of the document
+    :param object default: response if the relay isn't in the document
+
+    :returns: :class:`~stem.descriptor.router_status_entry.RouterStatusEntryV3`
+      for the relay, or the default if it isn't in the document
+    """
+
+    with self._lock:
+      periods = self._periods.get(fingerprint.upper(), [])
+      index = _period_index(periods, valid_after)
+
+      document_index = bisect.bisect_left(self._valid_afters, valid_after)
+      is_document = document_index < len(self._valid_afters) and self._valid_afters[document_index] == valid_after
+
+      if is_document and index != -1 and periods[index][1] >= valid_after:
+        return periods[index][2]
+
+      return default
+
+  def periods(self, fingerprint):
+    """
+    Provides when each of a relay's router status entries were in the
+    consensus. Gaps between periods are either documents the relay wasn't in,
+    or it having a different entry.
+
+    :param str fingerprint: fingerprint of the relay
+
+    :returns: **list** of :data:`~stem.descriptor.consensus_history.RelayPeriod`
+      in chronological order
+    """
+
+    with self._lock:
+      return [RelayPeriod(*period) for period in self._periods.get(fingerprint.upper(), [])]
+
+  def first_seen(self, fingerprint):
+    """
+    Provides the first document a relay appeared in.
+
+    :param str fingerprint: fingerprint of the relay
+
+    :returns: **datetime** valid-after time of the document, **None** if the
+      relay hasn't been seen
+    """
+
+    periods = self.periods(fingerprint)
+    return periods[0].start if periods else None
+
+  def last_seen(self, fingerprint):
+    """
+    Provides the last document a relay appeared in.
+
+    :param str fingerprint: fingerprint of the relay
+
+    :returns: **datetime** valid-after time of the document, **None** if the
+      relay hasn't been seen
+    """
+
+    periods = self.periods(fingerprint)
+    return periods[-1].end if periods else None
+
+  def flag_changes(self, fingerprint):
+    """
+    Provides the changes in a relay's flags. Documents that the relay isn't in
+    are skipped, so flags only change when it has a different entry.
+
+    :param str fingerprint: fingerprint of the relay
+
+    :returns: **list** of (valid_after, added_flags, removed_flags) tuples,
+      where the flags are sets, for when the relay's flags changed
+    """
+
+    changes, previous_flags = [], None
+
+    for period in self.periods(fingerprint):
+      flags = set(period.entry.flags)
+
+      if previous_flags is not None and flags != previous_flags:
+        changes.append((period.start, flags - previous_flags, previous_flags - flags))
+
+      previous_flags = flags
+
+    return changes
+
+  def bandwidth_series(self, fingerprint):
+    """
+    Provides a relay's bandwidth in each of the documents it appeared in.
+
+    :param str fingerprint: fingerprint of the relay
+
+    :returns: **list** of (valid_after, bandwidth) tuples in chronological
+      order, the bandwidth being **None** if the entry lacked one
+    """
+
+    with self._lock:
+      series = []
+
+      for start, end, entry in self._periods.get(fingerprint.upper(), []):
+        start_index = bisect.bisect_left(self._valid_afters, start)
+        end_index = bisect.bisect_right(self._valid_afters, end)
+
+        for valid_after in self._valid_afters[start_index:end_index]:
+          series.append((valid_after, entry.bandwidth))
+
+      return series
+
+  def _add_document(self, valid_after):
+    """
+    Registers a document's valid-after time. If this falls between documents
+    we already have then periods spanning it are split, since they're only
+    continued by relays with the same entry.
+    """
+
+    index = bisect.bisect_left(self._valid_afters, valid_after)
+
+    if index < len(self._valid_afters) and self._valid_afters[index] == valid_after:
+      return
+
+    self._valid_afters.insert(index, valid_after)
+
+    if 0 < index < len(self._valid_afters) - 1:
+      previous_time, next_time = self._valid_afters[index - 1], self._valid_afters[index + 1]
+
+      for periods in self._periods.values():
+        period_index = _period_index(periods, previous_time)
+
+        if period_index != -1 and periods[period_index][1] >= next_time:
+          start, end, entry = periods[period_index]
+          periods[period_index:period_index + 1] = [[start, previous_time, entry], [next_time, end, entry]]
+
+  def _add_entry(self, valid_after, entry):
+    """
+    Adds an entry to its relay's periods, joining the periods of the
+    neighboring documents if they had the same entry.
+    """
+
+    periods = self._periods.setdefault(entry.fingerprint, [])
+    index = _period_index(periods, valid_after)
+
+    if index != -1 and periods[index][1] >= valid_after:
+      return  # already have an entry for this document
+
+    document_index = bisect.bisect_left(self._valid_afters, valid_after)
+    previous_time = self._valid_afters[document_index - 1] if document_index > 0 else None
+    next_time = self._valid_afters[document_index + 1] if document_index + 1 < len(self._valid_afters) else None
+
+    left = periods[index] if index != -1 and periods[index][1] == previous_time and periods[index][2] is entry else None
+    right = periods[index + 1] if index + 1 < len(periods) and periods[index + 1][0] == next_time and periods[index + 1][2] is entry else None
+
+    if left and right:
+      left[1] = right[1]
+      del periods[index + 1]
+    elif left:
+      left[1] = valid_after
+    elif right:
+      right[0] = valid_after
+    else:
+      periods.insert(index + 1, [valid_after, valid_after, entry])
+
+  def __len__(self):
+    with self._lock:
+      return len(self._valid_afters)
+
+
+def _period_index(periods, valid_after):
+  """
+  Provides the index of the last period starting at or before the given time,
+  or -1 if there isn't one.
+  """
+
+  return bisect.bisect_right(periods, [valid_after, datetime.datetime.max]) - 1
+
+
+def _bare_document(document):
+  """
+  Provides a copy of a network status document without its router status
+  entries.
+  """
+
+  content = stem.util.str_tools._to_bytes(document.get_bytes())
+  header_start, routers_start, routers_end = stem.descriptor.networkstatus._document_sections(content)
+
+  return stem.descriptor.networkstatus.NetworkStatusDocumentV3(content[header_start:routers_start] + content[routers_end:])
+
+
+def _digest(content):
+  return hashlib.sha1(content).digest()
@@ -0,0 +1,524 @@
+# Copyright 2015, Damian Johnson and The Tor Project
+# See LICENSE for licensing information
+
+"""
+Joins router status entries with the descriptors they reference. Entries of a
+consensus refer to a relay's server descriptor by its digest, microdescriptor
+flavored entries refer to its microdescriptor, and server descriptors in turn
+refer to their extra-info descriptor. This store indexes descriptors by these
+digests so following a reference is a dictionary lookup...
+
+::
+
+  from stem.descriptor import DocumentHandler, parse_file
+  from stem.descriptor.descriptor_store import DescriptorStore
+
+  store = DescriptorStore()
+  store.add_file('/tmp/server-descriptors-2014-12/cached-descriptors')
+  store.add_file('/tmp/extra-infos-2014-12/cached-extrainfo')
+
+  consensus = next(parse_file('/tmp/cached-consensus', document_handler = DocumentHandler.DOCUMENT))
+
+  for router in consensus.routers.values():
+    server_desc = store.get_server_descriptor(router)
+    extrainfo_desc = store.get_extrainfo_descriptor(server_desc) if server_desc else None
+
+    if extrainfo_desc:
+      print '%s has written %s bytes' % (router.nickname, sum(extrainfo_desc.write_history_values))
+
+Descriptors from :func:`~stem.descriptor.descriptor_store.DescriptorStore.add_file`
+aren't kept in memory. Rather, we scan the file for where each descriptor
+resides and only read and parse a descriptor when it's asked for. Descriptors
+read this way don't include their annotations.
+
+Tor keeps its microdescriptors in a 'cached-microdescs' file, along with a
+'cached-microdescs.new' journal of those it has received since it last
+rewrote the file. A :class:`~stem.descriptor.descriptor_store.MicrodescriptorStore`
+indexes both, so getting the microdescriptors of a consensus' relays is a
+lookup for each rather than parsing the whole cache...
+
+::
+
+  from stem.descriptor.descriptor_store import MicrodescriptorStore
+
+  store = MicrodescriptorStore('/var/lib/tor')
+
+  for router in controller.get_network_statuses():
+    desc = store.get_microdescriptor(router)
+
+    if desc and desc.exit_policy.is_exiting_allowed():
+      print '%s is an exit' % router.nickname
+
+**Module Overview:**
+
+::
+
+  DescriptorStore - Descriptors indexed by their digest
+    |- add - adds a descriptor we've already parsed
+    |- add_file - indexes the descriptors in a file
+    |- get_server_descriptor - server descriptor of a router status entry
+    |- get_extrainfo_descriptor - extra-info descriptor of a server descriptor
+    |- get_microdescriptor - microdescriptor of a router status entry
+    |- join - descriptor referenced by a router status entry
+    |- __contains__ - checks if we have a descriptor with a digest
+    +- __len__ - number of descriptors we have
+
+  MicrodescriptorStore - Microdescriptors in tor's data directory
+    |- reload - indexes tor's microdescriptors again if they've changed
+    |- close - releases the files we've memory mapped
+    +- __iter__ - microdescriptors we have
+"""
+
+import binascii
+import hashlib
+import os
+import threading
+
+import stem.util.str_tools
+
+from stem.descriptor import (
+  _MappedFile,
+  _find_line_starting_with,
+  _line_end,
+  _signed_spans,
+)
+
+from stem.descriptor.extrainfo_descriptor import RelayExtraInfoDescriptor
+from stem.descriptor.microdescriptor import Microdescriptor, _descriptor_spans
+from stem.descriptor.router_status_entry import RouterStatusEntryV3, RouterStatusEntryMicroV3
+from stem.descriptor.server_descriptor import RelayDescriptor
+
+SERVER_DESCRIPTOR = 'server-descriptor'
+EXTRAINFO_DESCRIPTOR = 'extra-info'
+MICRODESCRIPTOR = 'microdescriptor'
+
+DESCRIPTOR_CLASS = {
+  SERVER_DESCRIPTOR: RelayDescriptor,
+  EXTRAINFO_DESCRIPTOR: RelayExtraInfoDescriptor,
+  MICRODESCRIPTOR: Microdescriptor,
+}
+
+# first keyword of each type of descriptor, used to tell what a file contains
+
+FIRST_KEYWORD = {
+  b'router': SERVER_DESCRIPTOR,
+  b'extra-info': EXTRAINFO_DESCRIPTOR,
+  b'onion-key': MICRODESCRIPTOR,
+}
+
+
+class DescriptorStore(object):
+  """
+  Relay server descriptors, extra-info descriptors, and microdescriptors keyed
+  on their digest. This is thread safe.
+
+  :var bool validate: checks the validity of descriptors we read from files
+  """
+
+  def __init__(self, validate = False):
+    """
+    :param bool validate: checks the validity of descriptors read from files if
+      **True**, skips these checks otherwise
+    """
+
+    self.validate = validate
+
+    self._lock = threading.RLock()
+
+    # Descriptors of each type, keyed on their raw digest. Values are either
+    # the descriptor or a (file_index, start, end) tuple for where it resides.
+
+    self._descriptors = dict((descriptor_type, {}) for descriptor_type in DESCRIPTOR_CLASS)
+
+    # (path, file identity, content) tuples of the files we've indexed, where
+    # the content is what we kept of the file (usually a memory mapping), and
+    # None if we read descriptors from disk
+
+    self._files = []
+
+  def add(self, descriptor):
+    """
+    Adds a descriptor that we've already parsed.
+
+    :param stem.descriptor.Descriptor descriptor:
+      :class:`~stem.descriptor.server_descriptor.RelayDescriptor`,
+      :class:`~stem.descriptor.extrainfo_descriptor.RelayExtraInfoDescriptor`,
+      or :class:`~stem.descriptor.microdescriptor.Microdescriptor` to add
+
+    :raises: **ValueError** if this isn't a descriptor type we store
+    """
+
+    if isinstance(descriptor, RelayDescriptor):
+      descriptor_type, digest = SERVER_DESCRIPTOR, descriptor.digest()
+    elif isinstance(descriptor, RelayExtraInfoDescriptor):
+      descriptor_type, digest = EXTRAINFO_DESCRIPTOR, descriptor.digest()
+    elif isinstance(descriptor, Microdescriptor):
+      descriptor_type, digest = MICRODESCRIPTOR, descriptor.digest
+    else:
+      raise ValueError('We can only store relay server descriptors, extra-info descriptors, and microdescriptors, not %s' % type(descriptor).__name__)
+
+    with self._lock:
+      self._descriptors[descriptor_type][_to_raw_digest(digest)] = descriptor
+
+  def add_file(self, path):
+    """
+    Indexes the descriptors in a file of server descriptors, extra-info
+    descriptors, or microdescriptors (such as tor's cached-descriptors,
+    cached-extrainfo, and cached-microdescs). Descriptors are read from the
+    file when they're asked for, so it shouldn't be modified after this.
+
+    :param str path: location of the descriptors
+
+    :returns: **int** with the number of descriptors we indexed
+
+    :raises:
+      * **ValueError** if we can't tell what type of descriptors the file has
+      * **IOError** if the file can't be read
+    """
+
+    return self._add_file(path)[1]
+
+  def _add_file(self, path, keep_content = False):
+    """
+    Indexes the descriptors in a file, optionally keeping its content (a
+    memory mapping if possible) to read descriptors from.
+
+    :returns: **tuple** of the form (descriptor type, number indexed), the
+      type being **None** if the file is empty
+    """
+
+    content = _MappedFile.for_path(path)
+
+    if content is None:
+      with open(path, 'rb') as descriptor_file:
+        content = descriptor_file.read()
+
+    offsets = {}
+
+    try:
+      descriptor_type = _descriptor_type(content)
+
+      if descriptor_type is None:
+        return None, 0
+
+      for start, end, digest in _scan(content, descriptor_type):
+        offsets[digest] = (start, end)
+    finally:
+      if isinstance(content, _MappedFile) and not (keep_content and offsets):
+        content.release()
+
+    with self._lock:
+      file_index = len(self._files)
+      self._files.append((path, _file_identity(os.stat(path)), content if (keep_content and offsets) else None))
+
+      descriptors = self._descriptors[descriptor_type]
+
+      for digest, (start, end) in offsets.items():
+        descriptors[digest] = (file_index, start, end)
+
+    return descriptor_type, len(offsets)
+
+  def get_server_descriptor(self, digest, default = None):
+    """
+    Provides the server descriptor with a digest.
+
+    :param str,RouterStatusEntryV3 digest: hex or raw digest of the server
+      descriptor, or the router status entry that references it
+    :param object default: response if we don't have the descriptor
+
+    :returns: :class:`~stem.descriptor.server_descriptor.RelayDescriptor` with
+      this digest, or the default if we don't have it
+
+    :raises:
+      * **ValueError** if validate is **True** and the descriptor is malformed
+      * **IOError** if the descriptor's file can't be read
+    """
+
+    if isinstance(digest, RouterStatusEntryV3):
+      digest = digest.digest
+
+    return self._get(SERVER_DESCRIPTOR, digest, default)
+
+  def get_extrainfo_descriptor(self, digest, default = None):
+    """
+    Provides the extra-info descriptor with a digest.
+
+    :param str,RelayDescriptor digest: hex or raw digest of the extra-info
+      descriptor, or the server descriptor that references it
+    :param object default: response if we don't have the descriptor
+
+    :returns: :class:`~stem.descriptor.extrainfo_descriptor.RelayExtraInfoDescriptor`
+      with this digest, or the default if we don't have it
+
+    :raises:
+      * **ValueError** if validate is **True** and the descriptor is malformed
+      * **IOError** if the descriptor's file can't be read
+    """
+
+    if isinstance(digest, RelayDescriptor):
+      digest = digest.extra_info_digest
+
+    return self._get(EXTRAINFO_DESCRIPTOR, digest, default)
+
+  def get_microdescriptor(self, digest, default = None):
+    """
+    Provides the microdescriptor with a digest.
+
+    :param str,RouterStatusEntryMicroV3 digest: hex or raw sha256 digest of the
+      microdescriptor, or the router status entry that references it
+    :param object default: response if we don't have the descriptor
+
+    :returns: :class:`~stem.descriptor.microdescriptor.Microdescriptor` with
+      this digest, or the default if we don't have it
+
+    :raises:
+      * **ValueError** if validate is **True** and the descriptor is malformed
+      * **IOError** if the descriptor's file can't be read
+    """
+
+    if isinstance(digest, RouterStatusEntryMicroV3):
+      digest = digest.digest
+
+    return self._get(MICRODESCRIPTOR, digest, default)
+
+  def join(self, router, default = None):
+    """
+    Provides the descriptor a router status entry references. This is the
+    server descriptor for entries of a normal consensus, and the
+    microdescriptor for entries of a microdescriptor flavored consensus.
+
+    :param RouterStatusEntry router: router status entry to provide the
+      descriptor for
+    :param object default: response if we don't have the descriptor
+
+    :returns: :class:`~stem.descriptor.server_descriptor.RelayDescriptor` or
+      :class:`~stem.descriptor.microdescriptor.Microdescriptor` referenced by
+      the entry, or the default if we don't have it
+
+    :raises:
+      * **ValueError** if this isn't a v3 router status entry, or validate is
+        **True** and the descriptor is malformed
+      * **IOError** if the descriptor's file can't be read
+    """
+
+    if isinstance(router, RouterStatusEntryMicroV3):
+      return self.get_microdescriptor(router, default)
+    elif isinstance(router, RouterStatusEntryV3):
+      return self.get_server_descriptor(router, default)
+    else:
+      raise ValueError('We can only join v3 router status entries, not %s' % type(router).__name__)
+
+  def _get(self, descriptor_type, digest, default):
+    digest = _to_raw_digest(digest)
+
+    with self._lock:
+      descriptor = self._descriptors[descriptor_type].get(digest)
+
+      if descriptor is None or not isinstance(descriptor, tuple):
+        return default if descriptor is None else descriptor
+
+      file_index, start, end = descriptor
+      path, file_identity, content = self._files[file_index]
+
+      if content is not None:
+        content = content[start:end]
+
+    if content is None:
+      with open(path, 'rb') as descriptor_file:
+        if _file_identity(os.fstat(descriptor_file.fileno())) != file_identity:
+          raise IOError('%s has changed since we indexed it' % path)
+
+        descriptor_file.seek(start)
+        content = descriptor_file.read(end - start)
+
+    descriptor = DESCRIPTOR_CLASS[descriptor_type](content, self.validate)
+    descriptor._set_path(os.path.abspath(path))
+
+    return descriptor
+
+  def __contains__(self, digest):
+    digest = _to_raw_digest(digest)
+
+    with self._lock:
+      return any(digest in descriptors for descriptors in self._descriptors.values())
+
+  def __len__(self):
+    with self._lock:
+      return sum([len(descriptors) for descriptors in self._descriptors.values()])
+
+
+class MicrodescriptorStore(DescriptorStore):
+  """
+  Microdescriptors in tor's data directory. Tor keeps these in its
+  'cached-microdescs' file and a 'cached-microdescs.new' journal of those it
+  has received since it last rewrote the file. We memory map both and index
+  their microdescriptors by digest, replaying the journal on top of the cache.
+
+  Tor replaces its cache rather than modifying it, so our mappings remain
+  valid until we're reloaded. This is thread safe.
+
+  :var str path: location of the cached-microdescs file
+  """
+
+  def __init__(self, path, validate = False):
+    """
+    :param str path: tor's data directory, or the location of its
+      cached-microdescs file
+    :param bool validate: checks the validity of descriptors we read if
+      **True**, skips these checks otherwise
+
+    :raises:
+      * **ValueError** if the files have something other than microdescriptors
+      * **IOError** if the files can't be read
+    """
+
+    super(MicrodescriptorStore, self).__init__(validate)
+
+    if os.path.isdir(path):
+      path = os.path.join(path, 'cached-microdescs')
+
+    self.path = path
+    self._identities = None
+    self.reload()
+
+  def reload(self):
+    """
+    Indexes tor's microdescriptors again if its cache or journal have changed
+    since we last read them.
+
+    :returns: **True** if we indexed the microdescriptors again, **False** if
+      they're unchanged
+
+    :raises:
+      * **ValueError** if the files have something other than microdescriptors
+      * **IOError** if the files can't be read
+    """
+
+    paths = (self.path, self.path + '.new')
+
+    with self._lock:
+      identities = [_path_identity(path) for path in paths]
+
+      if identities == self._identities:
+        return False
+
+      self.close()
+
+      for path, identity in zip(paths, identities):
+        if identity is None:
+          continue  # tor doesn't always have a journal
+
+        descriptor_type, _ = self._add_file(path, keep_content = True)
+
+        if descriptor_type not in (None, MICRODESCRIPTOR):
+          raise ValueError("%s doesn't contain microdescriptors" % path)
+
+      self._identities = identities
+      return True
+
+  def close(self):
+    """
+    Releases the files we've memory mapped. We won't have the microdescriptors
+    from them until we're reloaded.
+    """
+
+    with self._lock:
+      for _, _, content in self._files:
+        if isinstance(content, _MappedFile):
+          content.release()
+
+      self._files = []
+      self._identities = None
+
+      for descriptor_type, descriptors in list(self._descriptors.items()):
+        self._descriptors[descriptor_type] = dict([(digest, desc) for (digest, desc) in descriptors.items() if not isinstance(desc, tuple)])
+
+  def __iter__(self):
+    with self._lock:
+      descriptors = self._descriptors[MICRODESCRIPTOR]
+
+      # microdescriptors we've been given, then those from our files in the
+      # order they reside
+
+      digests = sorted(descriptors, key = lambda digest: descriptors[digest] if isinstance(descriptors[digest], tuple) else ())
+
+    for digest in digests:
+      desc = self.get_microdescriptor(digest)
+
+      if desc is not None:
+        yield desc
+
+
+def _descriptor_type(content):
+  """
+  Provides the type of descriptors in a file based on its first keyword,
+  skipping any annotations. This is **None** if the file is empty.
+
+  :raises: **ValueError** if the file doesn't start with a descriptor we store
+  """
+
+  position = 0
+
+  while position < len(content) and content[position:position + 1] in (b'@', b'\n'):
+    position = _line_end(content, position)
+
+  if position >= len(content):
+    return None
+
+  keyword = content[position:_line_end(content, position)].split(None, 1)[0]
+
+  if keyword not in FIRST_KEYWORD:
+    raise ValueError("Unable to tell what type of descriptors start with '%s'" % stem.util.str_tools._to_unicode(keyword))
+
+  return FIRST_KEYWORD[keyword]
+
+
+def _scan(content, descriptor_type):
+  """
+  Provides the (start, end, raw digest) of each descriptor in a file.
+  """
+
+  if descriptor_type == MICRODESCRIPTOR:
+    for _, start, end in _descriptor_spans(content):
+      yield start, end, hashlib.sha256(content[start:end]).digest()
+  else:
+    start_keyword = 'router' if descriptor_type == SERVER_DESCRIPTOR else 'extra-info'
+
+    for _, start, end in _signed_spans(content, 'router-signature', start_keyword):
+      signature_start = _find_line_starting_with(content, (b'router-signature',), start, end)
+
+      if signature_start == -1:
+        continue  # truncated descriptor without a signature
+
+      yield start, end, hashlib.sha1(content[start:_line_end(content, signature_start)]).digest()
+
+
+def _to_raw_digest(digest):
+  """
+  Provides the raw bytes of a hex or raw digest.
+  """
+
+  if digest is None:
+    return None
+  elif isinstance(digest, bytes) and len(digest) in (20, 32):
+    return digest
+
+  try:
+    return binascii.a2b_hex(stem.util.str_tools._to_bytes(digest))
+  except (TypeError, binascii.Error):
+    return None
+
+
+def _file_identity(stat):
+  return (stat.st_ino, stat.st_size, stat.st_mtime)
+
+
+def _path_identity(path):
+  """
+  Provides the identity of the file at a path, **None** if there isn't one.
+  """
+
+  try:
+    return _file_identity(os.stat(path))
+  except OSError:
+    return None
@@ -34,6 +34,15 @@ Extra-info descriptors are available from a few sources...
     |
     +- digest - calculates the upper-case hex digest value for our content
 
+  resample_history - bandwidth history in intervals of a different length
+  sum_histories - sums the bandwidth history of many descriptors
+
+  StatisticsAggregator - Sums the usage statistics of many descriptors.
+    |- add - adds a descriptor's statistics to our sums
+    |- get_counts - sum of a per-country, per-port, or per-status statistic
+    |- get_means - mean of a cell statistic
+    +- get_reporting - number of descriptors that reported a statistic
+
 .. data:: DirResponse (enum)
 
   Enumeration for known statuses for ExtraInfoDescriptor's dir_*_responses.
@@ -66,10 +75,27 @@ Extra-info descriptors are available from a few sources...
   **Q1** and **Q3**     rate of the slowest and fastest quarter download rates in B/s
   **MD**                median download rate in B/s
   ===================== ===========
+
+.. data:: HistoryType (enum)
+
+  Bandwidth histories of an extra-info descriptor. Their values are an
+  **array** of 64 bit integers.
+
+  ============= ===========
+  HistoryType   Description
+  ============= ===========
+  **READ**      bytes read, from the read_history_* attributes
+  **WRITE**     bytes written, from the write_history_* attributes
+  **DIR_READ**  directory bytes read, from the dir_read_history_* attributes
+  **DIR_WRITE** directory bytes written, from the dir_write_history_* attributes
+  ============= ===========
 """
 
+import array
+import calendar
 import functools
 import hashlib
+import operator
 import re
 
 import stem.util.connection
@@ -77,12 +103,15 @@ import stem.util.enum
 import stem.util.str_tools
 
 from stem.descriptor import (
-  PGP_BLOCK_END,
   Descriptor,
-  _read_until_keywords,
+  _SpanReader,
+  _content_span,
+  _signed_spans,
+  _line_end,
   _get_descriptor_components,
   _value,
   _values,
+  _intern_value,
   _parse_timestamp_line,
   _parse_forty_character_hex,
   _parse_key_block,
@@ -155,6 +184,26 @@ SINGLE_FIELDS = (
 )
 
 
+HistoryType = stem.util.enum.UppercaseEnum(
+  'READ',
+  'WRITE',
+  'DIR_READ',
+  'DIR_WRITE',
+)
+
+# Bandwidth history values are 64 bit. Python 2 lacks the 'q' typecode, but
+# its longs are 64 bits on most platforms.
+
+try:
+  array.array('q')
+  HISTORY_TYPECODE = 'q'
+except ValueError:
+  HISTORY_TYPECODE = 'l'
+
+# flips the zero and one bytes of a bytearray
+
+_FLIP_BITS = bytearray(b'\x01\x00') + bytearray(254)
+
 _timestamp_re = re.compile('^(.*) \(([0-9]+) s\)( .*)?$')
 _locale_re = re.compile('^[a-zA-Z0-9\?]{2}$')
 
@@ -177,23 +226,412 @@ def _parse_file(descriptor_file, is_bridge = False, validate = False, **kwargs):
     * **IOError** if the file can't be read
   """
 
-  while True:
-    extrainfo_content = _read_until_keywords('router-signature', descriptor_file)
+  for content, _, descriptor_start, descriptor_end in _SpanReader(descriptor_file, _descriptor_spans):
+    if content[descriptor_start:descriptor_start + 5] == b'@type':
+      descriptor_start = min(_line_end(content, descriptor_start), descriptor_end)
+
+    extrainfo_content = _content_span(content, descriptor_start, descriptor_end)
+
+    if is_bridge:
+      yield BridgeExtraInfoDescriptor(extrainfo_content, validate, **kwargs)
+    else:
+      yield RelayExtraInfoDescriptor(extrainfo_content, validate, **kwargs)
+
+
+def _descriptor_spans(content, position = 0):
+  """
+  Splits content into extra-info descriptors, each of which runs through its
+  signature.
+
+  :param bytes,mmap content: content to be split
+  :param int position: offset to begin at
+
+  :returns: iterator for (start, descriptor_start, descriptor_end) tuples
+  """
+
+  return _signed_spans(content, 'router-signature', start = position)
+
+
+def resample_history(end, interval, values, resolution):
+  """
+  Provides a bandwidth history in intervals of a different length. Intervals
+  are aligned to the epoch so the histories of different descriptors line up,
+  and each value counts toward the interval that contains its midpoint.
+
+  ::
+
+    >>> import datetime
+    >>> start, values = resample_history(datetime.datetime(2015, 1, 1, 0, 30), 900, [10, 20, 30, 40], 1800)
+    >>> start, list(values)
+    (1420068600, [30, 70])
+
+  :param datetime end: end of the history's last interval
+  :param int interval: seconds per interval of the history
+  :param list values: values for each interval of the history
+  :param int resolution: seconds per interval we should provide
+
+  :returns: **tuple** of the form (start, values) where start is the unix
+    timestamp our first interval begins at and values is an **array**
+  """
+
+  start = calendar.timegm(end.timetuple()) - len(values) * interval
+  first = (2 * start + interval) // (2 * resolution)
+
+  if resolution == interval:
+    return first * resolution, array.array(HISTORY_TYPECODE, values)
+
+  last = (2 * (start + len(values) * interval) - interval) // (2 * resolution)
+
+  if resolution < interval:
+    resampled = array.array(HISTORY_TYPECODE, [0]) * max(0, last - first + 1)
+
+    for index, value in enumerate(values):
+      resampled[(2 * (start + index * interval) + interval) // (2 * resolution) - first] = value
+  else:
+    # Values of each interval are a contiguous slice, so we sum those. This
+    # is the first index with a midpoint in each of our intervals.
+
+    boundaries = [max(0, -((2 * start + interval - 2 * bucket * resolution) // (2 * interval))) for bucket in range(first, last + 1)]
+    boundaries.append(len(values))
+
+    resampled = array.array(HISTORY_TYPECODE, [sum(values[boundaries[i]:boundaries[i + 1]]) for i in range(len(boundaries) - 1)])
+
+  return first * resolution, resampled
+
+
+def sum_histories(descriptors, history = HistoryType.WRITE, resolution = 900):
+  """
+  Sums the bandwidth history of many descriptors, for instance to get the
+  bytes relays wrote each fifteen minutes over a month...
+
+  ::
+
+    from stem.descriptor import parse_file
+    from stem.descriptor.extrainfo_descriptor import sum_histories
+
+    descriptors = parse_file('/tmp/extra-infos-2015-01.tar', fields = ('fingerprint', 'write_history_values'))
+    start, written = sum_histories(descriptors)
+
+  Relays publish descriptors more often than their history spans, so only the
+  first value we come across for each interval of a relay's history counts.
+
+  :param list descriptors: extra-info or server descriptors to sum
+  :param stem.descriptor.extrainfo_descriptor.HistoryType history: bandwidth
+    history to sum
+  :param int resolution: seconds per interval we should provide
+
+  :returns: **tuple** of the form (start, values) where start is the unix
+    timestamp our first interval begins at and values is an **array**, start
+    is **None** if none of the descriptors have this history
+  """
+
+  prefix = '%s_history_' % history.lower()
+  total = _Series(array.array(HISTORY_TYPECODE, [0]))
+  counted = {}  # (fingerprint, interval) => _Series of the history intervals we've counted
+
+  for desc in descriptors:
+    values = getattr(desc, prefix + 'values')
+
+    if not values:
+      continue
+
+    end, interval = getattr(desc, prefix + 'end'), getattr(desc, prefix + 'interval')
+    relay_counted = counted.get((desc.fingerprint, interval))
+
+    if relay_counted is None:
+      relay_counted = counted[(desc.fingerprint, interval)] = _Series(bytearray(1))
+
+    previously_counted = relay_counted.replace(calendar.timegm(end.timetuple()) // interval - len(values), bytearray(b'\x01') * len(values))
+
+    if 1 in previously_counted:
+      values = array.array(HISTORY_TYPECODE, map(operator.mul, values, previously_counted.translate(_FLIP_BITS)))
+
+    start, values = resample_history(end, interval, values, resolution)
+    total.add(start // resolution, values)
+
+  return (total.start * resolution if total.start is not None else None), total.values
+
+
+class StatisticsAggregator(object):
+  """
+  Sums the usage statistics of many extra-info descriptors in a single pass,
+  for instance to count a day's bridge users by country...
+
+  ::
+
+    from stem.descriptor import parse_file
+    from stem.descriptor.extrainfo_descriptor import StatisticsAggregator
+
+    aggregator = StatisticsAggregator()
+
+    for desc in parse_file('/tmp/bridge-extra-infos-2015-01-01.tar', fields = StatisticsAggregator.FIELDS):
+      aggregator.add(desc)
+
+    for locale, count in sorted(aggregator.get_counts('bridge_ips').items()):
+      print '%s: %i' % (locale, count)
+
+  Counts are kept in tables that have a slot for each country, port, or
+  status, so our memory usage doesn't grow with the number of descriptors.
+  Descriptors only need the attributes in our **FIELDS**, so providing those
+  to :func:`~stem.descriptor.__init__.parse_file` skips parsing everything
+  else.
+
+  :var int descriptors: number of descriptors we've added
+  """
+
+  LOCALE_STATISTICS = ('geoip_client_origins', 'bridge_ips', 'entry_ips')
+  PORT_STATISTICS = ('exit_streams_opened',)
+  STATUS_STATISTICS = ('dir_v3_responses',)
+  CELL_STATISTICS = ('cell_processed_cells', 'cell_queued_cells', 'cell_time_in_queue', 'cell_circuits_per_decile')
+
+  FIELDS = LOCALE_STATISTICS + PORT_STATISTICS + STATUS_STATISTICS + CELL_STATISTICS
+
+  def __init__(self):
+    self.descriptors = 0
+
+    # locale tables share their indices, so each table has a slot for any
+    # country we've seen
+
+    self._locales = _KeyedTable()
+    self._tables = {}
+
+    for attribute in self.LOCALE_STATISTICS:
+      self._tables[attribute] = self._locales.new_table()
+
+    for attribute in self.PORT_STATISTICS:
+      self._tables[attribute] = _PortTable()
+
+    for attribute in self.STATUS_STATISTICS:
+      statuses = _KeyedTable(list(DirResponse))
+      self._tables[attribute] = statuses.new_table()
+
+    for attribute in self.CELL_STATISTICS:
+      self._tables[attribute] = array.array('d', [0.0]) * (1 if attribute == 'cell_circuits_per_decile' else 10)
 
-    # we've reached the 'router-signature', now include the pgp style block
-    block_end_prefix = PGP_BLOCK_END.split(' ', 1)[0]
-    extrainfo_content += _read_until_keywords(block_end_prefix, descriptor_file, True)
+    self._reporting = dict((attribute, 0) for attribute in self.FIELDS)
 
-    if extrainfo_content:
-      if extrainfo_content[0].startswith(b'@type'):
-        extrainfo_content = extrainfo_content[1:]
+  def add(self, descriptor):
+    """
+    Adds a descriptor's statistics to our sums.
+
+    :param stem.descriptor.extrainfo_descriptor.ExtraInfoDescriptor descriptor:
+      descriptor to add
+    """
+
+    self.descriptors += 1
+
+    for attribute in self.FIELDS:
+      value = getattr(descriptor, attribute)
+
+      if not value:
+        continue
+      elif attribute in self.CELL_STATISTICS:
+        table = self._tables[attribute]
 
-      if is_bridge:
-        yield BridgeExtraInfoDescriptor(bytes.join(b'', extrainfo_content), validate, **kwargs)
+        if attribute == 'cell_circuits_per_decile':
+          table[0] += value
+        elif len(value) == len(table):
+          table[:] = array.array('d', map(operator.add, table, value))
+        else:
+          continue  # deciles should have ten values
       else:
-        yield RelayExtraInfoDescriptor(bytes.join(b'', extrainfo_content), validate, **kwargs)
-    else:
-      break  # done parsing file
+        self._tables[attribute].add(value)
+
+      self._reporting[attribute] += 1
+
+  def get_counts(self, attribute):
+    """
+    Provides the sum of a per-country, per-port, or per-status statistic.
+
+    :param str attribute: descriptor attribute to provide the sum of, such as
+      'bridge_ips' or 'exit_streams_opened'
+
+    :returns: **dict** of countries, ports, or statuses to their total count
+
+    :raises: **ValueError** if this isn't a statistic we count
+    """
+
+    if attribute not in self.LOCALE_STATISTICS + self.PORT_STATISTICS + self.STATUS_STATISTICS:
+      raise ValueError("We don't count %s, only %s" % (attribute, ', '.join(self.LOCALE_STATISTICS + self.PORT_STATISTICS + self.STATUS_STATISTICS)))
+
+    return self._tables[attribute].to_dict()
+
+  def get_means(self, attribute):
+    """
+    Provides the mean of a cell statistic across the descriptors that report
+    it.
+
+    :param str attribute: descriptor attribute to provide the mean of, such as
+      'cell_processed_cells'
+
+    :returns: **list** with the mean of each decile, or a **float** for
+      'cell_circuits_per_decile'. This is **None** if no descriptors have
+      reported it.
+
+    :raises: **ValueError** if this isn't a cell statistic
+    """
+
+    if attribute not in self.CELL_STATISTICS:
+      raise ValueError("%s isn't a cell statistic, those are: %s" % (attribute, ', '.join(self.CELL_STATISTICS)))
+
+    reporting = self._reporting[attribute]
+
+    if not reporting:
+      return None
+
+    means = [value / reporting for value in self._tables[attribute]]
+    return means[0] if attribute == 'cell_circuits_per_decile' else means
+
+  def get_reporting(self, attribute):
+    """
+    Provides the number of descriptors that reported a statistic.
+
+    :param str attribute: descriptor attribute to provide the count for
+
+    :returns: **int** for the number of descriptors with this statistic
+
+    :raises: **ValueError** if this isn't a statistic we aggregate
+    """
+
+    if attribute not in self._reporting:
+      raise ValueError("We don't aggregate %s, only %s" % (attribute, ', '.join(self.FIELDS)))
+
+    return self._reporting[attribute]
+
+
+class _KeyedTable(object):
+  """
+  Slots for a set of keys, shared by tables of counts for those keys. Slots
+  are added as new keys are seen.
+  """
+
+  def __init__(self, keys = ()):
+    self._index = {}
+    self._keys = []
+    self._tables = []
+
+    for key in keys:
+      self.index(key)
+
+  def index(self, key):
+    """
+    Provides the slot of a key, adding one if we haven't seen it before.
+    """
+
+    index = self._index.get(key)
+
+    if index is None:
+      index = self._index[key] = len(self._keys)
+      self._keys.append(key)
+
+      for table in self._tables:
+        table.counts.append(0)
+
+    return index
+
+  def new_table(self):
+    table = _CountTable(self)
+    self._tables.append(table)
+    return table
+
+
+class _CountTable(object):
+  """
+  Counts for the keys of a :class:`~stem.descriptor.extrainfo_descriptor._KeyedTable`.
+  """
+
+  def __init__(self, keyed_table):
+    self.keyed_table = keyed_table
+    self.counts = array.array(HISTORY_TYPECODE, [0]) * len(keyed_table._keys)
+
+  def add(self, counts):
+    index, table_counts = self.keyed_table.index, self.counts
+
+    for key, count in counts.items():
+      table_counts[index(key)] += count
+
+  def to_dict(self):
+    return dict((key, count) for (key, count) in zip(self.keyed_table._keys, self.counts) if count)
+
+
+class _PortTable(object):
+  """
+  Counts for each port, and ports other than the most common ('other').
+  """
+
+  OTHER = 65536
+
+  def __init__(self):
+    self.counts = array.array(HISTORY_TYPECODE, [0]) * (self.OTHER + 1)
+
+  def add(self, counts):
+    table_counts = self.counts
+
+    for port, count in counts.items():
+      table_counts[self.OTHER if port == 'other' else port] += count
+
+  def to_dict(self):
+    return dict(('other' if port == self.OTHER else port, count) for (port, count) in enumerate(self.counts) if count)
+
+
+class _Series(object):
+  """
+  Values of consecutive indices, growing to include those we're given.
+
+  :var int start: index of our first value, **None** if we don't have any
+  :var array,bytearray values: our values
+  """
+
+  def __init__(self, zero):
+    """
+    :param array,bytearray zero: sequence with a single zero value, used to
+      grow our values
+    """
+
+    self.start = None
+    self.values = zero[:0]
+    self._zero = zero
+
+  def add(self, start, values):
+    """
+    Adds values to ours, starting at the given index.
+    """
+
+    offset = self._include(start, len(values))
+    self.values[offset:offset + len(values)] = array.array(HISTORY_TYPECODE, map(operator.add, self.values[offset:offset + len(values)], values))
+
+  def replace(self, start, values):
+    """
+    Replaces our values, starting at the given index.
+
+    :returns: the values we replaced
+    """
+
+    offset = self._include(start, len(values))
+    replaced = self.values[offset:offset + len(values)]
+    self.values[offset:offset + len(values)] = values
+
+    return replaced
+
+  def _include(self, start, count):
+    """
+    Grows our values to include the given indices.
+
+    :returns: **int** offset of start within our values
+    """
+
+    if self.start is None:
+      self.start = start
+    elif start < self.start:
+      self.values[0:0] = self._zero * (self.start - start)
+      self.start = start
+
+    offset = start - self.start
+
+    if offset + count > len(self.values):
+      self.values.extend(self._zero * (offset + count - len(self.values)))
+
+    return offset
 
 
 def _parse_timestamp_and_interval(keyword, content):
@@ -402,13 +840,15 @@ def _parse_history_line(keyword, end_attribute, interval_attribute, values_attri
 
   value = _value(keyword, entries)
   timestamp, interval, remainder = _parse_timestamp_and_interval(keyword, value)
-  history_values = []
+  history_values = array.array(HISTORY_TYPECODE)
 
   if remainder:
     try:
-      history_values = [int(entry) for entry in remainder.split(',')]
+      history_values = array.array(HISTORY_TYPECODE, [int(entry) for entry in remainder.split(',')])
     except ValueError:
       raise ValueError('%s line has non-numeric values: %s %s' % (keyword, keyword, value))
+    except OverflowError:
+      raise ValueError('%s line has values too large to be byte counts: %s %s' % (keyword, keyword, value))
 
   setattr(descriptor, end_attribute, timestamp)
   setattr(descriptor, interval_attribute, interval)
@@ -459,7 +899,7 @@ def _parse_geoip_to_count_line(keyword, attribute, descriptor, entries):
       locale, count = entry.split('=', 1)
 
       if _locale_re.match(locale) and count.isdigit():
-        locale_usage[locale] = int(count)
+        locale_usage[_intern_value(locale)] = int(count)
       else:
         raise ValueError(error_msg)
 
@@ -566,11 +1006,11 @@ class ExtraInfoDescriptor(Descriptor):
 
   :var datetime read_history_end: end of the sampling interval
   :var int read_history_interval: seconds per interval
-  :var list read_history_values: bytes read during each interval
+  :var array read_history_values: bytes read during each interval
 
   :var datetime write_history_end: end of the sampling interval
   :var int write_history_interval: seconds per interval
-  :var list write_history_values: bytes written during each interval
+  :var array write_history_values: bytes written during each interval
 
   **Cell relaying statistics:**
 
@@ -611,11 +1051,11 @@ class ExtraInfoDescriptor(Descriptor):
 
   :var datetime dir_read_history_end: end of the sampling interval
   :var int dir_read_history_interval: seconds per interval
-  :var list dir_read_history_values: bytes read during each interval
+  :var array dir_read_history_values: bytes read during each interval
 
   :var datetime dir_write_history_end: end of the sampling interval
   :var int dir_write_history_interval: seconds per interval
-  :var list dir_write_history_values: bytes read during each interval
+  :var array dir_write_history_values: bytes read during each interval
 
   **Guard Attributes:**
 
@@ -724,6 +1164,8 @@ class ExtraInfoDescriptor(Descriptor):
     'ip_transports': (None, _parse_bridge_ip_transports_line),
   }
 
+  _OFFSET_KEYWORDS = ('router-signature',)
+
   PARSER_FOR_LINE = {
     'extra-info': _parse_extra_info_line,
     'geoip-db-digest': _parse_geoip_db_digest_line,
@@ -767,23 +1209,33 @@ class ExtraInfoDescriptor(Descriptor):
     'bridge-ip-transports': _parse_bridge_ip_transports_line,
   }
 
-  def __init__(self, raw_contents, validate = False):
+  def __init__(self, raw_contents, validate = False, fields = None):
     """
     Extra-info descriptor constructor. By default this validates the
     descriptor's content as it's parsed. This validation can be disabled to
     either improve performance or be accepting of malformed data.
 
+    If you only need a few attributes then **fields** can be used to only parse
+    those. Lines for other attributes are skipped, leaving them with their
+    default values, and we don't check for required fields.
+
     :param str raw_contents: extra-info content provided by the relay
     :param bool validate: checks the validity of the extra-info descriptor if
       **True**, skips these checks otherwise
+    :param list fields: attributes to parse, all of them if **None**
 
-    :raises: **ValueError** if the contents is malformed and validate is True
+    :raises: **ValueError** if the contents is malformed and validate is True,
+      or fields includes something that isn't an attribute
     """
 
     super(ExtraInfoDescriptor, self).__init__(raw_contents, lazy_load = not validate)
-    entries = _get_descriptor_components(raw_contents, validate)
+    keywords = None if fields is None else self._keywords_for(fields)
+    self._offsets = dict.fromkeys(self._OFFSET_KEYWORDS)
+    entries = _get_descriptor_components(raw_contents, validate, keywords = keywords, offsets = self._offsets)
 
-    if validate:
+    if validate and fields is not None:
+      self._parse(entries, validate)
+    elif validate:
       for keyword in self._required_fields():
         if keyword not in entries:
           raise ValueError("Extra-info descriptor must have a '%s' entry" % keyword)
@@ -847,6 +1299,12 @@ class RelayExtraInfoDescriptor(ExtraInfoDescriptor):
   @lru_cache()
   def digest(self):
     # our digest is calculated from everything except our signature
+
+    for_digest = self._signed_content(None, 'router-signature')
+
+    if for_digest is not None:
+      return hashlib.sha1(for_digest).hexdigest().upper()
+
     raw_content, ending = str(self), '\nrouter-signature\n'
     raw_content = raw_content[:raw_content.find(ending) + len(ending)]
     return hashlib.sha1(stem.util.str_tools._to_bytes(raw_content)).hexdigest().upper()
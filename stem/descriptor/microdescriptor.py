@@ -71,7 +71,12 @@ import stem.exit_policy
 from stem.descriptor import (
   Descriptor,
   _get_descriptor_components,
-  _read_until_keywords,
+  _SpanReader,
+  _content_span,
+  _find_keyword_line,
+  _find_line_starting_with,
+  _line_end,
+  _split_lines,
   _value,
   _parse_simple_line,
   _parse_key_block,
@@ -117,45 +122,40 @@ def _parse_file(descriptor_file, validate = False, **kwargs):
     * **IOError** if the file can't be read
   """
 
-  while True:
-    annotations = _read_until_keywords('onion-key', descriptor_file)
+  for content, annotations_start, descriptor_start, descriptor_end in _SpanReader(descriptor_file, _descriptor_spans):
+    # strip newlines from annotations
+    annotations = list(map(bytes.strip, _split_lines(content[annotations_start:descriptor_start])))
+    descriptor_text = _content_span(content, descriptor_start, descriptor_end)
 
-    # read until we reach an annotation or onion-key line
-    descriptor_lines = []
+    yield Microdescriptor(descriptor_text, validate, annotations, **kwargs)
 
-    # read the onion-key line, done if we're at the end of the document
 
-    onion_key_line = descriptor_file.readline()
+def _descriptor_spans(content, position = 0):
+  """
+  Splits content into microdescriptors. These don't have a clear ending, so
+  each runs from its onion-key line until the next annotation or onion-key
+  line.
 
-    if onion_key_line:
-      descriptor_lines.append(onion_key_line)
-    else:
-      break
+  :param bytes,mmap content: content to be split
+  :param int position: offset to begin at
 
-    while True:
-      last_position = descriptor_file.tell()
-      line = descriptor_file.readline()
+  :returns: iterator for (start, descriptor_start, descriptor_end) tuples,
+    where the content from start to descriptor_start are its annotations
+  """
 
-      if not line:
-        break  # EOF
-      elif line.startswith(b'@') or line.startswith(b'onion-key'):
-        descriptor_file.seek(last_position)
-        break
-      else:
-        descriptor_lines.append(line)
+  while True:
+    descriptor_start = _find_keyword_line(content, ('onion-key',), position)
 
-    if descriptor_lines:
-      if descriptor_lines[0].startswith(b'@type'):
-        descriptor_lines = descriptor_lines[1:]
+    if descriptor_start == -1:
+      break  # done parsing descriptors
 
-      # strip newlines from annotations
-      annotations = list(map(bytes.strip, annotations))
+    descriptor_end = _find_line_starting_with(content, (b'@', b'onion-key'), _line_end(content, descriptor_start))
 
-      descriptor_text = bytes.join(b'', descriptor_lines)
+    if descriptor_end == -1:
+      descriptor_end = len(content)
 
-      yield Microdescriptor(descriptor_text, validate, annotations, **kwargs)
-    else:
-      break  # done parsing descriptors
+    yield position, descriptor_start, descriptor_end
+    position = descriptor_end
 
 
 def _parse_id_line(descriptor, entries):
@@ -173,7 +173,7 @@ _parse_digest = lambda descriptor, entries: setattr(descriptor, 'digest', hashli
 _parse_onion_key_line = _parse_key_block('onion-key', 'onion_key', 'RSA PUBLIC KEY')
 _parse_ntor_onion_key_line = _parse_simple_line('ntor-onion-key', 'ntor_onion_key')
 _parse_family_line = lambda descriptor, entries: setattr(descriptor, 'family', _value('family', entries).split(' '))
-_parse_p6_line = lambda descriptor, entries: setattr(descriptor, 'exit_policy_v6', stem.exit_policy.MicroExitPolicy(_value('p6', entries)))
+_parse_p6_line = lambda descriptor, entries: setattr(descriptor, 'exit_policy_v6', stem.exit_policy.get_shared_micro_policy(_value('p6', entries)))
 
 
 class Microdescriptor(Descriptor):
@@ -220,15 +220,18 @@ class Microdescriptor(Descriptor):
     'id': _parse_id_line,
   }
 
-  def __init__(self, raw_contents, validate = False, annotations = None):
+  def __init__(self, raw_contents, validate = False, annotations = None, fields = None):
     super(Microdescriptor, self).__init__(raw_contents, lazy_load = not validate)
     self._annotation_lines = annotations if annotations else []
-    entries = _get_descriptor_components(raw_contents, validate)
+    keywords = None if fields is None else self._keywords_for(fields)
+    entries = _get_descriptor_components(raw_contents, validate, keywords = keywords)
 
     if validate:
       self.digest = hashlib.sha256(self.get_bytes()).hexdigest().upper()
       self._parse(entries, validate)
-      self._check_constraints(entries)
+
+      if fields is None:
+        self._check_constraints(entries)
     else:
       self._entries = entries
 
@@ -35,10 +35,55 @@ For more information see :func:`~stem.descriptor.__init__.DocumentHandler`...
     for router in parse_file(consensus_file, 'network-status-consensus-3 1.0', document_handler = DocumentHandler.ENTRIES):
       print router.nickname
 
+If you're processing a large number of documents then **COLUMNAR** provides a
+:class:`~stem.descriptor.router_status_table.RouterStatusTable` instead, which
+keeps the router status entries in parallel arrays rather than constructing an
+object for each of them.
+
+Consecutive consensuses share the vast majority of their router status
+entries, so tor can fetch a consensus as a diff against the one it already has
+(`proposal 140 <https://gitweb.torproject.org/torspec.git/tree/proposals/140-consensus-diffs.txt>`_).
+These diffs can be made with
+:func:`~stem.descriptor.networkstatus.NetworkStatusDocumentV3.diff` and
+applied with
+:func:`~stem.descriptor.networkstatus.NetworkStatusDocumentV3.apply_diff`,
+which only parses the router status entries that changed...
+
+::
+
+  from stem.descriptor import parse_file, DocumentHandler
+
+  with open('.tor/cached-consensus', 'rb') as consensus_file:
+    consensus = next(parse_file(consensus_file, 'network-status-consensus-3 1.0', document_handler = DocumentHandler.DOCUMENT))
+
+  # an hour later...
+
+  consensus = consensus.apply_diff(fetch_consensus_diff(consensus))
+
+Documents are signed by the directory authorities, which can be checked
+against their key certificates with
+:func:`~stem.descriptor.networkstatus.NetworkStatusDocumentV3.validate_signatures`.
+If you're auditing many documents then
+:func:`~stem.descriptor.networkstatus.validate_file_signatures` can check them
+in a process pool...
+
+::
+
+  from stem.descriptor import parse_file
+  from stem.descriptor.networkstatus import validate_file_signatures
+
+  key_certs = list(parse_file('/tmp/certs', 'dir-key-certificate-3 1.0'))
+
+  for path, signatures, exc in validate_file_signatures(consensus_paths, key_certs, workers = 8):
+    if exc:
+      print '%s is invalid: %s' % (path, exc)
+
 **Module Overview:**
 
 ::
 
+  validate_file_signatures - checks the signatures of many documents
+
   NetworkStatusDocument - Network status document
     |- NetworkStatusDocumentV2 - Version 2 network status document
     |- NetworkStatusDocumentV3 - Version 3 network status document
@@ -49,24 +94,53 @@ For more information see :func:`~stem.descriptor.__init__.DocumentHandler`...
   DirectoryAuthority - Directory authority as defined in a v3 network status document
 """
 
-import io
+import binascii
+import copy
+import difflib
+import functools
+import hashlib
+import multiprocessing
+import re
+
+try:
+  # added in python 3.3
+  from collections.abc import MutableMapping
+except ImportError:
+  from collections import MutableMapping
+
+try:
+  # added in python 3.2
+  from functools import lru_cache
+except ImportError:
+  from stem.util.lru_cache import lru_cache
 
 import stem.descriptor.router_status_entry
+import stem.descriptor.router_status_table
+import stem.prereq
 import stem.util.str_tools
 import stem.util.tor_tools
 import stem.version
 
 from stem.descriptor import (
-  PGP_BLOCK_END,
   Descriptor,
   DocumentHandler,
   _get_descriptor_components,
-  _read_until_keywords,
+  _SpanReader,
+  _descriptor_content,
+  _content_span,
+  _entry_spans,
+  _signed_spans,
+  _find_keyword_line,
+  _line_end,
   _value,
+  _reset_interned_values,
   _parse_simple_line,
   _parse_timestamp_line,
   _parse_forty_character_hex,
   _parse_key_block,
+  _pem_bytes,
+  _rsa_public_key,
+  _decrypt_signature,
 )
 
 from stem.descriptor.router_status_entry import (
@@ -123,6 +197,16 @@ FOOTER_STATUS_DOCUMENT_FIELDS = (
 HEADER_FIELDS = [attr[0] for attr in HEADER_STATUS_DOCUMENT_FIELDS]
 FOOTER_FIELDS = [attr[0] for attr in FOOTER_STATUS_DOCUMENT_FIELDS]
 
+DIFF_VERSION_LINE = b'network-status-diff-version 1'
+DIFF_COMMAND = re.compile(b'^([0-9]+)(?:,([0-9]+|\\$))?([acd])$')
+
+# digest algorithms that directory signatures can be made with
+
+SIGNATURE_DIGESTS = {
+  'sha1': hashlib.sha1,
+  'sha256': hashlib.sha256,
+}
+
 AUTH_START = 'dir-source'
 ROUTERS_START = 'r'
 FOOTER_START = 'directory-footer'
@@ -210,16 +294,23 @@ def _parse_file(document_file, document_type = None, validate = False, is_microd
   :returns: :class:`stem.descriptor.networkstatus.NetworkStatusDocument` object
 
   :raises:
-    * **ValueError** if the document_version is unrecognized or the contents is
-      malformed and validate is **True**
+    * **ValueError** if the document_version is unrecognized, we're given
+      fields, or the contents is malformed and validate is **True**
     * **IOError** if the file can't be read
   """
 
+  if kwargs.get('fields') is not None:
+    raise ValueError("Network status documents and their router status entries can't be parsed for only some fields")
+
   # we can't properly default this since NetworkStatusDocumentV3 isn't defined yet
 
   if document_type is None:
     document_type = NetworkStatusDocumentV3
 
+  # start a fresh pool of the values this document's entries share
+
+  _reset_interned_values()
+
   if document_type == NetworkStatusDocumentV2:
     document_type, router_type = NetworkStatusDocumentV2, RouterStatusEntryV2
   elif document_type == NetworkStatusDocumentV3:
@@ -235,38 +326,83 @@ def _parse_file(document_file, document_type = None, validate = False, is_microd
 
   # getting the document without the routers section
 
-  header = _read_until_keywords((ROUTERS_START, FOOTER_START, V2_FOOTER_START), document_file)
-
-  if header and header[0].startswith(b'@type'):
-    header = header[1:]
-
-  routers_start = document_file.tell()
-  _read_until_keywords((FOOTER_START, V2_FOOTER_START), document_file, skip = True)
-  routers_end = document_file.tell()
-
-  footer = document_file.readlines()
-  document_content = bytes.join(b'', header + footer)
+  content, position = _descriptor_content(document_file)
+  header_start, routers_start, routers_end = _document_sections(content, position)
+  document_content = content[header_start:routers_start] + content[routers_end:]
 
   if document_handler == DocumentHandler.BARE_DOCUMENT:
     yield document_type(document_content, validate, **kwargs)
   elif document_handler == DocumentHandler.ENTRIES:
-    desc_iterator = stem.descriptor.router_status_entry._parse_file(
-      document_file,
-      validate,
-      entry_class = router_type,
-      entry_keyword = ROUTERS_START,
-      start_position = routers_start,
-      end_position = routers_end,
-      extra_args = (document_type(document_content, validate),),
-      **kwargs
-    )
-
-    for desc in desc_iterator:
-      yield desc
+    document = document_type(document_content, validate)
+
+    for entry_start, entry_end in _entry_spans(content, (ROUTERS_START,), routers_start, routers_end):
+      yield router_type(_content_span(content, entry_start, entry_end), validate, document)
+  elif document_handler == DocumentHandler.COLUMNAR:
+    document = document_type(document_content, validate)
+    yield stem.descriptor.router_status_table.RouterStatusTable(content[routers_start:routers_end], validate, document, router_type == RouterStatusEntryMicroV3)
   else:
     raise ValueError('Unrecognized document_handler: %s' % document_handler)
 
 
+def validate_file_signatures(paths, key_certs, workers = None):
+  """
+  Checks the directory signatures of v3 network status documents. Each is
+  read in full, but only its header and footer are parsed.
+
+  :param list paths: locations of the documents
+  :param list key_certs: :class:`~stem.descriptor.networkstatus.KeyCertificate`
+    of the authorities
+  :param int workers: number of processes to check the documents with, if
+    more than one
+
+  :returns: iterator for (path, signatures, exception) tuples in the order of
+    the paths, where the signatures are the valid
+    :class:`~stem.descriptor.networkstatus.DocumentSignature`, and the
+    exception is **None** if the document is valid, otherwise the
+    **ValueError** or **IOError** it failed with
+
+  :raises: **ImportError** if pycrypto is unavailable
+  """
+
+  if not stem.prereq.is_crypto_available():
+    raise ImportError(stem.prereq.CRYPTO_UNAVAILABLE)
+
+  validate = functools.partial(_validate_file_signatures, _signing_keys(key_certs))
+
+  if workers is None or workers <= 1:
+    for path in paths:
+      yield validate(path)
+
+    return
+
+  pool = multiprocessing.Pool(workers)
+
+  try:
+    for result in pool.imap(validate, paths):
+      yield result
+  finally:
+    pool.terminate()
+    pool.join()
+
+
+def _validate_file_signatures(signing_keys, path):
+  """
+  Checks the signatures of a document on disk. This is run within worker
+  processes, so it provides exceptions rather than raising them.
+  """
+
+  try:
+    with open(path, 'rb') as document_file:
+      content = document_file.read()
+
+    header_start, routers_start, routers_end = _document_sections(content)
+    document = NetworkStatusDocumentV3(content[header_start:routers_start] + content[routers_end:])
+
+    return (path, _validate_signatures(content, document.signatures, len(document.directory_authorities), signing_keys), None)
+  except (ValueError, IOError) as exc:
+    return (path, [], exc)
+
+
 def _parse_file_key_certs(certificate_file, validate = False):
   """
   Parses a file containing one or more authority key certificates.
@@ -284,17 +420,184 @@ def _parse_file_key_certs(certificate_file, validate = False):
     * **IOError** if the file can't be read
   """
 
-  while True:
-    keycert_content = _read_until_keywords('dir-key-certification', certificate_file)
+  for content, _, keycert_start, keycert_end in _SpanReader(certificate_file, _key_certificate_spans):
+    yield stem.descriptor.networkstatus.KeyCertificate(_content_span(content, keycert_start, keycert_end), validate = validate)
+
+
+def _key_certificate_spans(content, position = 0):
+  """
+  Splits content into key certificates, each of which runs through its
+  certification.
+
+  :param bytes,mmap content: content to be split
+  :param int position: offset to begin at
+
+  :returns: iterator for (start, keycert_start, keycert_end) tuples
+  """
+
+  return _signed_spans(content, 'dir-key-certification', start = position)
+
+
+def _document_sections(content, position = 0):
+  """
+  Finds where the router status entries of a network status document are.
+
+  :param bytes,mmap content: content with the document
+  :param int position: offset the document begins at
+
+  :returns: **tuple** of the form (header_start, routers_start, routers_end)
+    with where the document's header and router status entries are
+  """
+
+  routers_start = _section_start(content, (ROUTERS_START, FOOTER_START, V2_FOOTER_START), position)
+  routers_end = _section_start(content, (FOOTER_START, V2_FOOTER_START), routers_start)
+
+  if content[position:position + 5] == b'@type':
+    position = min(_line_end(content, position), routers_start)
+
+  return position, routers_start, routers_end
+
+
+def _section_start(content, keywords, start = 0):
+  """
+  Provides the offset of the first line at or after the start offset for one
+  of the given keywords, or the end of the content if there isn't one.
+  """
+
+  section_start = _find_keyword_line(content, keywords, start)
+  return len(content) if section_start == -1 else section_start
+
+
+def _entry_fingerprint(content, entry_start, entry_end):
+  """
+  Provides the fingerprint from the 'r' line of a router status entry.
+
+  :param bytes content: content with the entry
+  :param int entry_start: offset where the entry begins
+  :param int entry_end: offset where the entry ends
 
-    # we've reached the 'router-signature', now include the pgp style block
-    block_end_prefix = PGP_BLOCK_END.split(' ', 1)[0]
-    keycert_content += _read_until_keywords(block_end_prefix, certificate_file, True)
+  :returns: **str** with the hex encoded fingerprint, **None** if it can't be
+    decoded
+  """
+
+  r_comp = content[entry_start:min(_line_end(content, entry_start), entry_end)].split()
+
+  try:
+    return stem.descriptor.router_status_table._base64_to_hex(stem.util.str_tools._to_unicode(r_comp[2]))
+  except (IndexError, ValueError):
+    return None
+
+
+class _RouterStatusEntries(MutableMapping):
+  """
+  Fingerprint to router status entry mapping for the relays of a document,
+  which only parses an entry when it's first accessed. The fingerprints are
+  indexed from the 'r' lines when we're first used.
+
+  This behaves like the dict we'd otherwise have, with later entries for a
+  fingerprint replacing earlier ones. Entries with an 'r' line we can't decode
+  are parsed up front so they're keyed on whatever fingerprint they provide.
+
+  This isn't a dict though, so isinstance() checks against dict fail and
+  keys(), values(), and items() provide views from the MutableMapping rather
+  than dict views. Use copy() if you need a dict.
+  """
+
+  def __init__(self, content, start, end, router_type, document):
+    self._content = content
+    self._start = start
+    self._end = end
+    self._router_type = router_type
+    self._document = document
+
+    self._spans = None  # fingerprint => (start, end) of entries we haven't parsed
+    self._routers = None  # fingerprint => parsed router status entry
+    self._order = None  # fingerprints in the order they appear
+
+  def _index(self):
+    if self._routers is not None:
+      return
+
+    content, spans, routers = self._content, {}, {}
+    order, seen = [], set()
+
+    for entry_start, entry_end in _entry_spans(content, (ROUTERS_START,), self._start, self._end):
+      fingerprint = _entry_fingerprint(content, entry_start, entry_end)
+
+      if fingerprint is None:
+        router = self._router_type(content[entry_start:entry_end], False, self._document)
+        fingerprint = router.fingerprint
+        routers[fingerprint] = router
+        spans.pop(fingerprint, None)
+      else:
+        spans[fingerprint] = (entry_start, entry_end)
+        routers.pop(fingerprint, None)
+
+      if fingerprint not in seen:
+        seen.add(fingerprint)
+        order.append(fingerprint)
+
+    self._spans, self._routers, self._order = spans, routers, order
+
+  def __getitem__(self, fingerprint):
+    self._index()
 
-    if keycert_content:
-      yield stem.descriptor.networkstatus.KeyCertificate(bytes.join(b'', keycert_content), validate = validate)
+    if fingerprint not in self._routers:
+      entry_start, entry_end = self._spans[fingerprint]  # KeyError if absent
+      self._routers[fingerprint] = self._router_type(self._content[entry_start:entry_end], False, self._document)
+      del self._spans[fingerprint]
+
+    return self._routers[fingerprint]
+
+  def __setitem__(self, fingerprint, router):
+    self._index()
+
+    if fingerprint not in self._routers and fingerprint not in self._spans:
+      self._order.append(fingerprint)
+
+    self._spans.pop(fingerprint, None)
+    self._routers[fingerprint] = router
+
+  def __delitem__(self, fingerprint):
+    self._index()
+
+    if fingerprint in self._spans:
+      del self._spans[fingerprint]
     else:
-      break  # done parsing file
+      del self._routers[fingerprint]
+
+    self._order.remove(fingerprint)
+
+  def __contains__(self, fingerprint):
+    self._index()
+    return fingerprint in self._routers or fingerprint in self._spans
+
+  def __iter__(self):
+    self._index()
+    return iter(list(self._order))
+
+  def __len__(self):
+    self._index()
+    return len(self._order)
+
+  def copy(self):
+    """
+    Provides a dict with our router status entries, parsing any we haven't
+    already.
+
+    :returns: **dict** of fingerprints to router status entries
+    """
+
+    return dict(self.items())
+
+  def __eq__(self, other):
+    return dict(self.items()) == other
+
+  def __ne__(self, other):
+    return not self == other
+
+  def __repr__(self):
+    return repr(dict(self.items()))
 
 
 class NetworkStatusDocument(Descriptor):
@@ -302,6 +605,12 @@ class NetworkStatusDocument(Descriptor):
   Common parent for network status documents.
   """
 
+  def _compact(self):
+    super(NetworkStatusDocument, self)._compact()
+
+    for router in getattr(self, 'routers', {}).values():
+      router._compact()
+
 
 def _parse_version_line(keyword, attribute, expected_version):
   def _parse(descriptor, entries):
@@ -417,21 +726,13 @@ class NetworkStatusDocumentV2(NetworkStatusDocument):
     # that header/footer attributes aren't in the wrong section. This is a
     # deprecated descriptor type - patches welcome if you want those checks.
 
-    document_file = io.BytesIO(raw_content)
-    document_content = bytes.join(b'', _read_until_keywords((ROUTERS_START, V2_FOOTER_START), document_file))
-
-    router_iter = stem.descriptor.router_status_entry._parse_file(
-      document_file,
-      validate,
-      entry_class = RouterStatusEntryV2,
-      entry_keyword = ROUTERS_START,
-      section_end_keywords = (V2_FOOTER_START,),
-      extra_args = (self,),
-    )
+    routers_start = _section_start(raw_content, (ROUTERS_START, V2_FOOTER_START))
+    footer_start = _section_start(raw_content, (V2_FOOTER_START,), routers_start)
 
+    router_iter = (RouterStatusEntryV2(raw_content[start:end], validate, self) for (start, end) in _entry_spans(raw_content, (ROUTERS_START,), routers_start, footer_start))
     self.routers = dict((desc.fingerprint, desc) for desc in router_iter)
 
-    entries = _get_descriptor_components(document_content + b'\n' + document_file.read(), validate)
+    entries = _get_descriptor_components(raw_content[:routers_start] + b'\n' + raw_content[footer_start:], validate)
 
     if validate:
       self._check_constraints(entries)
@@ -651,8 +952,11 @@ class NetworkStatusDocumentV3(NetworkStatusDocument):
   """
   Version 3 network status document. This could be either a vote or consensus.
 
-  :var tuple routers: :class:`~stem.descriptor.router_status_entry.RouterStatusEntryV3`
-    contained in the document
+  :var dict routers: fingerprint to
+    :class:`~stem.descriptor.router_status_entry.RouterStatusEntryV3` mapping
+    for the relays in the document, unless we're validating these are only
+    parsed when they're first accessed (in which case this is a mapping
+    rather than a **dict**, use its copy() method if you need a **dict**)
 
   :var int version: **\*** document version
   :var str version_flavor: **\*** flavor associated with the document (such as 'microdesc')
@@ -751,34 +1055,30 @@ class NetworkStatusDocumentV3(NetworkStatusDocument):
     """
 
     super(NetworkStatusDocumentV3, self).__init__(raw_content, lazy_load = not validate)
-    document_file = io.BytesIO(raw_content)
+
+    # offsets where each section of the document begins
+
+    auth_start = _section_start(raw_content, (AUTH_START, ROUTERS_START, FOOTER_START))
+    routers_start = _section_start(raw_content, (ROUTERS_START, FOOTER_START, V2_FOOTER_START), auth_start)
+    footer_start = _section_start(raw_content, (FOOTER_START, V2_FOOTER_START), routers_start)
 
     self._default_params = default_params
-    self._header(document_file, validate)
+    self._header(raw_content[:auth_start], validate)
 
-    self.directory_authorities = tuple(stem.descriptor.router_status_entry._parse_file(
-      document_file,
-      validate,
-      entry_class = DirectoryAuthority,
-      entry_keyword = AUTH_START,
-      section_end_keywords = (ROUTERS_START, FOOTER_START, V2_FOOTER_START),
-      extra_args = (self.is_vote,),
-    ))
+    self.directory_authorities = tuple([DirectoryAuthority(raw_content[start:end], validate, self.is_vote) for (start, end) in _entry_spans(raw_content, (AUTH_START,), auth_start, routers_start)])
 
     if validate and self.is_vote and len(self.directory_authorities) != 1:
       raise ValueError('Votes should only have an authority entry for the one that issued it, got %i: %s' % (len(self.directory_authorities), self.directory_authorities))
 
-    router_iter = stem.descriptor.router_status_entry._parse_file(
-      document_file,
-      validate,
-      entry_class = RouterStatusEntryMicroV3 if self.is_microdescriptor else RouterStatusEntryV3,
-      entry_keyword = ROUTERS_START,
-      section_end_keywords = (FOOTER_START, V2_FOOTER_START),
-      extra_args = (self,),
-    )
+    router_type = RouterStatusEntryMicroV3 if self.is_microdescriptor else RouterStatusEntryV3
 
-    self.routers = dict((desc.fingerprint, desc) for desc in router_iter)
-    self._footer(document_file, validate)
+    if validate:
+      router_iter = (router_type(raw_content[start:end], validate, self) for (start, end) in _entry_spans(raw_content, (ROUTERS_START,), routers_start, footer_start))
+      self.routers = dict((desc.fingerprint, desc) for desc in router_iter)
+    else:
+      self.routers = _RouterStatusEntries(raw_content, routers_start, footer_start, router_type, self)
+
+    self._footer(raw_content[footer_start:], validate)
 
   def get_unrecognized_lines(self):
     if self._lazy_loading:
@@ -788,6 +1088,234 @@ class NetworkStatusDocumentV3(NetworkStatusDocument):
 
     return super(NetworkStatusDocumentV3, self).get_unrecognized_lines()
 
+  def to_table(self, validate = False):
+    """
+    Provides the router status entries of this document in parallel columns.
+    This is read from our content, so it's empty if we were parsed with
+    **DocumentHandler.BARE_DOCUMENT**.
+
+    :param bool validate: checks the validity of the router status entries if
+      **True**, skips malformed entries otherwise
+
+    :returns: :class:`~stem.descriptor.router_status_table.RouterStatusTable`
+      with our router status entries
+
+    :raises: **ValueError** if a router status entry is malformed and validate
+      is **True**
+    """
+
+    raw_content = self.get_bytes()
+    auth_start = _section_start(raw_content, (AUTH_START, ROUTERS_START, FOOTER_START))
+    routers_start = _section_start(raw_content, (ROUTERS_START, FOOTER_START, V2_FOOTER_START), auth_start)
+    footer_start = _section_start(raw_content, (FOOTER_START, V2_FOOTER_START), routers_start)
+
+    return stem.descriptor.router_status_table.RouterStatusTable(raw_content[routers_start:footer_start], validate, self, self.is_microdescriptor)
+
+  def diff(self, target):
+    """
+    Provides the consensus diff which transforms this document into another.
+    This is the ed-style format tor uses to fetch consensuses incrementally.
+    Router status entries are matched on their identity, so the diff only
+    includes the lines of relays that changed, joined, or left.
+
+    The diff's 'hash' line has the sha3-256 digest of our signed content (from
+    'network-status-version' through 'directory-signature ') and of the
+    target's full content.
+
+    :param stem.descriptor.networkstatus.NetworkStatusDocumentV3 target:
+      document the diff should produce
+
+    :returns: **str** with the consensus diff
+
+    :raises: **ImportError** if sha3 is unavailable
+    """
+
+    if not stem.prereq.is_sha3_available():
+      raise ImportError(stem.prereq.SHA3_UNAVAILABLE)
+
+    base_content = stem.util.str_tools._to_bytes(self.get_bytes())
+    target_content = stem.util.str_tools._to_bytes(target.get_bytes())
+
+    base_lines, target_lines = _diff_lines(base_content), _diff_lines(target_content)
+    diff = [DIFF_VERSION_LINE, b'hash ' + _digest_as_signed(base_content) + b' ' + _sha3_256(target_content)]
+
+    for base_start, base_end, target_start, target_end in reversed(_diff_opcodes(base_lines, target_lines)):
+      if base_start == base_end:
+        command = '%ia' % base_start
+      elif base_start + 1 == base_end:
+        command = '%i%s' % (base_end, 'd' if target_start == target_end else 'c')
+      else:
+        command = '%i,%i%s' % (base_start + 1, base_end, 'd' if target_start == target_end else 'c')
+
+      diff.append(stem.util.str_tools._to_bytes(command))
+
+      if target_start != target_end:
+        diff += target_lines[target_start:target_end]
+        diff.append(b'.')
+
+    return stem.util.str_tools._to_unicode(b'\n'.join(diff) + b'\n')
+
+  def apply_diff(self, diff, validate = False):
+    """
+    Provides the document that a consensus diff transforms us into. Router
+    status entries that the diff doesn't change are copied from ours rather
+    than parsed again, making this far cheaper than reading the new document.
+
+    Documents without router status entries of their own (such as those read
+    with **DocumentHandler.BARE_DOCUMENT**) don't have any to copy, so every
+    entry of the new document is parsed.
+
+    :param str diff: consensus diff to apply
+    :param bool validate: checks the validity of the new document and its
+      router status entries if **True**, skips these checks otherwise
+
+    :returns: :class:`~stem.descriptor.networkstatus.NetworkStatusDocumentV3`
+      the diff produces
+
+    :raises:
+      * **ValueError** if the diff is malformed, isn't for this document, or
+        the new document is invalid and validate is **True**
+      * **ImportError** if sha3 is unavailable
+    """
+
+    if not stem.prereq.is_sha3_available():
+      raise ImportError(stem.prereq.SHA3_UNAVAILABLE)
+
+    base_content = stem.util.str_tools._to_bytes(self.get_bytes())
+    diff_lines = _diff_lines(stem.util.str_tools._to_bytes(diff))
+
+    if len(diff_lines) < 2 or diff_lines[0] != DIFF_VERSION_LINE:
+      raise ValueError("Consensus diffs should start with '%s'" % stem.util.str_tools._to_unicode(DIFF_VERSION_LINE))
+
+    hash_line = diff_lines[1].split(b' ')
+
+    if len(hash_line) != 3 or hash_line[0] != b'hash':
+      raise ValueError("Consensus diff's second line should be 'hash <base digest> <target digest>': %s" % stem.util.str_tools._to_unicode(diff_lines[1]))
+
+    base_digest, target_digest = hash_line[1].upper(), hash_line[2].upper()
+
+    if base_digest != _digest_as_signed(base_content):
+      raise ValueError("Consensus diff is for a document with the digest %s, but ours is %s" % (stem.util.str_tools._to_unicode(base_digest), stem.util.str_tools._to_unicode(_digest_as_signed(base_content))))
+
+    lines = _diff_lines(base_content)
+    previous_start = len(lines) + 1
+    index = 2
+
+    while index < len(diff_lines):
+      match = DIFF_COMMAND.match(diff_lines[index])
+
+      if not match:
+        raise ValueError("Malformed consensus diff command: %s" % stem.util.str_tools._to_unicode(diff_lines[index]))
+
+      start, end, command = match.groups()
+      start = int(start)
+      end = start if end is None else (len(lines) if end == b'$' else int(end))
+      index += 1
+
+      if command == b'a':
+        if end != start:
+          raise ValueError('Consensus diff appends can only be for a single line: %s' % stem.util.str_tools._to_unicode(diff_lines[index - 1]))
+
+        start, end = start + 1, start  # appends come after the line
+      elif start < 1 or end < start:
+        raise ValueError('Consensus diff has an invalid range: %s' % stem.util.str_tools._to_unicode(diff_lines[index - 1]))
+
+      if end >= previous_start:
+        raise ValueError("Consensus diff commands must be in descending order: %s" % stem.util.str_tools._to_unicode(diff_lines[index - 1]))
+
+      previous_start = start
+      new_lines = []
+
+      if command in (b'a', b'c'):
+        try:
+          terminator = diff_lines.index(b'.', index)
+        except ValueError:
+          raise ValueError("Consensus diff's '%s' command lacks a terminating '.'" % stem.util.str_tools._to_unicode(diff_lines[index - 1]))
+
+        new_lines = diff_lines[index:terminator]
+        index = terminator + 1
+
+      lines[start - 1:end] = new_lines
+
+    content = b'\n'.join(lines) + b'\n'
+
+    if target_digest != _sha3_256(content):
+      raise ValueError("Consensus diff should produce a document with the digest %s, but we got %s" % (stem.util.str_tools._to_unicode(target_digest), stem.util.str_tools._to_unicode(_sha3_256(content))))
+
+    # Constructs the document from its header and footer, then fills in its
+    # router status entries. Entries with the same content as one of ours are
+    # shallow copies rather than being parsed again. We find these from where
+    # our entries are within our content so only the ones we copy need to be
+    # parsed (if they haven't been already).
+
+    header_start, routers_start, routers_end = _document_sections(content)
+
+    document = NetworkStatusDocumentV3(content[:routers_start] + content[routers_end:], validate, self._default_params)
+    document._raw_contents = content
+
+    router_type = RouterStatusEntryMicroV3 if document.is_microdescriptor else RouterStatusEntryV3
+    our_routers = getattr(self, 'routers', {})
+    our_spans = {}  # fingerprint => (start, end) of our entry
+    routers = []
+
+    _, our_routers_start, our_routers_end = _document_sections(base_content)
+
+    for entry_start, entry_end in _entry_spans(base_content, (ROUTERS_START,), our_routers_start, our_routers_end):
+      fingerprint = _entry_fingerprint(base_content, entry_start, entry_end)
+
+      if fingerprint is not None:
+        our_spans[fingerprint] = (entry_start, entry_end)
+
+    for entry_start, entry_end in _entry_spans(content, (ROUTERS_START,), routers_start, routers_end):
+      entry_content = content[entry_start:entry_end]
+      fingerprint = _entry_fingerprint(content, entry_start, entry_end)
+      our_start, our_end = our_spans.get(fingerprint, (0, 0))
+      router = None
+
+      if base_content[our_start:our_end] == entry_content and fingerprint in our_routers:
+        router = our_routers[fingerprint]
+
+        if type(router) != router_type or stem.util.str_tools._to_bytes(router.get_bytes()) != entry_content:
+          router = None  # our routers were modified since we were read
+
+      if router is not None:
+        router = copy.copy(router)
+        router.document = document
+      else:
+        router = router_type(entry_content, validate, document)
+
+      routers.append(router)
+
+    document.routers = dict((router.fingerprint, router) for router in routers)
+
+    return document
+
+  def validate_signatures(self, key_certs):
+    """
+    Checks our directory signatures against the key certificates of the
+    authorities. We need valid signatures from more than half of our
+    authorities (or for votes, the authority that made it).
+
+    Signatures for authorities without a certificate, or with an
+    unrecognized digest algorithm, are skipped.
+
+    :param list key_certs: :class:`~stem.descriptor.networkstatus.KeyCertificate`
+      of the authorities
+
+    :returns: **list** of :class:`~stem.descriptor.networkstatus.DocumentSignature`
+      that are valid
+
+    :raises:
+      * **ValueError** if an insufficient number of signatures are valid
+      * **ImportError** if pycrypto is unavailable
+    """
+
+    if not stem.prereq.is_crypto_available():
+      raise ImportError(stem.prereq.CRYPTO_UNAVAILABLE)
+
+    content = stem.util.str_tools._to_bytes(self.get_bytes())
+    return _validate_signatures(content, self.signatures, len(self.directory_authorities), _signing_keys(key_certs))
+
   def meets_consensus_method(self, method):
     """
     Checks if we meet the given consensus-method. This works for both votes and
@@ -812,8 +1340,7 @@ class NetworkStatusDocumentV3(NetworkStatusDocument):
 
     return method(str(self).strip(), str(other).strip())
 
-  def _header(self, document_file, validate):
-    content = bytes.join(b'', _read_until_keywords((AUTH_START, ROUTERS_START, FOOTER_START), document_file))
+  def _header(self, content, validate):
     entries = _get_descriptor_components(content, validate)
 
     if validate:
@@ -841,8 +1368,8 @@ class NetworkStatusDocumentV3(NetworkStatusDocument):
       self._header_entries = entries
       self._entries.update(entries)
 
-  def _footer(self, document_file, validate):
-    entries = _get_descriptor_components(document_file.read(), validate)
+  def _footer(self, content, validate):
+    entries = _get_descriptor_components(content, validate)
 
     if validate:
       for keyword, values in list(entries.items()):
@@ -904,6 +1431,228 @@ class NetworkStatusDocumentV3(NetworkStatusDocument):
     return self._compare(other, lambda s, o: s <= o)
 
 
+def _diff_lines(content):
+  """
+  Splits content into its lines for a consensus diff.
+  """
+
+  lines = content.split(b'\n')
+  return lines[:-1] if lines and not lines[-1] else lines
+
+
+def _diff_opcodes(base_lines, target_lines):
+  """
+  Provides the ranges of lines that differ between two network status
+  documents. Rather than comparing their router status entries with a general
+  purpose (and for large documents, slow) line diff we pair them up by their
+  identity, much like tor does.
+
+  :param list base_lines: lines of the document we're changing
+  :param list target_lines: lines of the document we should produce
+
+  :returns: **list** of (base_start, base_end, target_start, target_end)
+    tuples for the lines to be replaced, in ascending order
+  """
+
+  base_sections, target_sections = _diff_sections(base_lines), _diff_sections(target_lines)
+  opcodes = []
+
+  def add_opcodes(base_start, base_end, target_start, target_end):
+    # compares a small section, like a document's header or a single entry
+
+    matcher = difflib.SequenceMatcher(None, base_lines[base_start:base_end], target_lines[target_start:target_end], autojunk = False)
+
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+      if tag != 'equal':
+        opcodes.append([base_start + i1, base_start + i2, target_start + j1, target_start + j2])
+
+  add_opcodes(0, base_sections[0], 0, target_sections[0])
+
+  base_entries, target_entries = base_sections[1:-1], target_sections[1:-1]
+  base_index, target_index = 0, 0
+
+  while base_index < len(base_entries) or target_index < len(target_entries):
+    base_key = base_entries[base_index][0] if base_index < len(base_entries) else None
+    target_key = target_entries[target_index][0] if target_index < len(target_entries) else None
+
+    if base_key is not None and base_key == target_key:
+      base_start, base_end = base_entries[base_index][1:]
+      target_start, target_end = target_entries[target_index][1:]
+
+      if base_lines[base_start:base_end] != target_lines[target_start:target_end]:
+        add_opcodes(base_start, base_end, target_start, target_end)
+
+      base_index += 1
+      target_index += 1
+    elif target_key is None or (base_key is not None and base_key < target_key):
+      base_start, base_end = base_entries[base_index][1:]
+      target_position = target_entries[target_index][1] if target_key is not None else target_sections[-1][1]
+      opcodes.append([base_start, base_end, target_position, target_position])
+      base_index += 1
+    else:
+      target_start, target_end = target_entries[target_index][1:]
+      base_position = base_entries[base_index][1] if base_key is not None else base_sections[-1][1]
+      opcodes.append([base_position, base_position, target_start, target_end])
+      target_index += 1
+
+  add_opcodes(base_sections[-1][1], len(base_lines), target_sections[-1][1], len(target_lines))
+
+  # Merges changes that touch, so each range of lines has a single command.
+
+  merged = []
+
+  for opcode in opcodes:
+    if merged and merged[-1][1] == opcode[0] and merged[-1][3] == opcode[2]:
+      merged[-1][1], merged[-1][3] = opcode[1], opcode[3]
+    else:
+      merged.append(opcode)
+
+  return merged
+
+
+def _diff_sections(lines):
+  """
+  Divides the lines of a network status document into its header (including
+  directory authorities), router status entries, and footer.
+
+  :returns: **list** with the header's end, (identity, start, end) tuples for
+    each router status entry, and finally a (None, footer start) tuple
+  """
+
+  index = 0
+
+  while index < len(lines) and not (lines[index].startswith(b'r ') or _is_footer_line(lines[index])):
+    index += 1
+
+  sections = [index]
+  entry = None
+
+  while index < len(lines) and not _is_footer_line(lines[index]):
+    if lines[index].startswith(b'r '):
+      if entry:
+        sections.append((entry[0], entry[1], index))
+
+      r_comp = lines[index].split(b' ')
+
+      try:
+        identity = binascii.a2b_base64(r_comp[2] + b'=')
+      except (IndexError, TypeError, binascii.Error):
+        identity = lines[index]
+
+      entry = (identity, index)
+
+    index += 1
+
+  if entry:
+    sections.append((entry[0], entry[1], index))
+
+  sections.append((None, index))
+  return sections
+
+
+def _is_footer_line(line):
+  return line == b'directory-footer' or line.startswith(b'directory-footer ') or line.startswith(b'directory-signature ')
+
+
+def _digest_as_signed(content):
+  """
+  Provides the uppercase hex sha3-256 digest of a document's signed content,
+  from its 'network-status-version' line through 'directory-signature '.
+  """
+
+  return _sha3_256(_signed_content(content))
+
+
+def _sha3_256(content):
+  return stem.util.str_tools._to_bytes(hashlib.sha3_256(content).hexdigest().upper())
+
+
+def _signed_content(content):
+  """
+  Provides the portion of a document that its authorities sign, from its
+  'network-status-version' line through 'directory-signature '.
+  """
+
+  start = _find_keyword_line(content, (b'network-status-version',))
+  end = _find_keyword_line(content, (b'directory-signature',), max(start, 0))
+
+  if start == -1 or end == -1:
+    raise ValueError("Network status documents must have both a 'network-status-version' and 'directory-signature' line")
+
+  return content[start:end + len(b'directory-signature ')]
+
+
+def _signing_keys(key_certs):
+  """
+  Provides a mapping of (fingerprint, key_digest) to the signing key of each
+  certificate, which is how directory signatures refer to them.
+  """
+
+  signing_keys = {}
+
+  for key_cert in key_certs:
+    if key_cert.fingerprint and key_cert.signing_key:
+      key_digest = hashlib.sha1(_pem_bytes(key_cert.signing_key)).hexdigest().upper()
+      signing_keys[(key_cert.fingerprint.upper(), key_digest)] = key_cert.signing_key
+
+  return signing_keys
+
+
+@lru_cache(maxsize = 128)
+def _signing_key(key_digest, signing_key):
+  """
+  Provides the modulus and exponent of a signing key. Authorities only make a
+  new signing key every few months, so the same few keys sign many documents.
+  """
+
+  return _rsa_public_key(_pem_bytes(signing_key))
+
+
+def _validate_signatures(content, signatures, authority_count, signing_keys):
+  """
+  Checks directory signatures against the authorities' signing keys. The
+  signed content's digest is only calculated once for each algorithm.
+
+  :param bytes content: document content
+  :param list signatures: document's DocumentSignature
+  :param int authority_count: number of authorities in the document
+  :param dict signing_keys: (fingerprint, key_digest) => signing key mapping
+
+  :returns: **list** of DocumentSignature that are valid
+
+  :raises: **ValueError** if an insufficient number of signatures are valid
+  """
+
+  signed_content = _signed_content(content)
+  digests, valid_signatures = {}, []
+
+  for signature in signatures:
+    signing_key = signing_keys.get((signature.identity.upper(), signature.key_digest.upper()))
+    digest_method = SIGNATURE_DIGESTS.get(signature.method)
+
+    if signing_key is None or digest_method is None:
+      continue
+
+    if signature.method not in digests:
+      digests[signature.method] = digest_method(signed_content).hexdigest().upper()
+
+    try:
+      modulus, public_exponent = _signing_key(signature.key_digest.upper(), signing_key)
+      signed_digest = _decrypt_signature(_pem_bytes(signature.signature), modulus, public_exponent)
+    except (ValueError, TypeError, binascii.Error):
+      continue
+
+    if signed_digest == digests[signature.method]:
+      valid_signatures.append(signature)
+
+  required = (authority_count if authority_count else len(signatures)) // 2 + 1
+
+  if len(valid_signatures) < required:
+    raise ValueError('Network status document has %i valid signatures, but needs at least %i' % (len(valid_signatures), required))
+
+  return valid_signatures
+
+
 def _check_for_missing_and_disallowed_fields(document, entries, fields):
   """
   Checks that we have mandatory fields for our type, and that we don't have
@@ -1361,8 +2110,7 @@ class BridgeNetworkStatusDocument(NetworkStatusDocument):
 
     self.published = None
 
-    document_file = io.BytesIO(raw_content)
-    published_line = stem.util.str_tools._to_unicode(document_file.readline())
+    published_line = stem.util.str_tools._to_unicode(raw_content[:_line_end(raw_content, 0)])
 
     if published_line.startswith('published '):
       published_line = published_line.split(' ', 1)[1].strip()
@@ -1375,11 +2123,7 @@ class BridgeNetworkStatusDocument(NetworkStatusDocument):
     elif validate:
       raise ValueError("Bridge network status documents must start with a 'published' line:\n%s" % stem.util.str_tools._to_unicode(raw_content))
 
-    router_iter = stem.descriptor.router_status_entry._parse_file(
-      document_file,
-      validate,
-      entry_class = RouterStatusEntryV2,
-      extra_args = (self,),
-    )
+    routers_start = _line_end(raw_content, 0)
+    router_iter = (RouterStatusEntryV2(raw_content[start:end], validate, self) for (start, end) in _entry_spans(raw_content, (ROUTERS_START,), routers_start))
 
     self.routers = dict((desc.fingerprint, desc) for desc in router_iter)
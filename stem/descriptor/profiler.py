@@ -0,0 +1,229 @@
+# Copyright 2015, Damian Johnson and The Tor Project
+# See LICENSE for licensing information
+
+"""
+Instrumentation for how long we spend parsing each part of a descriptor. Rather
+than profiling a whole job with cProfile this times the individual parsing
+function for each keyword, broken down by descriptor type...
+
+::
+
+  from stem.descriptor import parse_file
+  from stem.descriptor.profiler import ParserProfiler
+
+  with ParserProfiler() as profiler:
+    for desc in parse_file('/tmp/server-descriptors-2014-12.tar'):
+      if desc.exit_policy.is_exiting_allowed():
+        print desc.nickname
+
+  print profiler.report()
+
+::
+
+  Descriptor Type       Parser                          Calls     Runtime   Per Call
+  RelayDescriptor       _parse_exit_policy              21033      1.084s    51.5 us
+  RelayDescriptor       _parse_router_line              21033      0.201s     9.6 us
+  ...
+
+This includes both descriptors that are fully parsed as they're constructed
+(when validated) and attributes that are lazy loaded. Only parsing within this
+process is included, so descriptors parsed with **workers** aren't counted.
+
+Only one profiler can be collecting statistics at a time. Profiling adds a
+little overhead to parsing, so this is best used to investigate performance
+rather than left running.
+
+**Module Overview:**
+
+::
+
+  ParserProfiler - Collects statistics for our descriptor parsing functions
+    |- start - starts collecting statistics
+    |- stop - stops collecting statistics
+    |- stats - statistics for each parsing function
+    |- runtime_by_type - total runtime for each descriptor type
+    |- report - human readable table of our statistics
+    |- reset - discards the statistics we've collected
+    +- __enter__ / __exit__ - collects statistics within the context
+
+.. data:: ParserStats
+
+  Statistics for a descriptor parsing function, as a named tuple with the
+  following attributes...
+
+  * **descriptor_type** (*str*) - descriptor class the parser was used for
+  * **parser** (*str*) - name of the parsing function
+  * **count** (*int*) - number of times it was called
+  * **runtime** (*float*) - cumulative seconds spent in it
+"""
+
+import collections
+import sys
+import threading
+import time
+
+import stem.descriptor
+
+ParserStats = collections.namedtuple('ParserStats', [
+  'descriptor_type',
+  'parser',
+  'count',
+  'runtime',
+])
+
+# Higher resolution than time.time() when available (added in python 3.3).
+
+_timer = getattr(time, 'perf_counter', time.time)
+
+
+class ParserProfiler(object):
+  """
+  Collects the number of calls and cumulative runtime of the functions that
+  parse descriptor content.
+  """
+
+  def __init__(self):
+    self._stats = {}  # (descriptor class, parser) => [count, runtime]
+    self._parser_names = {}  # (descriptor class, parser) => name
+    self._stats_lock = threading.RLock()
+
+  def start(self):
+    """
+    Starts collecting statistics for the descriptors we parse.
+
+    :raises: **ValueError** if another profiler is already running
+    """
+
+    if stem.descriptor._PROFILER not in (None, self):
+      raise ValueError('Another ParserProfiler is already running, you need to stop it first')
+
+    stem.descriptor._PROFILER = self
+
+  def stop(self):
+    """
+    Stops collecting statistics.
+    """
+
+    if stem.descriptor._PROFILER is self:
+      stem.descriptor._PROFILER = None
+
+  def stats(self):
+    """
+    Provides the statistics we've collected for each parsing function,
+    sorted by their runtime.
+
+    :returns: **list** of :data:`~stem.descriptor.profiler.ParserStats`
+    """
+
+    with self._stats_lock:
+      results = [ParserStats(descriptor_class.__name__, self._parser_name(descriptor_class, parser), count, runtime) for ((descriptor_class, parser), (count, runtime)) in self._stats.items()]
+
+    return sorted(results, key = lambda entry: (-entry.runtime, entry.descriptor_type, entry.parser))
+
+  def runtime_by_type(self):
+    """
+    Provides the total time we've spent parsing each type of descriptor.
+
+    :returns: **dict** mapping descriptor class names to the seconds we spent
+      parsing them
+    """
+
+    runtimes = {}
+
+    for entry in self.stats():
+      runtimes[entry.descriptor_type] = runtimes.get(entry.descriptor_type, 0.0) + entry.runtime
+
+    return runtimes
+
+  def report(self):
+    """
+    Provides a table of the statistics we've collected.
+
+    :returns: **str** with a line for each parsing function, followed by the
+      total for each descriptor type
+    """
+
+    stats = self.stats()
+    type_width = max([len('Descriptor Type')] + [len(entry.descriptor_type) for entry in stats])
+    parser_width = max([len('Parser')] + [len(entry.parser) for entry in stats])
+    row = '%%-%is  %%-%is  %%8s  %%10s  %%10s' % (type_width, parser_width)
+
+    lines = [row % ('Descriptor Type', 'Parser', 'Calls', 'Runtime', 'Per Call')]
+
+    for entry in stats:
+      lines.append(row % (entry.descriptor_type, entry.parser, entry.count, '%0.3fs' % entry.runtime, '%0.1f us' % (entry.runtime * 1000000 / entry.count)))
+
+    if stats:
+      lines.append('')
+
+      for descriptor_type, runtime in sorted(self.runtime_by_type().items(), key = lambda entry: -entry[1]):
+        lines.append(row % (descriptor_type, 'total', '', '%0.3fs' % runtime, ''))
+
+    return '\n'.join([line.rstrip() for line in lines])
+
+  def reset(self):
+    """
+    Discards the statistics we've collected so far.
+    """
+
+    with self._stats_lock:
+      self._stats = {}
+
+  def _call(self, descriptor, parser, entries):
+    """
+    Runs a parsing function, recording how long it took.
+
+    :param stem.descriptor.__init__.Descriptor descriptor: descriptor being
+      parsed
+    :param functor parser: parsing function to run
+    :param dict entries: content the parser is applied to
+    """
+
+    start_time = _timer()
+
+    try:
+      parser(descriptor, entries)
+    finally:
+      runtime = _timer() - start_time
+      key = (type(descriptor), parser)
+
+      with self._stats_lock:
+        stats = self._stats.get(key)
+
+        if stats is None:
+          self._stats[key] = [1, runtime]
+        else:
+          stats[0] += 1
+          stats[1] += runtime
+
+  def _parser_name(self, descriptor_class, parser):
+    """
+    Provides a readable name for a parsing function. Many of these are made
+    by helpers like _parse_simple_line() or functools.partial(), so we use
+    the name they're assigned to in the module that defines the descriptor.
+    """
+
+    key = (descriptor_class, parser)
+
+    if key not in self._parser_names:
+      name = getattr(parser, '__name__', None)
+
+      if name in (None, '_parse', '<lambda>'):
+        for cls in descriptor_class.__mro__:
+          module = sys.modules.get(cls.__module__)
+          module_names = [attr for (attr, value) in vars(module).items() if value is parser] if module else []
+
+          if module_names:
+            name = sorted(module_names)[0]
+            break
+
+      self._parser_names[key] = name if name else repr(parser)
+
+    return self._parser_names[key]
+
+  def __enter__(self):
+    self.start()
+    return self
+
+  def __exit__(self, exit_type, value, traceback):
+    self.stop()
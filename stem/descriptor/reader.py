@@ -260,10 +260,19 @@ class DescriptorReader(object):
     listings from this path, errors are ignored
   :param stem.descriptor.__init__.DocumentHandler document_handler: method in
     which to parse :class:`~stem.descriptor.networkstatus.NetworkStatusDocument`
+  :param int workers: number of processes to parse with, if more than one
+  :param bool ordered: provides descriptors in the order they're read if
+    parsing with multiple processes, otherwise provides them as soon as
+    they're available
+  :param bool compact: fully parses descriptors and discards content that's
+    only needed for parsing them, see
+    :func:`~stem.descriptor.__init__.parse_file`
+  :param stem.descriptor.cache.DescriptorCache cache: persistent cache to
+    load and save the descriptors of files with
   :param dict kwargs: additional arguments for the descriptor constructor
   """
 
-  def __init__(self, target, validate = False, follow_links = False, buffer_size = 100, persistence_path = None, document_handler = stem.descriptor.DocumentHandler.ENTRIES, **kwargs):
+  def __init__(self, target, validate = False, follow_links = False, buffer_size = 100, persistence_path = None, document_handler = stem.descriptor.DocumentHandler.ENTRIES, workers = None, ordered = True, compact = False, cache = None, **kwargs):
     if isinstance(target, (bytes, str_type)):
       self._targets = [target]
     else:
@@ -277,7 +286,12 @@ class DescriptorReader(object):
     self._follow_links = follow_links
     self._persistence_path = persistence_path
     self._document_handler = document_handler
+    self._workers = workers
+    self._ordered = ordered
+    self._compact = compact
+    self._cache = cache
     self._kwargs = kwargs
+    self._pool = None
     self._read_listeners = []
     self._skip_listeners = []
     self._processed_files = {}
@@ -423,18 +437,26 @@ class DescriptorReader(object):
     new_processed_files = {}
     remaining_files = list(self._targets)
 
-    while remaining_files and not self._is_stopped.is_set():
-      target = remaining_files.pop(0)
+    if self._workers is not None and self._workers > 1:
+      self._pool = stem.descriptor._ParsingPool(self._workers, self._ordered)
 
-      if not os.path.exists(target):
-        self._notify_skip_listeners(target, FileMissing())
-        continue
-
-      if os.path.isdir(target):
-        walker = os.walk(target, followlinks = self._follow_links)
-        self._handle_walker(walker, new_processed_files)
-      else:
-        self._handle_file(target, new_processed_files)
+    try:
+      while remaining_files and not self._is_stopped.is_set():
+        target = remaining_files.pop(0)
+
+        if not os.path.exists(target):
+          self._notify_skip_listeners(target, FileMissing())
+          continue
+
+        if os.path.isdir(target):
+          walker = os.walk(target, followlinks = self._follow_links)
+          self._handle_walker(walker, new_processed_files)
+        else:
+          self._handle_file(target, new_processed_files)
+    finally:
+      if self._pool:
+        self._pool.close()
+        self._pool = None
 
     self._processed_files = new_processed_files
 
@@ -507,13 +529,16 @@ class DescriptorReader(object):
     try:
       self._notify_read_listeners(target)
 
-      with open(target, 'rb') as target_file:
-        for desc in stem.descriptor.parse_file(target_file, validate = self._validate, document_handler = self._document_handler, **self._kwargs):
-          if self._is_stopped.is_set():
-            return
+      if self._cache:
+        descriptors = stem.descriptor._parse_file_with_cache(self._cache, target, None, self._validate, self._document_handler, False, self._pool, **self._kwargs)
+      else:
+        descriptors = stem.descriptor._parse_file(target, None, self._validate, self._document_handler, False, self._pool, **self._kwargs)
 
-          self._unreturned_descriptors.put(desc)
-          self._iter_notice.set()
+      for desc in descriptors:
+        if self._is_stopped.is_set():
+          return
+
+        self._enqueue(desc)
     except TypeError as exc:
       self._notify_skip_listeners(target, UnrecognizedType(mime_type))
     except ValueError as exc:
@@ -527,12 +552,32 @@ class DescriptorReader(object):
     #
     #   http://bugs.python.org/issue7232
 
-    tar_file = None
+    tar_file, writer, is_complete = None, None, False
 
     try:
       self._notify_read_listeners(target)
+
+      if self._cache:
+        descriptors = self._cache.get(target, None, self._validate, self._document_handler, self._kwargs)
+
+        if descriptors is not None:
+          for desc in descriptors:
+            if self._is_stopped.is_set():
+              return
+
+            desc._set_path(os.path.abspath(target))
+            self._enqueue(desc)
+
+          return
+
+        writer = self._cache._writer(target, None, self._validate, self._document_handler, self._kwargs)
+
       tar_file = tarfile.open(target)
 
+      if self._pool:
+        is_complete = self._handle_archive_in_pool(target, tar_file, writer)
+        return
+
       for tar_entry in tar_file:
         if tar_entry.isfile():
           entry = tar_file.extractfile(tar_entry)
@@ -544,20 +589,73 @@ class DescriptorReader(object):
 
               desc._set_path(os.path.abspath(target))
               desc._set_archive_path(tar_entry.name)
-              self._unreturned_descriptors.put(desc)
-              self._iter_notice.set()
+
+              if writer:
+                writer.add(desc)
+
+              self._enqueue(desc)
           except TypeError as exc:
+            writer = self._discard(writer)
             self._notify_skip_listeners(target, ParsingFailure(exc))
           except ValueError as exc:
+            writer = self._discard(writer)
             self._notify_skip_listeners(target, ParsingFailure(exc))
           finally:
             entry.close()
+
+      is_complete = True
     except IOError as exc:
       self._notify_skip_listeners(target, ReadFailed(exc))
     finally:
       if tar_file:
         tar_file.close()
 
+      # only cache archives that we've read in full, without parsing failures
+
+      if writer and is_complete:
+        writer.commit()
+      elif writer:
+        writer.discard()
+
+  def _handle_archive_in_pool(self, target, tar_file, writer):
+    results = stem.descriptor._parse_tarfile_in_pool(self._pool, tar_file, None, self._validate, self._document_handler, **self._kwargs)
+
+    for archive_path, descriptors, exc in results:
+      for desc in descriptors:
+        if self._is_stopped.is_set():
+          return False
+
+        desc._set_path(os.path.abspath(target))
+        desc._set_archive_path(archive_path)
+
+        if writer:
+          writer.add(desc)
+
+        self._enqueue(desc)
+
+      if isinstance(exc, (TypeError, ValueError)):
+        writer = self._discard(writer)
+        self._notify_skip_listeners(target, ParsingFailure(exc))
+      elif exc:
+        raise exc
+
+    return writer is not None
+
+  def _enqueue(self, desc):
+    if self._compact:
+      desc._compact()
+
+    self._unreturned_descriptors.put(desc)
+    self._iter_notice.set()
+
+  def _discard(self, writer):
+    # drops what we've cached since the file had content we couldn't parse
+
+    if writer:
+      writer.discard()
+
+    return None
+
   def _notify_read_listeners(self, path):
     for listener in self._read_listeners:
       listener(path)
@@ -0,0 +1,331 @@
+# Copyright 2015, Damian Johnson and The Tor Project
+# See LICENSE for licensing information
+
+"""
+Bandwidth weighted relay selection over a v3 network status document, much
+like tor does when building circuits. This is handy for simulating path
+selection, for instance to estimate how often a relay is used as a guard.
+
+Selection weights are calculated once when we're constructed, after which
+each selection is a binary search over cumulative weights rather than a pass
+over all the relays in the consensus...
+
+::
+
+  import stem.descriptor
+
+  from stem.descriptor import DocumentHandler
+  from stem.descriptor.relay_selection import RelaySelector
+
+  consensus = next(stem.descriptor.parse_file('/home/atagar/.tor/cached-consensus', document_handler = DocumentHandler.DOCUMENT))
+  selector = RelaySelector(consensus)
+
+  for i in range(5):
+    guard, middle, exit = selector.select_path()
+    print '%s => %s => %s' % (guard.nickname, middle.nickname, exit.nickname)
+
+A relay's weight for a position is its bandwidth scaled by the consensus'
+bandwidth-weights for relays with its flags (see section 3.8.3 of the
+`dir-spec <https://gitweb.torproject.org/torspec.git/tree/dir-spec.txt>`_).
+Relays must have the Running and Valid flags, guards must have the Guard flag,
+and exits must have the Exit flag without BadExit.
+
+Paths don't include more than one relay from the same /16 subnet or family.
+Router status entries don't say what family a relay belongs to, so these
+come from the server descriptors or microdescriptors you provide.
+
+**Module Overview:**
+
+::
+
+  RelaySelector - Bandwidth weighted selection of relays in a consensus
+    |- select - picks a relay for a position
+    |- select_path - picks a guard, middle, and exit relay
+    |- get_probability - likelihood of selecting a relay for a position
+    +- relays - relays that can be selected for a position
+
+.. data:: Position (enum)
+
+  Positions a relay can be selected for.
+
+  ============ ===========
+  Position     Description
+  ============ ===========
+  **GUARD**    first hop of a circuit
+  **MIDDLE**   intermediate hop of a circuit
+  **EXIT**     last hop of a circuit, where traffic leaves the tor network
+  ============ ===========
+"""
+
+import bisect
+import random
+
+import stem.util.enum
+
+from stem import Flag
+
+Position = stem.util.enum.UppercaseEnum(
+  'GUARD',
+  'MIDDLE',
+  'EXIT',
+)
+
+# Rejection sampling attempts before we fall back to only considering relays
+# that aren't excluded.
+
+MAX_SELECTION_ATTEMPTS = 100
+
+DEFAULT_WEIGHT_SCALE = 10000
+
+# bandwidth-weights for each position and relay type, the types being guards
+# ('g'), exits ('e'), relays with both flags ('d'), and neither ('m')
+
+POSITION_WEIGHTS = {
+  Position.GUARD: {'g': 'Wgg', 'm': 'Wgm', 'e': None, 'd': 'Wgd'},
+  Position.MIDDLE: {'g': 'Wmg', 'm': 'Wmm', 'e': 'Wme', 'd': 'Wmd'},
+  Position.EXIT: {'g': 'Weg', 'm': 'Wem', 'e': 'Wee', 'd': 'Wed'},
+}
+
+
+class RelaySelector(object):
+  """
+  Bandwidth weighted selection of the relays in a v3 network status document.
+
+  :var stem.descriptor.networkstatus.NetworkStatusDocumentV3 document:
+    consensus we're selecting from
+  :var bool distinct_subnets: paths don't include multiple relays in the same
+    /16 if **True**
+  """
+
+  def __init__(self, document, families = None, distinct_subnets = True, rng = None):
+    """
+    Calculates the selection weights of the document's relays.
+
+    :param stem.descriptor.networkstatus.NetworkStatusDocumentV3 document:
+      consensus to select from, this must have its router status entries
+    :param dict families: mapping of fingerprints to the fingerprints of their
+      declared family members, two relays are in the same family if each
+      lists the other
+    :param bool distinct_subnets: paths don't include multiple relays in the
+      same /16 if **True**
+    :param random.Random rng: source of randomness, the random module if
+      **None**
+    """
+
+    self.document = document
+    self.distinct_subnets = distinct_subnets
+
+    self._random = rng if rng else random
+    self._families = {}
+
+    for fingerprint, members in (families or {}).items():
+      self._families[_normalize_fingerprint(fingerprint)] = set(map(_normalize_fingerprint, members))
+
+    weight_scale = document.params.get('bwweightscale', DEFAULT_WEIGHT_SCALE)
+    bandwidth_weights = document.bandwidth_weights
+
+    self._relays = {}
+    self._cumulative_weights = {}
+
+    for position in Position:
+      eligible = _is_eligible_for(position)
+      weights = {}
+
+      for relay_type, weight_key in POSITION_WEIGHTS[position].items():
+        if weight_key is None:
+          weights[relay_type] = 0.0
+        else:
+          weights[relay_type] = float(bandwidth_weights.get(weight_key, weight_scale)) / weight_scale
+
+      relays, cumulative_weights, total = [], [], 0.0
+
+      for relay in document.routers.values():
+        if not eligible(relay):
+          continue
+
+        total += (relay.bandwidth or 0) * weights[_relay_type(relay)]
+        relays.append(relay)
+        cumulative_weights.append(total)
+
+      self._relays[position] = relays
+      self._cumulative_weights[position] = cumulative_weights
+
+  def relays(self, position):
+    """
+    Provides the relays that can be selected for a position. This includes
+    relays that are eligible but have a weight of zero.
+
+    :param stem.descriptor.relay_selection.Position position: position to
+      provide the relays for
+
+    :returns: **list** of router status entries
+    """
+
+    return list(self._relays[position])
+
+  def get_probability(self, fingerprint, position):
+    """
+    Provides the likelihood of selecting a relay for a position, disregarding
+    any exclusions.
+
+    :param str fingerprint: fingerprint of the relay
+    :param stem.descriptor.relay_selection.Position position: position to
+      provide the probability for
+
+    :returns: **float** between zero and one for how likely we are to select
+      the relay
+    """
+
+    relays, cumulative_weights = self._relays[position], self._cumulative_weights[position]
+
+    if not relays or not cumulative_weights[-1]:
+      return 0.0
+
+    for index, relay in enumerate(relays):
+      if relay.fingerprint == fingerprint:
+        weight = cumulative_weights[index] - (cumulative_weights[index - 1] if index else 0.0)
+        return weight / cumulative_weights[-1]
+
+    return 0.0
+
+  def select(self, position, exclude = ()):
+    """
+    Picks a relay for a position, weighted by its bandwidth. Relays that are
+    excluded or share a family or /16 with them are never selected.
+
+    :param stem.descriptor.relay_selection.Position position: position to
+      select a relay for
+    :param list exclude: router status entries already in the path
+
+    :returns: :class:`~stem.descriptor.router_status_entry.RouterStatusEntryV3`
+      or :class:`~stem.descriptor.router_status_entry.RouterStatusEntryMicroV3`
+      that we selected
+
+    :raises: **ValueError** if no relays can be selected for the position
+    """
+
+    relays, cumulative_weights = self._relays[position], self._cumulative_weights[position]
+    is_excluded = self._exclusion_check(exclude)
+
+    if relays and cumulative_weights[-1] > 0:
+      total = cumulative_weights[-1]
+
+      for _ in range(MAX_SELECTION_ATTEMPTS):
+        index = min(bisect.bisect_right(cumulative_weights, self._random.random() * total), len(relays) - 1)
+
+        if not is_excluded(relays[index]):
+          return relays[index]
+
+      # Most of the weight is excluded, so only consider the relays that
+      # remain. This is a linear scan but should rarely be needed.
+
+      candidates, candidate_weights, total = [], [], 0.0
+
+      for index, relay in enumerate(relays):
+        weight = cumulative_weights[index] - (cumulative_weights[index - 1] if index else 0.0)
+
+        if weight > 0 and not is_excluded(relay):
+          total += weight
+          candidates.append(relay)
+          candidate_weights.append(total)
+
+      if candidates:
+        return candidates[min(bisect.bisect_right(candidate_weights, self._random.random() * total), len(candidates) - 1)]
+
+    raise ValueError('No relays can be selected for the %s position' % position.lower())
+
+  def select_path(self):
+    """
+    Picks relays for a three hop circuit. Like tor, we pick the exit first,
+    then the guard, and finally the middle relay.
+
+    :returns: **tuple** of the form (guard, middle, exit) with the router
+      status entries we selected
+
+    :raises: **ValueError** if no relays can be selected for a position
+    """
+
+    exit_relay = self.select(Position.EXIT)
+    guard_relay = self.select(Position.GUARD, [exit_relay])
+    middle_relay = self.select(Position.MIDDLE, [exit_relay, guard_relay])
+
+    return (guard_relay, middle_relay, exit_relay)
+
+  def _exclusion_check(self, exclude):
+    """
+    Provides a function that checks if a relay conflicts with any of the given
+    relays.
+    """
+
+    if not exclude:
+      return lambda relay: False
+
+    fingerprints, subnets = set(), set()
+
+    for excluded in exclude:
+      fingerprints.add(excluded.fingerprint)
+
+      if self.distinct_subnets:
+        subnets.add(_subnet(excluded.address))
+
+      for member in self._families.get(excluded.fingerprint, ()):
+        if excluded.fingerprint in self._families.get(member, ()):
+          fingerprints.add(member)
+
+    if subnets:
+      return lambda relay: relay.fingerprint in fingerprints or _subnet(relay.address) in subnets
+    else:
+      return lambda relay: relay.fingerprint in fingerprints
+
+
+def _is_eligible_for(position):
+  """
+  Provides a function that checks if a relay can be selected for a position.
+  """
+
+  if position == Position.GUARD:
+    required, disallowed = (Flag.RUNNING, Flag.VALID, Flag.GUARD), ()
+  elif position == Position.EXIT:
+    required, disallowed = (Flag.RUNNING, Flag.VALID, Flag.EXIT), (Flag.BADEXIT,)
+  else:
+    required, disallowed = (Flag.RUNNING, Flag.VALID), ()
+
+  def _is_eligible(relay):
+    flags = relay.flags
+    return all(flag in flags for flag in required) and not any(flag in flags for flag in disallowed)
+
+  return _is_eligible
+
+
+def _relay_type(relay):
+  """
+  Provides the kind of relay the bandwidth-weights refer to it as.
+  """
+
+  is_guard, is_exit = Flag.GUARD in relay.flags, Flag.EXIT in relay.flags and Flag.BADEXIT not in relay.flags
+
+  if is_guard and is_exit:
+    return 'd'
+  elif is_guard:
+    return 'g'
+  elif is_exit:
+    return 'e'
+  else:
+    return 'm'
+
+
+def _subnet(address):
+  """
+  Provides the /16 an IPv4 address belongs to.
+  """
+
+  return tuple(address.split('.')[:2]) if address else None
+
+
+def _normalize_fingerprint(fingerprint):
+  """
+  Fingerprints in families can be prefixed with a '$', and might be
+  lowercase.
+  """
+
+  return fingerprint.lstrip('$').upper()
@@ -17,6 +17,14 @@ sources...
     |- RouterStatusEntryV2 - Entry for a network status v2 document
     |- RouterStatusEntryV3 - Entry for a network status v3 document
     +- RouterStatusEntryMicroV3 - Entry for a microdescriptor flavored v3 document
+
+  flag_mask - bitmask for a set of flags
+  filter_by_flags - router status entries with or without the given flags
+
+.. data:: FLAG_BITS (dict)
+
+  Bit used for each of the :data:`~stem.Flag` in a router status entry's
+  **flag_mask**. Flags we don't recognize aren't included in the mask.
 """
 
 import base64
@@ -27,14 +35,92 @@ import stem.prereq
 import stem.util.str_tools
 
 from stem.descriptor import (
-  KEYWORD_LINE,
   Descriptor,
   _value,
   _values,
+  _intern_value,
   _get_descriptor_components,
-  _read_until_keywords,
+  _entry_spans,
+  _find_keyword_line,
 )
 
+# Most relays share the same handful of flags, so rather than giving every
+# router status entry its own copy of these strings we reuse ours.
+
+FLAG_STRINGS = dict((flag, flag) for flag in stem.Flag)
+
+FLAG_BITS = dict((flag, 1 << index) for (index, flag) in enumerate(stem.Flag))
+
+
+def flag_mask(flags):
+  """
+  Provides the bitmask for a set of flags, which can be compared with the
+  **flag_mask** of router status entries.
+
+  :param list flags: flags to provide the mask for
+
+  :returns: **int** bitmask of the flags, this excludes flags that aren't in
+    :data:`~stem.descriptor.router_status_entry.FLAG_BITS`
+  """
+
+  mask = 0
+
+  for flag in flags:
+    mask |= FLAG_BITS.get(flag, 0)
+
+  return mask
+
+
+def filter_by_flags(entries, flags = (), any_flags = (), exclude_flags = ()):
+  """
+  Provides the router status entries that have all of the given flags, at
+  least one of the any_flags, and none of the exclude_flags. Flags are checked
+  with each entry's **flag_mask** rather than its list of flags, except for
+  flags we don't recognize.
+
+  ::
+
+    fast_exits = filter_by_flags(consensus.routers.values(), ['Exit', 'Fast'], exclude_flags = ['BadExit'])
+
+  :param list entries: router status entries to filter
+  :param list flags: flags entries must have
+  :param list any_flags: flags entries must have at least one of
+  :param list exclude_flags: flags entries must not have
+
+  :returns: **list** of the router status entries that match
+  """
+
+  mask, any_mask, exclude_mask = flag_mask(flags), flag_mask(any_flags), flag_mask(exclude_flags)
+  matches = []
+
+  for entry in entries:
+    entry_mask = entry.flag_mask
+
+    if entry_mask & mask != mask or entry_mask & exclude_mask:
+      continue
+    elif any_flags and not entry_mask & any_mask and not _has_unknown_flag(entry, any_flags):
+      continue
+
+    matches.append(entry)
+
+  # flags we don't have bits for are checked against each entry's list
+
+  unknown_flags = [flag for flag in flags if flag not in FLAG_BITS]
+  unknown_exclude_flags = [flag for flag in exclude_flags if flag not in FLAG_BITS]
+
+  if unknown_flags or unknown_exclude_flags:
+    matches = [entry for entry in matches if all(flag in (entry.flags or ()) for flag in unknown_flags) and not _has_unknown_flag(entry, unknown_exclude_flags)]
+
+  return matches
+
+
+def _has_unknown_flag(entry, flags):
+  """
+  Checks if the entry has any of the given flags that lack a bit in its mask.
+  """
+
+  return any(flag in (entry.flags or ()) for flag in flags if flag not in FLAG_BITS)
+
 
 def _parse_file(document_file, validate, entry_class, entry_keyword = 'r', start_position = None, end_position = None, section_end_keywords = (), extra_args = ()):
   """
@@ -69,38 +155,20 @@ def _parse_file(document_file, validate, entry_class, entry_keyword = 'r', start
   else:
     start_position = document_file.tell()
 
-  # check if we're starting at the end of the section (ie, there's no entries to read)
-  if section_end_keywords:
-    first_keyword = None
-    line_match = KEYWORD_LINE.match(stem.util.str_tools._to_unicode(document_file.readline()))
-
-    if line_match:
-      first_keyword = line_match.groups()[0]
-
-    document_file.seek(start_position)
-
-    if first_keyword in section_end_keywords:
-      return
+  if end_position is None:
+    content = document_file.read()
+  else:
+    content = document_file.read(max(0, end_position - start_position))
 
-  while end_position is None or document_file.tell() < end_position:
-    desc_lines, ending_keyword = _read_until_keywords(
-      (entry_keyword,) + section_end_keywords,
-      document_file,
-      ignore_first = True,
-      end_position = end_position,
-      include_ending_keyword = True
-    )
+  section_end = _find_keyword_line(content, section_end_keywords) if section_end_keywords else -1
 
-    desc_content = bytes.join(b'', desc_lines)
+  if section_end == -1:
+    section_end = len(content)
 
-    if desc_content:
-      yield entry_class(desc_content, validate, *extra_args)
+  document_file.seek(start_position + section_end)
 
-      # check if we stopped at the end of the section
-      if ending_keyword in section_end_keywords:
-        break
-    else:
-      break
+  for entry_start, entry_end in _entry_spans(content, (entry_keyword,), 0, section_end):
+    yield entry_class(content[entry_start:entry_end], validate, *extra_args)
 
 
 def _parse_r_line(descriptor, entries):
@@ -188,8 +256,9 @@ def _parse_s_line(descriptor, entries):
   # example: s Named Running Stable Valid
 
   value = _value('s', entries)
-  flags = [] if value == '' else value.split(' ')
+  flags = [] if value == '' else [FLAG_STRINGS.get(flag) or _intern_value(flag) for flag in value.split(' ')]
   descriptor.flags = flags
+  descriptor.flag_mask = flag_mask(flags)
 
   for flag in flags:
     if flags.count(flag) > 1:
@@ -206,7 +275,7 @@ def _parse_v_line(descriptor, entries):
   # tor version. If not then it has "upgraded to a more sophisticated
   # protocol versioning system".
 
-  value = _value('v', entries)
+  value = _intern_value(_value('v', entries))
   descriptor.version_line = value
 
   if value.startswith('Tor '):
@@ -261,7 +330,7 @@ def _parse_p_line(descriptor, entries):
   value = _value('p', entries)
 
   try:
-    descriptor.exit_policy = stem.exit_policy.MicroExitPolicy(value)
+    descriptor.exit_policy = stem.exit_policy.get_shared_micro_policy(value)
   except ValueError as exc:
     raise ValueError('%s exit policy is malformed (%s): p %s' % (descriptor._name(), exc, value))
 
@@ -360,6 +429,8 @@ class RouterStatusEntry(Descriptor):
   :var int dir_port: **\*** router's DirPort
 
   :var list flags: **\*** list of :data:`~stem.Flag` associated with the relay
+  :var int flag_mask: **\*** bitmask of the relay's flags, see
+    :data:`~stem.descriptor.router_status_entry.FLAG_BITS`
 
   :var stem.version.Version version: parsed version of tor, this is **None** if
     the relay's using a new versioning scheme
@@ -375,6 +446,7 @@ class RouterStatusEntry(Descriptor):
     'dir_port': (None, _parse_r_line),
 
     'flags': (None, _parse_s_line),
+    'flag_mask': (0, _parse_s_line),
 
     'version_line': (None, _parse_v_line),
     'version': (None, _parse_v_line),
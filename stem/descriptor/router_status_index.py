@@ -0,0 +1,329 @@
+# Copyright 2015, Damian Johnson and The Tor Project
+# See LICENSE for licensing information
+
+"""
+Random access to the router status entries of a v3 network status document.
+Reading a consensus through :func:`~stem.descriptor.__init__.parse_file`
+constructs every router status entry, which is wasteful if you only want a
+few relays. This instead scans the document once for where each relay's
+entry resides, and saves those offsets alongside the document so later runs
+can skip the scan too. Lookups then only read and parse the entry they're
+asking for...
+
+::
+
+  from stem.descriptor.router_status_index import RouterStatusIndex
+
+  index = RouterStatusIndex('/tmp/consensuses-2014-12/01/2014-12-01-00-00-00-consensus')
+
+  router = index.get('9695DFC35FFEB861329B9F1AB04C46397020CE31')
+
+  if router:
+    print '%s has the flags: %s' % (router.nickname, ', '.join(router.flags))
+
+By default the offsets are saved to the document's path with a '.index'
+suffix. If the document's size or modification time changes (for instance,
+tor replacing its cached-consensus) then we scan it again. We can still be
+used if the index can't be saved (for instance, if the directory isn't
+writable), in which case we simply scan the document each time we're
+constructed.
+
+**Module Overview:**
+
+::
+
+  RouterStatusIndex - Offsets of the router status entries in a document
+    |- get - provides the router status entry of a relay
+    |- get_document - network status document without its router status entries
+    |- fingerprints - fingerprints of the relays in the document
+    |- __contains__ - checks if a relay is in the document
+    +- __len__ - number of relays in the document
+
+.. data:: INDEX_SUFFIX (str)
+
+  Suffix of the file we save a document's offsets to by default.
+"""
+
+import os
+import threading
+
+import stem.descriptor.networkstatus
+import stem.util.str_tools
+
+from stem.descriptor import (
+  _entry_spans,
+  _line_end,
+)
+
+from stem.descriptor.router_status_entry import (
+  RouterStatusEntryV3,
+  RouterStatusEntryMicroV3,
+)
+
+from stem.descriptor.router_status_table import _base64_to_hex
+
+INDEX_SUFFIX = '.index'
+INDEX_HEADER = 'stem-router-status-index 1'
+
+
+class RouterStatusIndex(object):
+  """
+  Offsets of the router status entries within a v3 network status document,
+  keyed on their fingerprint. This is thread safe.
+
+  :var str path: location of the network status document
+  :var str index_path: location our offsets are saved to, **None** if they
+    aren't being saved
+  :var bool validate: checks the validity of entries we provide if **True**
+  """
+
+  def __init__(self, path, validate = False, index_path = None, save = True):
+    """
+    Reads the offsets we've previously saved for a document, scanning it if
+    they're missing or stale.
+
+    :param str path: location of a v3 network status document
+    :param bool validate: checks the validity of the document and entries we
+      provide if **True**, skips these checks otherwise
+    :param str index_path: location to save our offsets to, the document's path
+      with an '.index' suffix if **None**
+    :param bool save: saves the offsets we scan for if **True**
+
+    :raises:
+      * **ValueError** if validate is **True** and the document is malformed
+      * **IOError** if the document can't be read
+    """
+
+    self.path = path
+    self.index_path = (index_path if index_path else path + INDEX_SUFFIX) if save else None
+    self.validate = validate
+
+    self._lock = threading.RLock()
+
+    # (header_start, routers_start, routers_end, content_end) offsets of the
+    # document's sections, and 'fingerprint => (start, end)' for its entries
+
+    self._file_identity = None
+    self._sections = None
+    self._offsets = {}
+    self._document = None
+
+    with open(path, 'rb') as document_file:
+      self._refresh(document_file)
+
+  def get(self, fingerprint, default = None):
+    """
+    Provides the router status entry of a relay, reading it from the document.
+
+    :param str fingerprint: fingerprint of the relay
+    :param object default: response if the relay isn't in the document
+
+    :returns: :class:`~stem.descriptor.router_status_entry.RouterStatusEntryV3`
+      or :class:`~stem.descriptor.router_status_entry.RouterStatusEntryMicroV3`
+      for the relay, or the default if it isn't in the document
+
+    :raises:
+      * **ValueError** if validate is **True** and the entry is malformed
+      * **IOError** if the document can't be read
+    """
+
+    fingerprint = fingerprint.upper()
+
+    with open(self.path, 'rb') as document_file:
+      with self._lock:
+        self._refresh(document_file)
+        span = self._offsets.get(fingerprint)
+
+        if span is None:
+          return default
+
+        document = self._get_document(document_file)
+
+      content = _read(document_file, span[0], span[1])
+
+    router_type = RouterStatusEntryMicroV3 if document.is_microdescriptor else RouterStatusEntryV3
+    return router_type(content, self.validate, document)
+
+  def get_document(self):
+    """
+    Provides the network status document without its router status entries,
+    which is what the entries we provide refer to. This is only read once for
+    each version of the document.
+
+    :returns: :class:`~stem.descriptor.networkstatus.NetworkStatusDocumentV3`
+      without any routers
+
+    :raises:
+      * **ValueError** if validate is **True** and the document is malformed
+      * **IOError** if the document can't be read
+    """
+
+    with open(self.path, 'rb') as document_file:
+      with self._lock:
+        self._refresh(document_file)
+        return self._get_document(document_file)
+
+  def fingerprints(self):
+    """
+    Provides the fingerprints of the relays in the document.
+
+    :returns: **list** of relay fingerprints, in the order they appear in the document
+
+    :raises: **IOError** if the document can't be read
+    """
+
+    with self._lock:
+      self._check_document()
+      return [fingerprint for (fingerprint, _) in sorted(self._offsets.items(), key = lambda entry: entry[1])]
+
+  def _check_document(self):
+    """
+    Refreshes our offsets if the document has changed.
+    """
+
+    with open(self.path, 'rb') as document_file:
+      self._refresh(document_file)
+
+  def _refresh(self, document_file):
+    """
+    Loads or scans for our offsets if we don't have them for this version of
+    the document. Anything we read comes from this file so it matches the
+    version we checked, even if the document at our path is replaced.
+
+    :param file document_file: opened document
+    """
+
+    stat = os.fstat(document_file.fileno())
+    file_identity = '%i %r' % (stat.st_size, stat.st_mtime)
+
+    with self._lock:
+      if file_identity == self._file_identity:
+        return
+
+      self._file_identity = file_identity
+      self._document = None
+
+      if not (self.index_path and self._load_index()):
+        self._scan(document_file)
+
+        if self.index_path:
+          self._save_index()
+
+  def _get_document(self, document_file):
+    """
+    Provides our document, reading it from the given file if we haven't yet.
+    This should be the file our offsets were last refreshed with.
+
+    :param file document_file: opened document
+    """
+
+    with self._lock:
+      if self._document is None:
+        header_start, routers_start, routers_end, content_end = self._sections
+        document_content = _read(document_file, header_start, routers_start) + _read(document_file, routers_end, content_end)
+
+        self._document = stem.descriptor.networkstatus.NetworkStatusDocumentV3(document_content, self.validate)
+        self._document._set_path(os.path.abspath(self.path))
+
+      return self._document
+
+  def _scan(self, document_file):
+    """
+    Reads the document for the offsets of its router status entries.
+
+    :param file document_file: opened document
+    """
+
+    document_file.seek(0)
+    content = document_file.read()
+
+    header_start, routers_start, routers_end = stem.descriptor.networkstatus._document_sections(content)
+    self._sections = (header_start, routers_start, routers_end, len(content))
+    self._offsets = {}
+
+    for entry_start, entry_end in _entry_spans(content, (stem.descriptor.networkstatus.ROUTERS_START,), routers_start, routers_end):
+      r_line = content[entry_start:_line_end(content, entry_start)]
+
+      try:
+        fingerprint = _base64_to_hex(stem.util.str_tools._to_unicode(r_line.split()[2]))
+      except (IndexError, ValueError):
+        if self.validate:
+          raise ValueError('Router status entry has a malformed r line: %s' % stem.util.str_tools._to_unicode(r_line.strip()))
+
+        continue
+
+      if fingerprint not in self._offsets:
+        self._offsets[fingerprint] = (entry_start, entry_end)
+
+    if self.validate:
+      self._get_document(document_file)
+
+  def _load_index(self):
+    """
+    Reads the offsets we've saved for this document.
+
+    :returns: **True** if we loaded our offsets, **False** if they're missing,
+      malformed, or for a different version of the document
+    """
+
+    try:
+      with open(self.index_path) as index_file:
+        lines = index_file.read().splitlines()
+
+      if len(lines) < 3 or lines[0] != INDEX_HEADER or lines[1] != self._file_identity:
+        return False
+
+      sections = tuple(map(int, lines[2].split()))
+      offsets = {}
+
+      for line in lines[3:]:
+        fingerprint, start, end = line.split()
+        offsets[fingerprint] = (int(start), int(end))
+    except (IOError, OSError, ValueError):
+      return False
+
+    if len(sections) != 4:
+      return False
+
+    self._sections, self._offsets = sections, offsets
+    return True
+
+  def _save_index(self):
+    """
+    Saves our offsets alongside the document. This is best effort, failing
+    silently if we're unable to write the file.
+    """
+
+    lines = [INDEX_HEADER, self._file_identity, ' '.join(map(str, self._sections))]
+
+    for fingerprint, (start, end) in self._offsets.items():
+      lines.append('%s %i %i' % (fingerprint, start, end))
+
+    temp_path = '%s.tmp' % self.index_path
+
+    try:
+      with open(temp_path, 'w') as index_file:
+        index_file.write('\n'.join(lines) + '\n')
+
+      os.rename(temp_path, self.index_path)
+    except (IOError, OSError):
+      pass
+
+  def __contains__(self, fingerprint):
+    with self._lock:
+      self._check_document()
+      return fingerprint.upper() in self._offsets
+
+  def __len__(self):
+    with self._lock:
+      self._check_document()
+      return len(self._offsets)
+
+
+def _read(document_file, start, end):
+  """
+  Reads a section of a file.
+  """
+
+  document_file.seek(start)
+  return document_file.read(end - start)
@@ -0,0 +1,600 @@
+# Copyright 2015, Damian Johnson and The Tor Project
+# See LICENSE for licensing information
+
+"""
+Columnar representation for the router status entries of a network status
+document. Rather than constructing a
+:class:`~stem.descriptor.router_status_entry.RouterStatusEntry` for each relay
+this keeps their attributes in parallel arrays. This is both far quicker to
+read and far smaller, which is handy when processing a large number of
+consensuses such as the archives from CollecTor...
+
+::
+
+  from stem.descriptor import DocumentHandler, parse_file
+
+  for table in parse_file('/tmp/consensuses-2014-12.tar', document_handler = DocumentHandler.COLUMNAR):
+    guard_bandwidth = table.bandwidth_total(flags = ['Guard'])
+    fast_exits = table.matches(flags = ['Exit', 'Fast'])
+
+    print '%s: %i guard bandwidth, %i fast exits' % (table.document.valid_after, guard_bandwidth, len(fast_exits))
+
+Tables can also be made from a document that has been fully read through its
+:func:`~stem.descriptor.networkstatus.NetworkStatusDocumentV3.to_table` method.
+
+**Module Overview:**
+
+::
+
+  RouterStatusTable - Router status entries in parallel columns.
+    |- get_path - location of the document on disk if it came from a file
+    |- get_archive_path - location of the document within the archive it came from
+    |- flag_mask - bitmask for a set of flags
+    |- get_flags - flags of a relay in the table
+    |- matches - indices of relays with or without the given flags
+    |- bandwidth_total - sum of the bandwidth for relays with the given flags
+    |- get_row - attributes of a relay in the table
+    +- __len__ - number of relays in the table
+
+  DigestColumn - Fingerprints or digests kept as raw bytes.
+    |- get_bytes - raw bytes of a fingerprint or digest
+    |- index - position of a fingerprint or digest in the column
+    |- __getitem__ - hex fingerprint or digest
+    +- __len__ - number of values in the column
+
+.. data:: FLAG_BITS (dict)
+
+  Bit used for each of the :data:`~stem.Flag` in a table's **flags** column.
+  Flags that aren't in :data:`~stem.Flag` are assigned bits as they're
+  encountered, so check the table's **flag_bits** for those.
+"""
+
+import array
+import binascii
+import calendar
+import re
+import sys
+
+import stem
+import stem.prereq
+import stem.util.connection
+import stem.util.str_tools
+import stem.util.tor_tools
+
+from stem.descriptor.router_status_entry import FLAG_STRINGS, FLAG_BITS
+
+# Our flags column is an array of unsigned longs, which is only guaranteed to
+# be at least 32 bits.
+
+MAX_FLAGS = 32
+
+# Fingerprints and digests are base64 encoded sha1 digests without padding.
+
+BASE64_DIGEST = re.compile('^[A-Za-z0-9+/]{27}=?$')
+
+if stem.prereq.is_python_3():
+  _intern = sys.intern
+else:
+  _intern = lambda value: value
+
+COLUMNS = (
+  'nickname',
+  'fingerprint',
+  'digest',
+  'published',
+  'address',
+  'or_port',
+  'dir_port',
+  'flags',
+  'version_line',
+  'bandwidth',
+  'measured',
+)
+
+
+class RouterStatusTable(object):
+  """
+  Router status entries of a network status document, kept in parallel
+  columns. Each column has a value for every relay, so for instance the
+  relay at index five has the nickname **table.nickname[5]** and
+  **table.address[5]** as its address.
+
+  Columns of numeric values use zero rather than **None** for values that are
+  absent, and unlike a
+  :class:`~stem.descriptor.router_status_entry.RouterStatusEntry` these are in
+  the forms that make them cheap to store and compare...
+
+  :var stem.descriptor.networkstatus.NetworkStatusDocument document: document
+    these entries came from
+  :var list nickname: relay nicknames
+  :var DigestColumn fingerprint: relay fingerprints
+  :var DigestColumn digest: digests of the relays' server descriptors, this
+    is a list of **None** for microdescriptor flavored documents
+  :var array published: unix timestamps for when the relays' descriptors were
+    published
+  :var array address: relay IPv4 addresses as integers
+  :var array or_port: relay ORPorts
+  :var array dir_port: relay DirPorts, zero if they don't have one
+  :var array flags: bitmasks of the relays' flags, see **flag_bits**
+  :var list version_line: relays' tor versions as reported on their 'v' line
+  :var array bandwidth: bandwidth weights of the relays, zero if absent
+  :var array measured: bandwidth measurements of the relays, zero if absent
+  :var dict flag_bits: mapping of flags to the bit they use in our **flags**
+  """
+
+  def __init__(self, content, validate = False, document = None, is_microdescriptor = False):
+    """
+    Reads the router status entries from a network status document.
+
+    :param bytes content: router status entry section of the document
+    :param bool validate: checks the validity of the content if **True**,
+      skips malformed entries otherwise
+    :param stem.descriptor.networkstatus.NetworkStatusDocument document:
+      document these entries came from
+    :param bool is_microdescriptor: **True** if these are from a
+      microdescriptor flavored document, **False** otherwise
+
+    :raises: **ValueError** if the content is malformed and validate is **True**
+    """
+
+    self.document = document
+    self.flag_bits = dict(FLAG_BITS)
+
+    self._path = None
+    self._archive_path = None
+
+    self.nickname = []
+    self.fingerprint = DigestColumn()
+    self.digest = DigestColumn()
+    self.published = array.array('L')
+    self.address = array.array('I')
+    self.or_port = array.array('H')
+    self.dir_port = array.array('H')
+    self.flags = array.array('L')
+    self.version_line = []
+    self.bandwidth = array.array('L')
+    self.measured = array.array('L')
+
+    self._parse(content, validate, is_microdescriptor)
+
+  def get_path(self):
+    """
+    Provides the absolute path that we loaded this table from.
+
+    :returns: **str** with the absolute path of the table's source
+    """
+
+    return self._path
+
+  def get_archive_path(self):
+    """
+    If this table came from an archive then provides its path within the
+    archive.
+
+    :returns: **str** with the table's path within the archive
+    """
+
+    return self._archive_path
+
+  def flag_mask(self, flags):
+    """
+    Provides the bitmask for a set of flags.
+
+    :param list flags: flags to provide the mask for
+
+    :returns: **int** bitmask of the flags, or **None** if one of them isn't
+      in our **flag_bits** (so no relay in this table has it)
+    """
+
+    mask = 0
+
+    for flag in flags:
+      if flag not in self.flag_bits:
+        return None
+
+      mask |= self.flag_bits[flag]
+
+    return mask
+
+  def get_flags(self, index):
+    """
+    Provides the flags of a relay.
+
+    :param int index: relay to provide the flags of
+
+    :returns: **list** of the relay's flags
+    """
+
+    flags = self.flags[index]
+    return [flag for (flag, bit) in sorted(self.flag_bits.items(), key = lambda entry: entry[1]) if flags & bit]
+
+  def matches(self, flags = (), exclude_flags = ()):
+    """
+    Provides the relays that have all of the given flags and none of the
+    excluded ones.
+
+    :param list flags: flags relays must have
+    :param list exclude_flags: flags relays must not have
+
+    :returns: **list** with the indices of matching relays
+    """
+
+    mask, exclude_mask = self._masks(flags, exclude_flags)
+
+    if mask is None:
+      return []
+
+    return [index for (index, relay_flags) in enumerate(self.flags) if relay_flags & mask == mask and not relay_flags & exclude_mask]
+
+  def bandwidth_total(self, flags = (), exclude_flags = (), measured = False):
+    """
+    Sums the bandwidth of relays that have all of the given flags and none of
+    the excluded ones.
+
+    :param list flags: flags relays must have
+    :param list exclude_flags: flags relays must not have
+    :param bool measured: sums the relays' measured bandwidth rather than
+      their bandwidth weights if **True**
+
+    :returns: **int** with the total bandwidth of matching relays
+    """
+
+    mask, exclude_mask = self._masks(flags, exclude_flags)
+    column = self.measured if measured else self.bandwidth
+
+    if mask is None:
+      return 0
+    elif mask == 0 and exclude_mask == 0:
+      return sum(column)
+
+    return sum([bandwidth for (bandwidth, relay_flags) in zip(column, self.flags) if relay_flags & mask == mask and not relay_flags & exclude_mask])
+
+  def get_row(self, index):
+    """
+    Provides the attributes of a relay.
+
+    :param int index: relay to provide the attributes of
+
+    :returns: **dict** mapping column names to the relay's values
+    """
+
+    row = dict((column, getattr(self, column)[index]) for column in COLUMNS)
+    row['flags'] = self.get_flags(index)
+
+    return row
+
+  def _set_path(self, path):
+    self._path = path
+
+  def _set_archive_path(self, path):
+    self._archive_path = path
+
+  def _compact(self):
+    pass  # columns are already compact
+
+  def _masks(self, flags, exclude_flags):
+    mask = self.flag_mask(flags)
+    exclude_mask = 0
+
+    for flag in exclude_flags:
+      exclude_mask |= self.flag_bits.get(flag, 0)
+
+    return mask, exclude_mask
+
+  def _parse(self, content, validate, is_microdescriptor):
+    if isinstance(content, bytes):
+      content = content.decode('utf-8', 'replace')
+
+    field_count = 8 if is_microdescriptor else 9
+    in_entry = False  # skipping lines until our next valid 'r' line if False
+
+    # base64 fingerprints and digests, which are decoded together when we're
+    # done rather than for each entry
+
+    identities, digests = [], []
+
+    for line in content.split('\n'):
+      if line.startswith('opt '):
+        line = line[4:]
+
+      if line.startswith('r '):
+        in_entry = False
+        r_comp = line.split(' ')
+
+        try:
+          if len(r_comp) < field_count:
+            raise ValueError("'r' line must have %i values" % (field_count - 1))
+
+          if is_microdescriptor:
+            nickname, identity, published_date, published_time, address, or_port, dir_port = r_comp[1:8]
+            digest = None
+          else:
+            nickname, identity, digest, published_date, published_time, address, or_port, dir_port = r_comp[1:9]
+
+            if not BASE64_DIGEST.match(digest):
+              raise ValueError("digest isn't a valid base64 encoded sha1 digest: %s" % digest)
+
+          if not BASE64_DIGEST.match(identity):
+            raise ValueError("fingerprint isn't a valid base64 encoded sha1 digest: %s" % identity)
+
+          if validate:
+            if not stem.util.tor_tools.is_valid_nickname(nickname):
+              raise ValueError("nickname isn't valid: %s" % nickname)
+            elif not stem.util.connection.is_valid_ipv4_address(address):
+              raise ValueError("address isn't a valid IPv4 address: %s" % address)
+            elif not stem.util.connection.is_valid_port(or_port):
+              raise ValueError('ORPort is invalid: %s' % or_port)
+            elif not stem.util.connection.is_valid_port(dir_port, allow_zero = True):
+              raise ValueError('DirPort is invalid: %s' % dir_port)
+
+          row = (
+            _intern(nickname),
+            identity,
+            digest,
+            _to_timestamp(published_date, published_time),
+            _address_to_int(address),
+            int(or_port),
+            int(dir_port),
+          )
+
+          # numeric columns are fixed size, so check that the values fit
+          # before adding the row
+
+          for column, value in ((self.published, row[3]), (self.address, row[4]), (self.or_port, row[5]), (self.dir_port, row[6])):
+            if not 0 <= value < (1 << (8 * column.itemsize)):
+              raise ValueError('%i is out of range' % value)
+        except (ValueError, OverflowError) as exc:
+          if validate:
+            raise ValueError('Router status entry is malformed (%s): %s' % (exc, line))
+
+          continue
+
+        self.nickname.append(row[0])
+        identities.append(row[1])
+        digests.append(row[2])
+        self.published.append(row[3])
+        self.address.append(row[4])
+        self.or_port.append(row[5])
+        self.dir_port.append(row[6])
+        self.flags.append(0)
+        self.version_line.append(None)
+        self.bandwidth.append(0)
+        self.measured.append(0)
+
+        in_entry = True
+      elif not in_entry:
+        continue
+      elif line.startswith('s '):
+        self.flags[-1] = self._flags_mask(line[2:].split(' '), validate)
+      elif line.startswith('v '):
+        self.version_line[-1] = _intern(line[2:])
+      elif line.startswith('w '):
+        for w_entry in line[2:].split(' '):
+          if '=' not in w_entry:
+            continue
+
+          w_key, w_value = w_entry.split('=', 1)
+
+          if w_key not in ('Bandwidth', 'Measured'):
+            continue
+          elif not w_value.isdigit() or int(w_value) >= (1 << (8 * self.bandwidth.itemsize)):
+            if validate:
+              raise ValueError("Router status entry's '%s=' value needs to be a numeric value we can store: %s" % (w_key, line))
+
+            continue
+
+          if w_key == 'Bandwidth':
+            self.bandwidth[-1] = int(w_value)
+          else:
+            self.measured[-1] = int(w_value)
+
+    self.fingerprint = DigestColumn(_decode_digests(identities))
+    self.digest = [None] * len(digests) if is_microdescriptor else DigestColumn(_decode_digests(digests))
+
+  def _flags_mask(self, flags, validate = True):
+    """
+    Provides the bitmask for a set of flags, assigning bits to new ones. We
+    only have bits for MAX_FLAGS, so if there's more than that then we raise a
+    ValueError when validating and skip those flags otherwise.
+    """
+
+    mask = 0
+
+    for flag in flags:
+      bit = self.flag_bits.get(flag)
+
+      if bit is None:
+        if not flag:
+          continue
+        elif len(self.flag_bits) >= MAX_FLAGS:
+          if validate:
+            raise ValueError('Router status tables can only have up to %i flags' % MAX_FLAGS)
+
+          continue
+
+        bit = 1 << len(self.flag_bits)
+        self.flag_bits[FLAG_STRINGS.get(flag, flag)] = bit
+
+      mask |= bit
+
+    return mask
+
+  def __len__(self):
+    return len(self.nickname)
+
+
+class DigestColumn(object):
+  """
+  Column of sha1 fingerprints or digests. These are kept together as raw
+  bytes, twenty per value, and only converted to hex when they're accessed.
+  This makes them far smaller than a list of hex strings, and lets them be
+  joined with other descriptors without making a string for every relay...
+
+  ::
+
+    fingerprint = binascii.a2b_hex(server_descriptor.fingerprint)
+
+    if fingerprint in table.fingerprint:
+      index = table.fingerprint.index(fingerprint)
+      print '%s has the flags: %s' % (table.nickname[index], ', '.join(table.get_flags(index)))
+  """
+
+  def __init__(self, digests = b''):
+    """
+    :param bytes digests: concatenated twenty byte digests
+
+    :raises: **ValueError** if the content isn't a series of twenty byte values
+    """
+
+    if len(digests) % 20 != 0:
+      raise ValueError('Digests must be twenty bytes each, but we had %i bytes' % len(digests))
+
+    self._digests = digests
+    self._indices = None  # lazily built mapping of raw digests to their index
+
+  def get_bytes(self, index):
+    """
+    Provides the raw bytes of a value.
+
+    :param int index: value to provide
+
+    :returns: **bytes** with the twenty byte digest
+
+    :raises: **IndexError** if there isn't a value at this index
+    """
+
+    if index < 0:
+      index += len(self)
+
+    if not 0 <= index < len(self):
+      raise IndexError('column index out of range')
+
+    return self._digests[index * 20:(index + 1) * 20]
+
+  def index(self, digest):
+    """
+    Provides the index of a fingerprint or digest.
+
+    :param str,bytes digest: hex or raw bytes of the value to look for
+
+    :returns: **int** with the first index of the value
+
+    :raises: **ValueError** if the value isn't in this column
+    """
+
+    if self._indices is None:
+      indices = {}
+
+      for index in range(len(self) - 1, -1, -1):
+        indices[self._digests[index * 20:(index + 1) * 20]] = index
+
+      self._indices = indices
+
+    index = self._indices.get(_to_raw_digest(digest))
+
+    if index is None:
+      raise ValueError('%s is not in the column' % digest)
+
+    return index
+
+  def __contains__(self, digest):
+    try:
+      self.index(digest)
+      return True
+    except ValueError:
+      return False
+
+  def __getitem__(self, index):
+    fingerprint = binascii.b2a_hex(self.get_bytes(index)).upper()
+    return fingerprint.decode('ascii') if stem.prereq.is_python_3() else fingerprint
+
+  def __iter__(self):
+    for index in range(len(self)):
+      yield self[index]
+
+  def __len__(self):
+    return len(self._digests) // 20
+
+
+def _decode_digests(values):
+  """
+  Decodes a series of base64 fingerprints or digests, which must have been
+  checked against our BASE64_DIGEST pattern, in a single pass.
+
+  Unpadded these are twenty seven characters with two bits to spare. Appending
+  an 'A' gives us twenty eight, which decode to our twenty bytes and a byte we
+  discard.
+  """
+
+  if not values:
+    return b''
+
+  decoded = binascii.a2b_base64('A'.join([value.rstrip('=') for value in values]) + 'A')
+  return b''.join([decoded[index:index + 20] for index in range(0, len(decoded), 21)])
+
+
+def _to_raw_digest(digest):
+  """
+  Provides the raw bytes of a hex or raw digest.
+  """
+
+  if isinstance(digest, bytes) and len(digest) == 20:
+    return digest
+
+  try:
+    return binascii.a2b_hex(stem.util.str_tools._to_bytes(digest))
+  except (TypeError, binascii.Error):
+    return None
+
+
+def _to_timestamp(date, time):
+  """
+  Converts a 'YYYY-MM-DD HH:MM:SS' timestamp into unix time.
+  """
+
+  if len(date) != 10 or len(time) != 8 or date[4] != '-' or date[7] != '-' or time[2] != ':' or time[5] != ':':
+    raise ValueError("publication time isn't parsable: %s %s" % (date, time))
+
+  return calendar.timegm((int(date[:4]), int(date[5:7]), int(date[8:]), int(time[:2]), int(time[3:5]), int(time[6:]), 0, 0, 0))
+
+
+def _base64_to_hex(value):
+  """
+  Decodes a base64 fingerprint or digest to uppercase hex. This is a leaner
+  version of :func:`~stem.descriptor.router_status_entry._base64_to_hex` since
+  we do this twice for every relay.
+  """
+
+  try:
+    decoded = binascii.a2b_base64(value + '=' * (-len(value) % 4))
+  except (TypeError, binascii.Error):
+    raise ValueError("Unable to decode identity string '%s'" % value)
+
+  if len(decoded) != 20:
+    raise ValueError("Decoded '%s' to %i bytes, which isn't a valid fingerprint" % (value, len(decoded)))
+
+  fingerprint = binascii.b2a_hex(decoded).upper()
+  return fingerprint.decode('ascii') if stem.prereq.is_python_3() else fingerprint
+
+
+def _address_to_int(address):
+  """
+  Converts an IPv4 address into an integer.
+  """
+
+  octets = address.split('.')
+
+  if len(octets) != 4:
+    raise ValueError("address isn't a valid IPv4 address: %s" % address)
+
+  result = 0
+
+  for octet in octets:
+    value = int(octet)
+
+    if not 0 <= value <= 255:
+      raise ValueError("address isn't a valid IPv4 address: %s" % address)
+
+    result = (result << 8) | value
+
+  return result
@@ -32,7 +32,6 @@ etc). This information is provided from a few sources...
 """
 
 import base64
-import codecs
 import functools
 import hashlib
 import re
@@ -49,19 +48,26 @@ from stem import str_type
 from stem.util import log
 
 from stem.descriptor import (
-  PGP_BLOCK_END,
   Descriptor,
   _get_descriptor_components,
-  _read_until_keywords,
+  _SpanReader,
+  _content_span,
+  _signed_spans,
+  _split_lines,
   _value,
   _values,
   _parse_simple_line,
   _parse_bytes_line,
+  _intern_value,
   _parse_timestamp_line,
   _parse_forty_character_hex,
   _parse_key_block,
+  _rsa_public_key,
+  _decrypt_signature,
 )
 
+from stem.descriptor.extrainfo_descriptor import _parse_history_line
+
 try:
   # added in python 3.2
   from functools import lru_cache
@@ -144,33 +150,39 @@ def _parse_file(descriptor_file, is_bridge = False, validate = False, **kwargs):
   # Any annotations after the last server descriptor is ignored (never provided
   # to the caller).
 
-  while True:
-    annotations = _read_until_keywords('router', descriptor_file)
-    descriptor_content = _read_until_keywords('router-signature', descriptor_file)
+  spans = _SpanReader(descriptor_file, _descriptor_spans)
 
-    # we've reached the 'router-signature', now include the pgp style block
-    block_end_prefix = PGP_BLOCK_END.split(' ', 1)[0]
-    descriptor_content += _read_until_keywords(block_end_prefix, descriptor_file, True)
+  for content, annotations_start, descriptor_start, descriptor_end in spans:
+    # strip newlines from annotations
+    annotations = list(map(bytes.strip, _split_lines(content[annotations_start:descriptor_start])))
+    descriptor_text = _content_span(content, descriptor_start, descriptor_end)
 
-    if descriptor_content:
-      if descriptor_content[0].startswith(b'@type'):
-        descriptor_content = descriptor_content[1:]
+    if is_bridge:
+      yield BridgeDescriptor(descriptor_text, validate, annotations, **kwargs)
+    else:
+      yield RelayDescriptor(descriptor_text, validate, annotations, **kwargs)
 
-      # strip newlines from annotations
-      annotations = list(map(bytes.strip, annotations))
+  if validate:
+    orphaned_annotations = list(map(bytes.strip, _split_lines(spans.remainder)))
 
-      descriptor_text = bytes.join(b'', descriptor_content)
+    if orphaned_annotations:
+      orphaned_annotations = stem.util.str_tools._to_unicode(b'\n'.join(orphaned_annotations))
+      raise ValueError('Content conform to being a server descriptor:\n%s' % orphaned_annotations)
 
-      if is_bridge:
-        yield BridgeDescriptor(descriptor_text, validate, annotations, **kwargs)
-      else:
-        yield RelayDescriptor(descriptor_text, validate, annotations, **kwargs)
-    else:
-      if validate and annotations:
-        orphaned_annotations = stem.util.str_tools._to_unicode(b'\n'.join(annotations))
-        raise ValueError('Content conform to being a server descriptor:\n%s' % orphaned_annotations)
 
-      break  # done parsing descriptors
+def _descriptor_spans(content, position = 0):
+  """
+  Splits content into server descriptors, each of which runs from its router
+  line through its signature.
+
+  :param bytes,mmap content: content to be split
+  :param int position: offset to begin at
+
+  :returns: iterator for (start, descriptor_start, descriptor_end) tuples,
+    where the content from start to descriptor_start are its annotations
+  """
+
+  return _signed_spans(content, 'router-signature', 'router', position)
 
 
 def _parse_router_line(descriptor, entries):
@@ -222,7 +234,7 @@ def _parse_bandwidth_line(descriptor, entries):
 def _parse_platform_line(descriptor, entries):
   # "platform" string
 
-  _parse_bytes_line('platform', 'platform')(descriptor, entries)
+  _parse_bytes_line('platform', 'platform', shared = True)(descriptor, entries)
 
   # The platform attribute was set earlier. This line can contain any
   # arbitrary data, but tor seems to report its version followed by the
@@ -237,7 +249,8 @@ def _parse_platform_line(descriptor, entries):
   platform_match = re.match('^(?:node-)?Tor (\S*).* on (.*)$', value)
 
   if platform_match:
-    version_str, descriptor.operating_system = platform_match.groups()
+    version_str, operating_system = platform_match.groups()
+    descriptor.operating_system = _intern_value(operating_system)
 
     try:
       descriptor.tor_version = stem.version._get_version(version_str)
@@ -310,8 +323,8 @@ def _parse_protocols_line(descriptor, entries):
     raise ValueError('Protocols line did not match the expected pattern: protocols %s' % value)
 
   link_versions, circuit_versions = protocols_match.groups()
-  descriptor.link_protocols = link_versions.split(' ')
-  descriptor.circuit_protocols = circuit_versions.split(' ')
+  descriptor.link_protocols = [_intern_value(version) for version in link_versions.split(' ')]
+  descriptor.circuit_protocols = [_intern_value(version) for version in circuit_versions.split(' ')]
 
 
 def _parse_or_address_line(descriptor, entries):
@@ -342,29 +355,12 @@ def _parse_or_address_line(descriptor, entries):
   descriptor.or_addresses = or_addresses
 
 
-def _parse_history_line(keyword, history_end_attribute, history_interval_attribute, history_values_attribute, descriptor, entries):
-  value = _value(keyword, entries)
-  timestamp, interval, remainder = stem.descriptor.extrainfo_descriptor._parse_timestamp_and_interval(keyword, value)
-
-  try:
-    if remainder:
-      history_values = [int(entry) for entry in remainder.split(',')]
-    else:
-      history_values = []
-  except ValueError:
-    raise ValueError('%s line has non-numeric values: %s %s' % (keyword, keyword, value))
-
-  setattr(descriptor, history_end_attribute, timestamp)
-  setattr(descriptor, history_interval_attribute, interval)
-  setattr(descriptor, history_values_attribute, history_values)
-
-
 def _parse_exit_policy(descriptor, entries):
   if hasattr(descriptor, '_unparsed_exit_policy'):
     if descriptor._unparsed_exit_policy == [str_type('reject *:*')]:
       descriptor.exit_policy = REJECT_ALL_POLICY
     else:
-      descriptor.exit_policy = stem.exit_policy.ExitPolicy(*descriptor._unparsed_exit_policy)
+      descriptor.exit_policy = stem.exit_policy.get_shared_policy(*descriptor._unparsed_exit_policy)
 
     del descriptor._unparsed_exit_policy
 
@@ -374,7 +370,7 @@ _parse_published_line = _parse_timestamp_line('published', 'published')
 _parse_extrainfo_digest_line = _parse_forty_character_hex('extra-info-digest', 'extra_info_digest')
 _parse_read_history_line = functools.partial(_parse_history_line, 'read-history', 'read_history_end', 'read_history_interval', 'read_history_values')
 _parse_write_history_line = functools.partial(_parse_history_line, 'write-history', 'write_history_end', 'write_history_interval', 'write_history_values')
-_parse_ipv6_policy_line = lambda descriptor, entries: setattr(descriptor, 'exit_policy_v6', stem.exit_policy.MicroExitPolicy(_value('ipv6-policy', entries)))
+_parse_ipv6_policy_line = lambda descriptor, entries: setattr(descriptor, 'exit_policy_v6', stem.exit_policy.get_shared_micro_policy(_value('ipv6-policy', entries)))
 _parse_allow_single_hop_exits_line = lambda descriptor, entries: setattr(descriptor, 'allow_single_hop_exits', 'allow_single_hop_exits' in entries)
 _parse_caches_extra_info_line = lambda descriptor, entries: setattr(descriptor, 'extra_info_cache', 'extra_info_cache' in entries)
 _parse_family_line = lambda descriptor, entries: setattr(descriptor, 'family', set(_value('family', entries).split(' ')))
@@ -427,11 +423,11 @@ class ServerDescriptor(Descriptor):
 
   :var datetime read_history_end: end of the sampling interval
   :var int read_history_interval: seconds per interval
-  :var list read_history_values: bytes read during each interval
+  :var array read_history_values: bytes read during each interval
 
   :var datetime write_history_end: end of the sampling interval
   :var int write_history_interval: seconds per interval
-  :var list write_history_values: bytes written during each interval
+  :var array write_history_values: bytes written during each interval
 
   **\*** attribute is either required when we're parsed with validation or has
   a default value, others are left as **None** if undefined
@@ -479,6 +475,8 @@ class ServerDescriptor(Descriptor):
     'write_history_values': (None, _parse_write_history_line),
   }
 
+  _OFFSET_KEYWORDS = ('router', 'platform', 'contact', 'router-signature')
+
   PARSER_FOR_LINE = {
     'router': _parse_router_line,
     'bandwidth': _parse_bandwidth_line,
@@ -501,7 +499,7 @@ class ServerDescriptor(Descriptor):
     'eventdns': _parse_eventdns_line,
   }
 
-  def __init__(self, raw_contents, validate = False, annotations = None):
+  def __init__(self, raw_contents, validate = False, annotations = None, fields = None):
     """
     Server descriptor constructor, created from an individual relay's
     descriptor content (as provided by 'GETINFO desc/*', cached descriptors,
@@ -511,12 +509,19 @@ class ServerDescriptor(Descriptor):
     validation can be disables to either improve performance or be accepting of
     malformed data.
 
+    If you only need a few attributes then **fields** can be used to only parse
+    those. Lines for other attributes are skipped, leaving them with their
+    default values. As this is a partial parse we don't check the descriptor's
+    required fields or signature.
+
     :param str raw_contents: descriptor content provided by the relay
     :param bool validate: checks the validity of the descriptor's content if
       **True**, skips these checks otherwise
     :param list annotations: lines that appeared prior to the descriptor
+    :param list fields: attributes to parse, all of them if **None**
 
-    :raises: **ValueError** if the contents is malformed and validate is True
+    :raises: **ValueError** if the contents is malformed and validate is True,
+      or fields includes something that isn't an attribute
     """
 
     super(ServerDescriptor, self).__init__(raw_contents, lazy_load = not validate)
@@ -530,13 +535,16 @@ class ServerDescriptor(Descriptor):
     # influences the resulting exit policy, but for everything else the order
     # does not matter so breaking it into key / value pairs.
 
-    entries, self._unparsed_exit_policy = _get_descriptor_components(stem.util.str_tools._to_unicode(raw_contents), validate, ('accept', 'reject'))
+    keywords = None if fields is None else self._keywords_for(fields)
+    self._offsets = dict.fromkeys(self._OFFSET_KEYWORDS)
+    entries, self._unparsed_exit_policy = _get_descriptor_components(raw_contents, validate, ('accept', 'reject'), keywords, self._offsets)
+
+    if fields is not None and 'exit_policy' not in fields:
+      del self._unparsed_exit_policy
 
     if validate:
       self._parse(entries, validate)
 
-      _parse_exit_policy(self, entries)
-
       # if we have a negative uptime and a tor version that shouldn't exhibit
       # this bug then fail validation
 
@@ -544,10 +552,33 @@ class ServerDescriptor(Descriptor):
         if self.uptime < 0 and self.tor_version >= stem.version.Version('0.1.2.7'):
           raise ValueError("Descriptor for version '%s' had a negative uptime value: %i" % (self.tor_version, self.uptime))
 
-      self._check_constraints(entries)
+      if fields is None:
+        self._check_constraints(entries)
     else:
       self._entries = entries
 
+  def _parse(self, entries, validate, parser_for_line = None):
+    super(ServerDescriptor, self)._parse(entries, validate, parser_for_line)
+
+    # our exit policy isn't amongst our entries since its lines are parsed
+    # together, so applying it here for when we're fully parsed
+
+    try:
+      if stem.descriptor._PROFILER is None:
+        _parse_exit_policy(self, entries)
+      else:
+        stem.descriptor._PROFILER._call(self, _parse_exit_policy, entries)
+    except ValueError:
+      if validate:
+        raise
+
+  @classmethod
+  def _keywords_for_attribute(cls, attribute):
+    if attribute == 'exit_policy':
+      return ['accept', 'reject']  # these are parsed together, not by line
+
+    return super(ServerDescriptor, cls)._keywords_for_attribute(attribute)
+
   def digest(self):
     """
     Provides the hex encoded sha1 of our content. This value is part of the
@@ -667,11 +698,11 @@ class RelayDescriptor(ServerDescriptor):
     'router-signature': _parse_router_signature_line,
   })
 
-  def __init__(self, raw_contents, validate = False, annotations = None):
-    super(RelayDescriptor, self).__init__(raw_contents, validate, annotations)
+  def __init__(self, raw_contents, validate = False, annotations = None, fields = None):
+    super(RelayDescriptor, self).__init__(raw_contents, validate, annotations, fields)
 
     # validate the descriptor if required
-    if validate:
+    if validate and fields is None:
       self._validate_content()
 
   @lru_cache()
@@ -687,6 +718,11 @@ class RelayDescriptor(ServerDescriptor):
     # Digest is calculated from everything in the
     # descriptor except the router-signature.
 
+    for_digest = self._signed_content('router', 'router-signature')
+
+    if for_digest is not None and for_digest[:7] == b'router ':
+      return stem.util.str_tools._to_unicode(hashlib.sha1(for_digest).hexdigest().upper())
+
     raw_descriptor = self.get_bytes()
     start_token = b'router '
     sig_token = b'\nrouter-signature\n'
@@ -729,62 +765,9 @@ class RelayDescriptor(ServerDescriptor):
     if not stem.prereq.is_crypto_available():
       return
 
-    from Crypto.Util import asn1
-    from Crypto.Util.number import bytes_to_long, long_to_bytes
-
-    # get the ASN.1 sequence
-
-    seq = asn1.DerSequence()
-    seq.decode(key_as_der)
-    modulus = seq[0]
-    public_exponent = seq[1]  # should always be 65537
-
+    modulus, public_exponent = _rsa_public_key(key_as_der)
     sig_as_bytes = RelayDescriptor._get_key_bytes(self.signature)
-
-    # convert the descriptor signature to an int
-
-    sig_as_long = bytes_to_long(sig_as_bytes)
-
-    # use the public exponent[e] & the modulus[n] to decrypt the int
-
-    decrypted_int = pow(sig_as_long, public_exponent, modulus)
-
-    # block size will always be 128 for a 1024 bit key
-
-    blocksize = 128
-
-    # convert the int to a byte array.
-
-    decrypted_bytes = long_to_bytes(decrypted_int, blocksize)
-
-    ############################################################################
-    # The decrypted bytes should have a structure exactly along these lines.
-    # 1 byte  - [null '\x00']
-    # 1 byte  - [block type identifier '\x01'] - Should always be 1
-    # N bytes - [padding '\xFF' ]
-    # 1 byte  - [separator '\x00' ]
-    # M bytes - [message]
-    # Total   - 128 bytes
-    # More info here http://www.ietf.org/rfc/rfc2313.txt
-    #                esp the Notes in section 8.1
-    ############################################################################
-
-    try:
-      if decrypted_bytes.index(b'\x00\x01') != 0:
-        raise ValueError('Verification failed, identifier missing')
-    except ValueError:
-      raise ValueError('Verification failed, malformed data')
-
-    try:
-      identifier_offset = 2
-
-      # find the separator
-      seperator_index = decrypted_bytes.index(b'\x00', identifier_offset)
-    except ValueError:
-      raise ValueError('Verification failed, seperator not found')
-
-    digest_hex = codecs.encode(decrypted_bytes[seperator_index + 1:], 'hex_codec')
-    digest = stem.util.str_tools._to_unicode(digest_hex.upper())
+    digest = _decrypt_signature(sig_as_bytes, modulus, public_exponent)
 
     local_digest = self.digest()
 
@@ -16,8 +16,10 @@ import stem.util.tor_tools
 
 from stem.descriptor import (
   Descriptor,
-  _read_until_keywords,
   _get_descriptor_components,
+  _SpanReader,
+  _content_span,
+  _find_keyword_line,
 )
 
 
@@ -33,17 +35,34 @@ def _parse_file(tordnsel_file, validate = False, **kwargs):
     * **IOError** if the file can't be read
   """
 
-  # skip content prior to the first ExitNode
-  _read_until_keywords('ExitNode', tordnsel_file, skip = True)
+  for content, _, entry_start, entry_end in _SpanReader(tordnsel_file, _entry_spans):
+    yield TorDNSEL(_content_span(content, entry_start, entry_end), validate, **kwargs)
 
-  while True:
-    contents = _read_until_keywords('ExitAddress', tordnsel_file)
-    contents += _read_until_keywords('ExitNode', tordnsel_file)
 
-    if contents:
-      yield TorDNSEL(bytes.join(b'', contents), validate, **kwargs)
-    else:
-      break  # done parsing file
+def _entry_spans(content, position = 0):
+  """
+  Splits content into exit list entries. Content prior to the first ExitNode
+  is skipped, and entries run through their ExitAddress lines until the next
+  ExitNode.
+
+  :param bytes,mmap content: content to be split
+  :param int position: offset to begin at
+
+  :returns: iterator for (start, entry_start, entry_end) tuples, where the
+    content from start to entry_start is what we skipped prior to the entry
+  """
+
+  start, position = position, _find_keyword_line(content, ('ExitNode',), position)
+
+  while position != -1 and position < len(content):
+    exit_address = _find_keyword_line(content, ('ExitAddress',), position)
+    entry_end = -1 if exit_address == -1 else _find_keyword_line(content, ('ExitNode',), exit_address)
+
+    if entry_end == -1:
+      entry_end = len(content)
+
+    yield start, position, entry_end
+    start = position = entry_end
 
 
 class TorDNSEL(Descriptor):
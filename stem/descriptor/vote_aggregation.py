@@ -0,0 +1,389 @@
+# Copyright 2015, Damian Johnson and The Tor Project
+# See LICENSE for licensing information
+
+"""
+Computes the router status entries that a set of votes would produce. Each
+hour the directory authorities vote on the state of the network, and their
+votes are combined into the consensus (see section 3.8 of the `dir-spec
+<https://gitweb.torproject.org/torspec.git/tree/dir-spec.txt>`_). This lets
+you try that with votes of your choosing, for instance to see how the
+consensus would change without one of the authorities...
+
+::
+
+  from stem.descriptor import DocumentHandler, parse_file
+  from stem.descriptor.vote_aggregation import aggregate_votes
+
+  votes = [next(parse_file(path, document_handler = DocumentHandler.COLUMNAR)) for path in vote_paths]
+
+  consensus = aggregate_votes(votes)
+  without_first = aggregate_votes(votes[1:], authority_count = len(votes))
+
+  print 'guards: %i => %i' % (len(consensus.matches(['Guard'])), len(without_first.matches(['Guard'])))
+
+The result is a :class:`~stem.descriptor.router_status_table.RouterStatusTable`
+with the consensus' relays, and votes can be provided either as tables or
+as :class:`~stem.descriptor.networkstatus.NetworkStatusDocumentV3`. Tables
+(from the **COLUMNAR** document handler) are far quicker since we use their
+columns directly.
+
+Relays are combined as follows...
+
+* Relays are included if more than half of the authorities list them, and the
+  majority consider them to be running.
+* A relay has a flag if more than half of the votes that list it, and know of
+  that flag, assign it.
+* The relay's descriptor (its nickname, digest, publication time, address,
+  and ports) is what the most votes list, ties going to the most recently
+  published.
+* The relay's version is what the most votes list, ties going to the latest.
+* The relay's bandwidth is the low median of its measurements if enough
+  authorities measure it, and the low median of its claimed bandwidth
+  otherwise.
+
+**Module Overview:**
+
+::
+
+  aggregate_votes - router status entries of the consensus for a set of votes
+  known_flags - flags known to any of a set of votes
+
+.. data:: MIN_MEASURED (int)
+
+  Number of bandwidth measurements a relay needs for us to use them rather
+  than its claimed bandwidth.
+"""
+
+import stem
+import stem.version
+
+from stem.descriptor.networkstatus import NetworkStatusDocumentV3
+from stem.descriptor.router_status_table import DigestColumn, RouterStatusTable
+
+MIN_MEASURED = 3
+
+
+def aggregate_votes(votes, authority_count = None, min_measured = MIN_MEASURED):
+  """
+  Provides the router status entries of the consensus for a set of votes.
+
+  :param list votes: :class:`~stem.descriptor.router_status_table.RouterStatusTable`
+    or :class:`~stem.descriptor.networkstatus.NetworkStatusDocumentV3` votes
+  :param int authority_count: number of authorities that could have voted,
+    the number of votes if **None**
+  :param int min_measured: measurements a relay needs for us to use them as
+    its bandwidth
+
+  :returns: :class:`~stem.descriptor.router_status_table.RouterStatusTable`
+    for the consensus' relays, sorted by fingerprint. Its **measured** column
+    is the median bandwidth measurement for relays with enough measurements,
+    and zero otherwise.
+
+  :raises: **ValueError** if we don't have any votes, or one of them isn't a
+    vote
+  """
+
+  tables = [_to_table(vote) for vote in votes]
+
+  if not tables:
+    raise ValueError('Aggregation requires at least one vote')
+
+  if authority_count is None:
+    authority_count = len(tables)
+
+  consensus_flags = known_flags(tables)
+  consensus = RouterStatusTable(b'')
+  consensus._flags_mask(consensus_flags)
+
+  running_bit = consensus.flag_bits[stem.Flag.RUNNING] if stem.Flag.RUNNING in consensus_flags else 0
+  flag_bits = [consensus.flag_bits[flag] for flag in consensus_flags]
+
+  # Counts for each flag are kept in fields of a single integer, so summing
+  # the votes for a relay counts all of its flags at once. Relays commonly
+  # have the same counts, so we only check each combination once.
+
+  field_size = max(8, len(bin(len(tables))) - 2)  # python 2.6 lacks int.bit_length()
+  known_spreads, assigned_spreads = [], []
+
+  for table in tables:
+    known_mask = consensus.flag_mask(_vote_known_flags(table))
+    known_spread, assigned_spread = _spread_columns(_translate_flags(table, consensus.flag_bits), known_mask, flag_bits, field_size)
+
+    known_spreads.append(known_spread)
+    assigned_spreads.append(assigned_spread)
+
+  flag_majorities = {}
+
+  listings = {}  # fingerprint => [(vote index, row)...] of the votes listing it
+
+  for vote_index, table in enumerate(tables):
+    fingerprints = table.fingerprint._digests
+
+    for row in range(len(table)):
+      listing = (vote_index, row)
+      fingerprint = fingerprints[row * 20:(row + 1) * 20]
+
+      if fingerprint in listings:
+        listings[fingerprint].append(listing)
+      else:
+        listings[fingerprint] = [listing]
+
+  fingerprints, digests = [], []
+
+  for fingerprint in sorted(listings):
+    listed = listings[fingerprint]
+
+    if len(listed) * 2 <= authority_count:
+      continue
+
+    counts = (
+      sum([known_spreads[vote_index] for (vote_index, _) in listed]),
+      sum([assigned_spreads[vote_index][row] for (vote_index, row) in listed]),
+    )
+
+    flags = flag_majorities.get(counts)
+
+    if flags is None:
+      flags = flag_majorities[counts] = _flag_majority(counts[0], counts[1], flag_bits, field_size)
+
+    if running_bit and not flags & running_bit:
+      continue
+
+    nickname, digest, published, address, or_port, dir_port = _descriptor(tables, listed)
+    bandwidth, measured = _bandwidth(tables, listed, min_measured)
+
+    fingerprints.append(fingerprint)
+    digests.append(digest)
+
+    consensus.nickname.append(nickname)
+    consensus.published.append(published)
+    consensus.address.append(address)
+    consensus.or_port.append(or_port)
+    consensus.dir_port.append(dir_port)
+    consensus.flags.append(flags)
+    consensus.version_line.append(_version_line(tables, listed))
+    consensus.bandwidth.append(bandwidth)
+    consensus.measured.append(measured)
+
+  consensus.fingerprint = DigestColumn(b''.join(fingerprints))
+  consensus.digest = DigestColumn(b''.join(digests))
+
+  return consensus
+
+
+def known_flags(votes):
+  """
+  Provides the flags known to any of a set of votes, which are the known-flags
+  of the consensus they produce.
+
+  :param list votes: :class:`~stem.descriptor.router_status_table.RouterStatusTable`
+    or :class:`~stem.descriptor.networkstatus.NetworkStatusDocumentV3` votes
+
+  :returns: sorted **list** of the flags known to any vote
+  """
+
+  flags = set()
+
+  for vote in votes:
+    flags.update(vote.known_flags if isinstance(vote, NetworkStatusDocumentV3) else _vote_known_flags(vote))
+
+  return sorted(flags)
+
+
+def _to_table(vote):
+  """
+  Provides the table for a vote, checking that it is one.
+  """
+
+  if isinstance(vote, NetworkStatusDocumentV3):
+    document, table = vote, None
+  elif isinstance(vote, RouterStatusTable):
+    document, table = vote.document, vote
+  else:
+    raise ValueError('Votes must be a RouterStatusTable or NetworkStatusDocumentV3, not %s' % type(vote).__name__)
+
+  if document is not None and not document.is_vote:
+    raise ValueError('Only votes can be aggregated, not consensuses')
+  elif document is not None and document.is_microdescriptor:
+    raise ValueError('Votes are never microdescriptor flavored')
+
+  return table if table is not None else document.to_table()
+
+
+def _vote_known_flags(table):
+  """
+  Flags a vote knows about, which we take from its document if available.
+  """
+
+  if table.document is not None:
+    return table.document.known_flags
+
+  return [flag for (flag, bit) in table.flag_bits.items() if any(flags & bit for flags in table.flags)]
+
+
+def _translate_flags(table, flag_bits):
+  """
+  Provides a table's flags column in terms of the given bits. This is usually
+  the column itself since tables start with the same bits for flags we know.
+  """
+
+  translation = [(bit, flag_bits[flag]) for (flag, bit) in table.flag_bits.items() if flag in flag_bits]
+
+  if all(bit == translated_bit for (bit, translated_bit) in translation):
+    return table.flags
+
+  translated = []
+
+  for flags in table.flags:
+    translated_flags = 0
+
+    for bit, translated_bit in translation:
+      if flags & bit:
+        translated_flags |= translated_bit
+
+    translated.append(translated_flags)
+
+  return translated
+
+
+def _spread_columns(table_flags, known_mask, flag_bits, field_size):
+  """
+  Provides a vote's flags with each in a field of its own, so adding these
+  together counts the votes for each flag at once. For instance, with the
+  flags [Exit, Fast, Guard] and four bit fields, a relay with the Exit and
+  Guard flags would be '0x101'.
+
+  :returns: **tuple** of the form (known, assigned) where known is the flags
+    the vote knows about and assigned is a list with the known flags of each
+    relay in the vote
+  """
+
+  spreads = {}
+  assigned = []
+
+  for flags in table_flags:
+    spread = spreads.get(flags)
+
+    if spread is None:
+      spread = spreads[flags] = _spread(flags & known_mask, flag_bits, field_size)
+
+    assigned.append(spread)
+
+  return _spread(known_mask, flag_bits, field_size), assigned
+
+
+def _spread(mask, flag_bits, field_size):
+  spread = 0
+
+  for index, bit in enumerate(flag_bits):
+    if mask & bit:
+      spread |= 1 << (index * field_size)
+
+  return spread
+
+
+def _flag_majority(known_counts, assigned_counts, flag_bits, field_size):
+  """
+  Provides the flags that more than half of the votes that know of them have
+  assigned.
+
+  :param int known_counts: number of votes that know each flag
+  :param int assigned_counts: number of votes that assigned each flag
+  :param list flag_bits: bits of each flag
+  :param int field_size: bits used for each flag's count
+  """
+
+  field_mask = (1 << field_size) - 1
+  flags = 0
+
+  for index, bit in enumerate(flag_bits):
+    offset = index * field_size
+
+    if ((assigned_counts >> offset) & field_mask) * 2 > ((known_counts >> offset) & field_mask):
+      flags |= bit
+
+  return flags
+
+
+def _descriptor(tables, listed):
+  """
+  Provides the (nickname, digest, published, address, or_port, dir_port) of
+  the descriptor that the most votes list, ties going to the most recently
+  published and then the largest digest.
+  """
+
+  counts, listings = {}, {}
+
+  for listing in listed:
+    vote_index, row = listing
+    table = tables[vote_index]
+    descriptor = (table.published[row], table.digest._digests[row * 20:(row + 1) * 20])
+
+    if descriptor in counts:
+      counts[descriptor] += 1
+    else:
+      counts[descriptor] = 1
+      listings[descriptor] = listing
+
+  published, digest = max(counts, key = lambda descriptor: (counts[descriptor], descriptor))
+  vote_index, row = listings[(published, digest)]
+  table = tables[vote_index]
+
+  return table.nickname[row], digest, published, table.address[row], table.or_port[row], table.dir_port[row]
+
+
+def _version_line(tables, listed):
+  """
+  Provides the version line that the most votes list, ties going to the latest
+  version.
+  """
+
+  counts = {}
+
+  for vote_index, row in listed:
+    version_line = tables[vote_index].version_line[row]
+
+    if version_line is not None:
+      counts[version_line] = counts.get(version_line, 0) + 1
+
+  if not counts:
+    return None
+
+  most_votes = max(counts.values())
+  candidates = [version_line for (version_line, count) in counts.items() if count == most_votes]
+
+  return candidates[0] if len(candidates) == 1 else max(candidates, key = _version_key)
+
+
+def _version_key(version_line):
+  try:
+    return (1, stem.version.Version(version_line.split(' ', 1)[-1]), version_line)
+  except ValueError:
+    return (0, None, version_line)
+
+
+def _bandwidth(tables, listed, min_measured):
+  """
+  Provides the (bandwidth, measured) of a relay. If it has enough measurements
+  then these are both their low median, otherwise the bandwidth is the low
+  median of what the votes claim and measured is zero.
+  """
+
+  measurements = [tables[vote_index].measured[row] for (vote_index, row) in listed if tables[vote_index].measured[row]]
+
+  if measurements and len(measurements) >= min_measured:
+    measured = _low_median(measurements)
+    return measured, measured
+
+  bandwidths = [tables[vote_index].bandwidth[row] for (vote_index, row) in listed if tables[vote_index].bandwidth[row]]
+  return (_low_median(bandwidths) if bandwidths else 0), 0
+
+
+def _low_median(values):
+  """
+  Median of the values, taking the lower of the middle two if there's an even
+  number of them (as tor does).
+  """
+
+  values = sorted(values)
+  return values[(len(values) - 1) // 2]
@@ -51,6 +51,8 @@ exiting to a destination is permissible or not. For instance...
     +- __str__ - string representation for this rule
 
   get_config_policy - provides the ExitPolicy based on torrc rules
+  get_shared_policy - provides an ExitPolicy shared with others of the same rules
+  get_shared_micro_policy - provides a MicroExitPolicy shared with others of the same rules
 
 .. data:: AddressType (enum)
 
@@ -68,6 +70,8 @@ exiting to a destination is permissible or not. For instance...
 from __future__ import absolute_import
 
 import socket
+import threading
+import weakref
 import zlib
 
 import stem.prereq
@@ -100,6 +104,13 @@ PRIVATE_ADDRESSES = (
   '172.16.0.0/12',
 )
 
+# Policies provided by get_shared_policy() and get_shared_micro_policy(),
+# keyed on their class and rules. These are dropped once they're no longer
+# referenced.
+
+SHARED_POLICIES = weakref.WeakValueDictionary()
+SHARED_POLICIES_LOCK = threading.Lock()
+
 
 def get_config_policy(rules, ip_address = None):
   """
@@ -162,6 +173,69 @@ def get_config_policy(rules, ip_address = None):
   return ExitPolicy(*result)
 
 
+def get_shared_policy(*rules):
+  """
+  Provides an exit policy for the given rules, which is the same instance as
+  other policies we've provided with these rules. Relays commonly have the
+  same policy (such as 'reject \*:\*' or tor's default), so sharing them saves
+  memory and lets results like :func:`~stem.exit_policy.ExitPolicy.can_exit_to`
+  be reused across relays.
+
+  Policies are looked up by their rules with surrounding whitespace removed,
+  so 'accept \*:80' and 'accept \*:80 ' are the same, but 'accept \*:80' and
+  'accept 0.0.0.0/0:80' are not.
+
+  .. versionadded:: 1.3.0
+
+  :param list rules: **str** rules that make up the policy
+
+  :returns: :class:`~stem.exit_policy.ExitPolicy` with these rules
+
+  :raises: **TypeError** if a rule isn't a string
+  """
+
+  for rule in rules:
+    if not isinstance(rule, (bytes, str_type)):
+      raise TypeError('Shared exit policies can only be made from strings, got a %s (%s)' % (type(rule), rules))
+
+  key = (ExitPolicy, b','.join([stem.util.str_tools._to_bytes(rule).strip() for rule in rules]))
+  return _get_shared(key, lambda: ExitPolicy(*rules))
+
+
+def get_shared_micro_policy(policy):
+  """
+  Provides a microdescriptor exit policy, which is the same instance as other
+  policies we've provided for this string. This is the
+  :class:`~stem.exit_policy.MicroExitPolicy` counterpart of
+  :func:`~stem.exit_policy.get_shared_policy`.
+
+  .. versionadded:: 1.3.0
+
+  :param str policy: policy string that describes this policy
+
+  :returns: :class:`~stem.exit_policy.MicroExitPolicy` for this policy
+
+  :raises: **ValueError** if the policy is malformed
+  """
+
+  return _get_shared((MicroExitPolicy, stem.util.str_tools._to_bytes(policy)), lambda: MicroExitPolicy(policy))
+
+
+def _get_shared(key, constructor):
+  """
+  Provides the shared policy with the given key, constructing it if we don't
+  have one.
+  """
+
+  with SHARED_POLICIES_LOCK:
+    policy = SHARED_POLICIES.get(key)
+
+    if policy is None:
+      policy = SHARED_POLICIES[key] = constructor()
+
+    return policy
+
+
 def _flag_private_rules(rules):
   """
   Determine if part of our policy was expanded from the 'private' keyword. This
@@ -448,11 +522,15 @@ class ExitPolicy(object):
     if self._rules is None:
       rules = []
       is_all_accept, is_all_reject = True, True
+      input_rules = self._input_rules
+
+      if input_rules is None:
+        return self._rules  # another thread parsed our rules while we checked
 
-      if isinstance(self._input_rules, bytes):
-        decompressed_rules = zlib.decompress(self._input_rules).split(b',')
+      if isinstance(input_rules, bytes):
+        decompressed_rules = zlib.decompress(input_rules).split(b',')
       else:
-        decompressed_rules = self._input_rules
+        decompressed_rules = input_rules
 
       for rule in decompressed_rules:
         if isinstance(rule, bytes):
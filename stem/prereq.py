@@ -9,6 +9,10 @@ Checks for stem dependencies. We require python 2.6 or greater (including the
 
   * validating descriptor signature integrity
 
+* sha3 hash functions (builtin as of python 3.6, otherwise the pysha3 module)
+
+  * computing and applying consensus diffs
+
 ::
 
   check_requirements - checks for minimum requirements for running stem
@@ -17,6 +21,7 @@ Checks for stem dependencies. We require python 2.6 or greater (including the
   is_python_3 - checks if python 3.0 or later is available
 
   is_crypto_available - checks if the pycrypto module is available
+  is_sha3_available - checks if the sha3 hash functions are available
 """
 
 import inspect
@@ -29,6 +34,7 @@ except ImportError:
   from stem.util.lru_cache import lru_cache
 
 CRYPTO_UNAVAILABLE = "Unable to import the pycrypto module. Because of this we'll be unable to verify descriptor signature integrity. You can get pycrypto from: https://www.dlitz.net/software/pycrypto/"
+SHA3_UNAVAILABLE = "Unable to import sha3 (added to hashlib in python 3.6). Because of this we'll be unable to make or check the digests of consensus diffs. For earlier python versions you can get the pysha3 module from: https://pypi.python.org/pypi/pysha3"
 
 
 def check_requirements():
@@ -89,6 +95,32 @@ def is_crypto_available():
     return False
 
 
+@lru_cache()
+def is_sha3_available():
+  """
+  Checks if hashlib provides sha3, which is used for the digests of consensus
+  diffs. This was added in python 3.6, and importing the pysha3 module adds it
+  for earlier versions.
+
+  :returns: **True** if we can use hashlib.sha3_256 and **False** otherwise
+  """
+
+  from stem.util import log
+  import hashlib
+
+  if not hasattr(hashlib, 'sha3_256'):
+    try:
+      import sha3  # pysha3 adds sha3 to hashlib when imported
+    except ImportError:
+      pass
+
+  if hasattr(hashlib, 'sha3_256'):
+    return True
+  else:
+    log.log_once('stem.prereq.is_sha3_available', log.INFO, SHA3_UNAVAILABLE)
+    return False
+
+
 @lru_cache()
 def is_mock_available():
   """
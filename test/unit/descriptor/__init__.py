@@ -3,13 +3,21 @@ Unit tests for stem.descriptor.
 """
 
 __all__ = [
+  'cache',
+  'consensus_history',
+  'descriptor_store',
   'export',
   'extrainfo_descriptor',
   'microdescriptor',
   'networkstatus',
+  'profiler',
   'reader',
+  'relay_selection',
   'router_status_entry',
+  'router_status_table',
+  'router_status_index',
   'server_descriptor',
+  'vote_aggregation',
 ]
 
 import os
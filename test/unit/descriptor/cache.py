@@ -0,0 +1,192 @@
+"""
+Unit tests for stem.descriptor.cache.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import stem.descriptor
+import stem.descriptor.reader
+
+from stem.descriptor.cache import DescriptorCache
+from stem.exit_policy import ExitPolicy
+
+from test.unit.descriptor import get_resource
+
+try:
+  # added in python 3.3
+  from unittest.mock import patch
+except ImportError:
+  from mock import patch
+
+
+class TestDescriptorCache(unittest.TestCase):
+  def setUp(self):
+    self.temp_directory = tempfile.mkdtemp()
+    self.cache = DescriptorCache(os.path.join(self.temp_directory, 'cache'))
+
+  def tearDown(self):
+    shutil.rmtree(self.temp_directory)
+
+  def test_cached_consensus(self):
+    """
+    Reads a consensus a second time from our cache.
+    """
+
+    consensus_path = get_resource('cached-consensus')
+    expected = list(stem.descriptor.parse_file(consensus_path, cache = self.cache))
+    self.assertEqual(1, len(self.cache._entries))
+
+    with patch('stem.descriptor._parse_file') as parse_file_mock:
+      descriptors = list(stem.descriptor.parse_file(consensus_path, cache = self.cache))
+      self.assertFalse(parse_file_mock.called)
+
+    self.assertEqual(len(expected), len(descriptors))
+
+    for expected_desc, desc in zip(expected, descriptors):
+      self.assertEqual(str(expected_desc), str(desc))
+      self.assertEqual(expected_desc.fingerprint, desc.fingerprint)
+      self.assertEqual(expected_desc.flags, desc.flags)
+      self.assertEqual(os.path.abspath(consensus_path), desc.get_path())
+
+    # router status entries should still share their document
+
+    self.assertTrue(descriptors[0].document is descriptors[1].document)
+
+    # a new cache instance reads our index from disk
+
+    self.assertEqual(len(expected), len(list(DescriptorCache(self.cache.path).get(consensus_path))))
+
+  def test_parse_options(self):
+    """
+    Descriptors are cached separately for how they're parsed.
+    """
+
+    descriptor_path = get_resource('metrics_server_desc_multiple')
+
+    list(stem.descriptor.parse_file(descriptor_path, cache = self.cache))
+    list(stem.descriptor.parse_file(descriptor_path, cache = self.cache, validate = True))
+    list(stem.descriptor.parse_file(descriptor_path, cache = self.cache, fields = ('nickname',)))
+    self.assertEqual(3, len(self.cache._entries))
+
+    descriptors = list(self.cache.get(descriptor_path, kwargs = {'fields': ('nickname',)}))
+    self.assertEqual(['anonion', 'Unnamed'], [desc.nickname for desc in descriptors])
+    self.assertEqual(None, descriptors[0].fingerprint)
+
+    self.assertEqual(None, self.cache.get(descriptor_path, 'server-descriptor 1.0'))
+
+    # cached descriptors are fully parsed, including their exit policy
+
+    descriptors = list(self.cache.get(descriptor_path))
+    self.assertEqual(False, descriptors[0]._lazy_loading)
+    self.assertEqual(ExitPolicy('reject *:*'), descriptors[1].exit_policy)
+
+  def test_modified_file(self):
+    """
+    Touching a file doesn't invalidate its descriptors, but changing its
+    content does.
+    """
+
+    descriptor_path = os.path.join(self.temp_directory, 'cached-descriptors')
+    shutil.copyfile(get_resource('metrics_server_desc_multiple'), descriptor_path)
+
+    list(stem.descriptor.parse_file(descriptor_path, cache = self.cache))
+    self.assertEqual(2, len(list(self.cache.get(descriptor_path))))
+
+    os.utime(descriptor_path, (0, 0))
+    self.assertEqual(2, len(list(self.cache.get(descriptor_path))))
+
+    with open(descriptor_path, 'ab') as descriptor_file:
+      descriptor_file.write(b'\n')
+
+    self.assertEqual(None, self.cache.get(descriptor_path))
+
+  def test_unreadable_entry(self):
+    """
+    Descriptors are unpickled as they're requested, and we drop entries that
+    turn out to be unreadable.
+    """
+
+    descriptor_path = get_resource('metrics_server_desc_multiple')
+    list(stem.descriptor.parse_file(descriptor_path, cache = self.cache))
+
+    key = list(self.cache._entries.keys())[0]
+
+    with open(self.cache._entry_path(key), 'ab') as entry_file:
+      entry_file.write(b'not a pickle')
+
+    descriptors = self.cache.get(descriptor_path)
+    self.assertEqual('anonion', next(descriptors).nickname)
+    self.assertEqual('Unnamed', next(descriptors).nickname)
+    self.assertRaises(IOError, next, descriptors)
+
+    self.assertEqual(None, self.cache.get(descriptor_path))
+    self.assertEqual(['index'], os.listdir(self.cache.path))
+
+  def test_partially_read(self):
+    """
+    Files that we stop reading partway through aren't cached.
+    """
+
+    descriptors = stem.descriptor.parse_file(get_resource('cached-consensus'), cache = self.cache)
+    next(descriptors)
+    descriptors.close()
+
+    self.assertEqual(0, len(self.cache._entries))
+    self.assertEqual([], [filename for filename in os.listdir(self.cache.path) if filename != 'index'])
+
+  def test_eviction(self):
+    """
+    Evicts the least recently used descriptors when we exceed our size limit.
+    """
+
+    server_desc_path = get_resource('metrics_server_desc_multiple')
+    extrainfo_path = get_resource('extrainfo_relay_descriptor')
+
+    list(stem.descriptor.parse_file(server_desc_path, cache = self.cache))
+    list(stem.descriptor.parse_file(extrainfo_path, cache = self.cache))
+
+    self.cache.max_size = self.cache.size()
+    self.assertTrue(self.cache.get(server_desc_path) is not None)  # most recently used
+
+    list(stem.descriptor.parse_file(extrainfo_path, cache = self.cache, validate = True))
+
+    self.assertTrue(self.cache.get(server_desc_path) is not None)
+    self.assertTrue(self.cache.get(extrainfo_path, validate = True) is not None)
+    self.assertEqual(None, self.cache.get(extrainfo_path))
+    self.assertTrue(self.cache.size() <= self.cache.max_size)
+
+    # descriptors larger than our limit aren't cached
+
+    self.cache.max_size = 10
+    self.assertFalse(self.cache.put(server_desc_path, self.cache.get(server_desc_path)))
+
+    self.cache.clear()
+    self.assertEqual(0, self.cache.size())
+    self.assertEqual(['index'], os.listdir(self.cache.path))
+
+  def test_reader(self):
+    """
+    Reads an archive and plaintext descriptor file through a DescriptorReader
+    with a cache.
+    """
+
+    targets = [get_resource('descriptor_archive.tar'), get_resource('metrics_server_desc_multiple')]
+
+    with stem.descriptor.reader.DescriptorReader(targets, cache = self.cache) as reader:
+      expected = [(desc.get_path(), desc.get_archive_path(), str(desc)) for desc in reader]
+
+    self.assertEqual(5, len(expected))
+    self.assertEqual(2, len(self.cache._entries))
+
+    with patch('stem.descriptor.parse_file') as parse_file_mock:
+      with patch('stem.descriptor._parse_file') as private_parse_file_mock:
+        with stem.descriptor.reader.DescriptorReader(targets, cache = self.cache) as reader:
+          descriptors = [(desc.get_path(), desc.get_archive_path(), str(desc)) for desc in reader]
+
+        self.assertFalse(parse_file_mock.called)
+        self.assertFalse(private_parse_file_mock.called)
+
+    self.assertEqual(expected, descriptors)
@@ -0,0 +1,180 @@
+"""
+Unit tests for stem.descriptor.consensus_history.
+"""
+
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+import stem.descriptor
+import stem.util.str_tools
+
+from stem.descriptor.consensus_history import ConsensusHistory, RelayPeriod
+from stem.descriptor.networkstatus import NetworkStatusDocumentV3
+
+from test.unit.descriptor import get_resource
+
+SUMKLEDI = '0013D22389CD50D0B784A3E4061CB31E8CE8CEB5'
+UNNAMED = '00FD689E6E3EEA0FA021032CD6EF6BE8278B5FCD'
+
+HOUR = datetime.timedelta(hours = 1)
+FIRST_HOUR = datetime.datetime(2012, 7, 12, 10, 0, 0)
+
+
+class TestConsensusHistory(unittest.TestCase):
+  def setUp(self):
+    with open(get_resource('cached-consensus'), 'rb') as consensus_file:
+      self.content = consensus_file.read()
+
+    self.temp_directory = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.temp_directory)
+
+  def _consensus(self, hour, replacements = ()):
+    """
+    Provides our test consensus for the given hour with a few replacements.
+    """
+
+    content = self.content.replace(b'valid-after 2012-07-12 10:00:00', b'valid-after ' + stem.util.str_tools._to_bytes(str(FIRST_HOUR + hour * HOUR)))
+
+    for old, new in replacements:
+      content = content.replace(old, new)
+
+    return content
+
+  def test_unchanged_documents(self):
+    """
+    Reads the same relays across several documents.
+    """
+
+    history = ConsensusHistory()
+    documents = [NetworkStatusDocumentV3(self._consensus(hour)) for hour in range(5)]
+
+    for document in documents:
+      history.add(document)
+
+    self.assertEqual(5, len(history))
+    self.assertEqual([FIRST_HOUR + hour * HOUR for hour in range(5)], history.valid_afters())
+    self.assertEqual(9, len(history.fingerprints()))
+    self.assertEqual(9, history.entry_count())
+
+    periods = history.periods(SUMKLEDI)
+    self.assertEqual(1, len(periods))
+    self.assertEqual(RelayPeriod(FIRST_HOUR, FIRST_HOUR + 4 * HOUR, periods[0].entry), periods[0])
+
+    # entries we keep don't reference the whole document they came from
+
+    entry = periods[0].entry
+    self.assertTrue(entry is not documents[0].routers[SUMKLEDI])
+    self.assertTrue(documents[0].routers[SUMKLEDI].document is documents[0])
+    self.assertEqual(FIRST_HOUR, entry.document.valid_after)
+    self.assertEqual({}, entry.document.routers)
+    self.assertEqual(str(documents[0].routers[SUMKLEDI]), str(entry))
+
+    self.assertEqual(FIRST_HOUR, history.first_seen(SUMKLEDI))
+    self.assertEqual(FIRST_HOUR + 4 * HOUR, history.last_seen(SUMKLEDI))
+    self.assertEqual([], history.flag_changes(SUMKLEDI))
+    self.assertEqual([(FIRST_HOUR + hour * HOUR, 38) for hour in range(5)], history.bandwidth_series(SUMKLEDI))
+
+    self.assertEqual(None, history.first_seen('FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF'))
+    self.assertEqual([], history.periods('FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF'))
+
+  def test_changing_relay(self):
+    """
+    Tracks a relay whose flags and bandwidth change, and that leaves the
+    consensus for an hour.
+    """
+
+    changed = ((b's Exit Fast Named Running Valid\nv Tor 0.2.2.35\nw Bandwidth=38', b's Exit Fast Running Stable Valid\nv Tor 0.2.2.35\nw Bandwidth=50'),)
+    content = self._consensus(0)
+    entry_start = content.find(b'r sumkledi')
+    removed = ((content[entry_start:content.find(b'\nr ', entry_start) + 1], b''),)
+
+    history = ConsensusHistory()
+    history.add(NetworkStatusDocumentV3(self._consensus(0)))
+    history.add(NetworkStatusDocumentV3(self._consensus(1, changed)))
+    history.add(NetworkStatusDocumentV3(self._consensus(2, changed)))
+    history.add(NetworkStatusDocumentV3(self._consensus(3, removed)))
+    history.add(NetworkStatusDocumentV3(self._consensus(4)))
+
+    # the unchanged entry in the last document is the same instance
+
+    periods = history.periods(SUMKLEDI)
+    self.assertEqual([(0, 0), (1, 2), (4, 4)], [((period.start - FIRST_HOUR) // HOUR, (period.end - FIRST_HOUR) // HOUR) for period in periods])
+    self.assertTrue(periods[0].entry is periods[2].entry)
+    self.assertTrue(history.get_entry(SUMKLEDI, FIRST_HOUR + 4 * HOUR) is periods[0].entry)
+    self.assertEqual(None, history.get_entry(SUMKLEDI, FIRST_HOUR + 3 * HOUR))
+    self.assertEqual(None, history.get_entry(SUMKLEDI, FIRST_HOUR + HOUR // 2))
+
+    self.assertEqual([
+      (FIRST_HOUR + HOUR, set(['Stable']), set(['Named'])),
+      (FIRST_HOUR + 4 * HOUR, set(['Named']), set(['Stable'])),
+    ], history.flag_changes(SUMKLEDI))
+
+    self.assertEqual([38, 50, 50, 38], [bandwidth for _, bandwidth in history.bandwidth_series(SUMKLEDI)])
+
+  def test_out_of_order(self):
+    """
+    Adding documents out of order should have the same result as in order.
+    """
+
+    changed = ((b'w Bandwidth=38', b'w Bandwidth=50'),)
+    documents = [NetworkStatusDocumentV3(self._consensus(hour, changed if hour == 2 else ())) for hour in range(5)]
+
+    history = ConsensusHistory()
+
+    for index in (4, 0, 3, 1, 2, 2):
+      history.add(documents[index])
+
+    self.assertEqual(5, len(history))
+    self.assertEqual([(0, 1), (2, 2), (3, 4)], [((period.start - FIRST_HOUR) // HOUR, (period.end - FIRST_HOUR) // HOUR) for period in history.periods(SUMKLEDI)])
+    self.assertEqual([(0, 4)], [((period.start - FIRST_HOUR) // HOUR, (period.end - FIRST_HOUR) // HOUR) for period in history.periods(UNNAMED)])
+
+  def test_add_entries(self):
+    """
+    Adds router status entries as they're provided by parse_file().
+    """
+
+    consensus_path = os.path.join(self.temp_directory, 'consensus')
+    history = ConsensusHistory()
+
+    for hour in range(3):
+      with open(consensus_path, 'wb') as consensus_file:
+        consensus_file.write(self._consensus(hour))
+
+      for router in stem.descriptor.parse_file(consensus_path, 'network-status-consensus-3 1.0'):
+        history.add(router)
+
+    self.assertEqual(3, len(history))
+    self.assertEqual(9, history.entry_count())
+    self.assertEqual(FIRST_HOUR + 2 * HOUR, history.last_seen(SUMKLEDI))
+
+    self.assertRaises(ValueError, history.add, 'hello world')
+
+  def test_add_file(self):
+    """
+    Reads documents from disk, only parsing entries we haven't seen.
+    """
+
+    history = ConsensusHistory(validate = True)
+
+    for hour in range(3):
+      consensus_path = os.path.join(self.temp_directory, 'consensus-%i' % hour)
+
+      with open(consensus_path, 'wb') as consensus_file:
+        consensus_file.write(self._consensus(hour, ((b'w Bandwidth=38', stem.util.str_tools._to_bytes('w Bandwidth=%i' % (38 + hour))),)))
+
+      history.add_file(consensus_path)
+
+    self.assertEqual(3, len(history))
+    self.assertEqual(11, history.entry_count())
+    self.assertEqual([38, 39, 40], [bandwidth for _, bandwidth in history.bandwidth_series(SUMKLEDI)])
+
+    expected = NetworkStatusDocumentV3(self.content).routers[UNNAMED]
+    entry = history.get_entry(UNNAMED, FIRST_HOUR + 2 * HOUR)
+
+    self.assertEqual(str(expected), str(entry))
+    self.assertEqual(FIRST_HOUR, entry.document.valid_after)
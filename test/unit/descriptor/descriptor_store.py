@@ -0,0 +1,243 @@
+"""
+Unit tests for stem.descriptor.descriptor_store.
+"""
+
+import base64
+import binascii
+import os
+import shutil
+import tempfile
+import unittest
+
+import stem.descriptor
+import stem.util.str_tools
+
+from stem.descriptor.descriptor_store import DescriptorStore, MicrodescriptorStore
+
+from test.mocking import (
+  get_router_status_entry_v3,
+  get_router_status_entry_micro_v3,
+)
+
+from test.unit.descriptor import get_resource
+
+CAERSIDI_DIGEST = '2C7B27BEAB04B4E2459D89CA6D5CD1CC5F95A689'
+NINJA_DIGEST = '00A57A9AAB5EA113898E2DD02A755E31AFC27227'
+MICRODESCRIPTOR_DIGEST = 'EA47C05B24915158EB2C799D2376643C65DFE20CB0F27AEE87FDDB134275998F'
+
+
+def _to_base64(hex_digest):
+  return stem.util.str_tools._to_unicode(base64.b64encode(binascii.a2b_hex(hex_digest))).rstrip('=')
+
+
+class TestDescriptorStore(unittest.TestCase):
+  def setUp(self):
+    self.temp_directory = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.temp_directory)
+
+  def test_add_file(self):
+    """
+    Indexes files of each descriptor type, and reads descriptors from them.
+    """
+
+    store = DescriptorStore()
+
+    self.assertEqual(2, store.add_file(get_resource('metrics_server_desc_multiple')))
+    self.assertEqual(1, store.add_file(get_resource('example_descriptor')))
+    self.assertEqual(1, store.add_file(get_resource('extrainfo_relay_descriptor')))
+    self.assertEqual(3, store.add_file(get_resource('cached-microdescs')))
+    self.assertEqual(7, len(store))
+
+    for resource, descriptor_type, getter in (
+      ('metrics_server_desc_multiple', 'server-descriptor 1.0', store.get_server_descriptor),
+      ('extrainfo_relay_descriptor', 'extra-info 1.0', store.get_extrainfo_descriptor),
+      ('cached-microdescs', 'microdescriptor 1.0', store.get_microdescriptor),
+    ):
+      for desc in stem.descriptor.parse_file(get_resource(resource), descriptor_type):
+        digest = desc.digest if descriptor_type == 'microdescriptor 1.0' else desc.digest()
+        stored_desc = getter(digest)
+
+        self.assertEqual(type(desc), type(stored_desc))
+        self.assertEqual(desc.get_bytes(), stored_desc.get_bytes())
+        self.assertEqual(get_resource(resource), stored_desc.get_path())
+        self.assertTrue(digest in store)
+        self.assertTrue(binascii.a2b_hex(digest) in store)
+
+    # digests are only looked up among descriptors of that type
+
+    self.assertEqual(None, store.get_extrainfo_descriptor(CAERSIDI_DIGEST))
+    self.assertEqual('default', store.get_server_descriptor('FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF', 'default'))
+    self.assertEqual(None, store.get_server_descriptor('hello world'))
+    self.assertFalse('FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF' in store)
+
+  def test_join(self):
+    """
+    Follows the references of router status entries and server descriptors.
+    """
+
+    store = DescriptorStore()
+    store.add_file(get_resource('example_descriptor'))
+    store.add_file(get_resource('cached-microdescs'))
+
+    router = get_router_status_entry_v3({'r': 'caerSidi p1aag7VwarGxqctS7/fS0y5FU+s %s 2012-08-06 11:19:31 71.35.150.29 9001 0' % _to_base64(CAERSIDI_DIGEST)})
+    micro_router = get_router_status_entry_micro_v3({'m': _to_base64(MICRODESCRIPTOR_DIGEST)})
+
+    self.assertEqual('caerSidi', store.join(router).nickname)
+    self.assertEqual('caerSidi', store.get_server_descriptor(router).nickname)
+    self.assertEqual(MICRODESCRIPTOR_DIGEST, store.join(micro_router).digest)
+    self.assertEqual(None, store.join(get_router_status_entry_v3()))
+    self.assertRaises(ValueError, store.join, store.join(router))
+
+    # server descriptors reference their extra-info descriptor
+
+    with open(get_resource('extrainfo_relay_descriptor'), 'rb') as descriptor_file:
+      extrainfo_desc = next(stem.descriptor.parse_file(descriptor_file, 'extra-info 1.0'))
+
+    server_desc = store.join(router)
+    server_desc.extra_info_digest = NINJA_DIGEST
+
+    self.assertEqual(None, store.get_extrainfo_descriptor(server_desc))
+
+    store.add(extrainfo_desc)
+    self.assertTrue(store.get_extrainfo_descriptor(server_desc) is extrainfo_desc)
+
+  def test_add(self):
+    """
+    Adds descriptors we've already parsed.
+    """
+
+    store = DescriptorStore()
+
+    with open(get_resource('cached-microdescs'), 'rb') as descriptor_file:
+      microdescriptors = list(stem.descriptor.parse_file(descriptor_file, 'microdescriptor 1.0'))
+
+    for desc in microdescriptors:
+      store.add(desc)
+
+    self.assertEqual(3, len(store))
+    self.assertTrue(store.get_microdescriptor(MICRODESCRIPTOR_DIGEST.lower()) in microdescriptors)
+    self.assertRaises(ValueError, store.add, get_router_status_entry_v3())
+
+  def test_modified_file(self):
+    """
+    Reads from a file that has changed since we indexed it, and one with
+    content we don't store.
+    """
+
+    path = os.path.join(self.temp_directory, 'cached-descriptors')
+    shutil.copyfile(get_resource('example_descriptor'), path)
+
+    store = DescriptorStore()
+    store.add_file(path)
+
+    with open(path, 'ab') as descriptor_file:
+      descriptor_file.write(b'\n')
+
+    self.assertRaises(IOError, store.get_server_descriptor, CAERSIDI_DIGEST)
+    self.assertRaises(ValueError, store.add_file, get_resource('cached-consensus'))
+
+    with open(path, 'wb') as descriptor_file:
+      descriptor_file.write(b'@annotation only\n')
+
+    self.assertEqual(0, store.add_file(path))
+
+
+class TestMicrodescriptorStore(unittest.TestCase):
+  def setUp(self):
+    self.temp_directory = tempfile.mkdtemp()
+    self.cache_path = os.path.join(self.temp_directory, 'cached-microdescs')
+    self.journal_path = self.cache_path + '.new'
+
+    with open(get_resource('cached-microdescs'), 'rb') as cache_file:
+      self.cache_content = cache_file.read()
+
+    with open(self.cache_path, 'wb') as cache_file:
+      cache_file.write(self.cache_content)
+
+    # journal with a newer microdescriptor for the first relay
+
+    self.first_entry = self.cache_content[:self.cache_content.find(b'@', 1)]
+
+    with open(self.journal_path, 'wb') as journal_file:
+      journal_file.write(self.first_entry + b'family $6141629FA0D15A6AEAEF3A1BEB76E64C767B3174\n')
+
+  def tearDown(self):
+    shutil.rmtree(self.temp_directory)
+
+  def test_journal(self):
+    """
+    Reads microdescriptors from both the cache and its journal.
+    """
+
+    store = MicrodescriptorStore(self.temp_directory)
+
+    self.assertEqual(self.cache_path, store.path)
+    self.assertEqual(4, len(store))
+
+    microdescriptors = list(store)
+    self.assertEqual(4, len(microdescriptors))
+    # we provide the cache's microdescriptors in order, then the journal's
+
+    with open(get_resource('cached-microdescs'), 'rb') as cache_file:
+      expected = [desc.digest for desc in stem.descriptor.parse_file(cache_file, 'microdescriptor 1.0')]
+
+    self.assertEqual(expected, [desc.digest for desc in microdescriptors[:3]])
+    self.assertEqual(['$6141629FA0D15A6AEAEF3A1BEB76E64C767B3174'], microdescriptors[3].family)
+
+    for desc in microdescriptors:
+      self.assertEqual(desc.get_bytes(), store.get_microdescriptor(desc.digest).get_bytes())
+
+    micro_router = get_router_status_entry_micro_v3({'m': _to_base64(MICRODESCRIPTOR_DIGEST)})
+    self.assertEqual(MICRODESCRIPTOR_DIGEST, store.join(micro_router).digest)
+
+    store.close()
+    self.assertEqual(0, len(store))
+
+  def test_reload(self):
+    """
+    Picks up the microdescriptors tor adds to its journal, and those of a
+    rewritten cache.
+    """
+
+    store = MicrodescriptorStore(self.cache_path)
+    self.assertFalse(store.reload())
+
+    with open(self.journal_path, 'ab') as journal_file:
+      journal_file.write(self.first_entry + b'family $6141629FA0D15A6AEAEF3A1BEB76E64C767B3175\n')
+
+    self.assertTrue(store.reload())
+    self.assertEqual(5, len(store))
+
+    # tor rewrites its cache by replacing it, so we read from the prior file
+    # until we're reloaded
+
+    replacement_path = os.path.join(self.temp_directory, 'cached-microdescs.tmp')
+
+    with open(replacement_path, 'wb') as cache_file:
+      cache_file.write(self.first_entry)
+
+    os.rename(replacement_path, self.cache_path)
+    os.remove(self.journal_path)
+
+    self.assertEqual(MICRODESCRIPTOR_DIGEST, store.get_microdescriptor(MICRODESCRIPTOR_DIGEST).digest)
+
+    self.assertTrue(store.reload())
+    self.assertEqual(1, len(store))
+    self.assertEqual(None, store.get_microdescriptor(MICRODESCRIPTOR_DIGEST))
+
+  def test_other_descriptors(self):
+    """
+    Tor's microdescriptor cache has something else.
+    """
+
+    shutil.copyfile(get_resource('example_descriptor'), self.journal_path)
+    self.assertRaises(ValueError, MicrodescriptorStore, self.temp_directory)
+
+    # no cache or journal
+
+    os.remove(self.cache_path)
+    os.remove(self.journal_path)
+
+    self.assertEqual(0, len(MicrodescriptorStore(self.temp_directory)))
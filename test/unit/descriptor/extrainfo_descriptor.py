@@ -7,7 +7,15 @@ import unittest
 
 import stem.descriptor
 
-from stem.descriptor.extrainfo_descriptor import RelayExtraInfoDescriptor, DirResponse, DirStat
+from stem.descriptor.extrainfo_descriptor import (
+  RelayExtraInfoDescriptor,
+  DirResponse,
+  DirStat,
+  HistoryType,
+  StatisticsAggregator,
+  resample_history,
+  sum_histories,
+)
 
 from test.mocking import get_relay_extrainfo_descriptor, get_bridge_extrainfo_descriptor, CRYPTO_BLOB
 
@@ -49,16 +57,16 @@ k0d2aofcVbHr4fPQOSST0LXDrhFl5Fqo5um296zpJGvRUeO6S44U/EfJAGShtqWw
     # the initial contents for the line and parsed values.
 
     read_values_start = [3309568, 9216, 41984, 27648, 123904]
-    self.assertEqual(read_values_start, desc.read_history_values[:5])
+    self.assertEqual(read_values_start, list(desc.read_history_values[:5]))
 
     write_values_start = [1082368, 19456, 50176, 272384, 485376]
-    self.assertEqual(write_values_start, desc.write_history_values[:5])
+    self.assertEqual(write_values_start, list(desc.write_history_values[:5]))
 
     dir_read_values_start = [0, 0, 0, 0, 33792, 27648, 48128]
-    self.assertEqual(dir_read_values_start, desc.dir_read_history_values[:7])
+    self.assertEqual(dir_read_values_start, list(desc.dir_read_history_values[:7]))
 
     dir_write_values_start = [0, 0, 0, 227328, 349184, 382976, 738304]
-    self.assertEqual(dir_write_values_start, desc.dir_write_history_values[:7])
+    self.assertEqual(dir_write_values_start, list(desc.dir_write_history_values[:7]))
 
   def test_metrics_bridge_descriptor(self):
     """
@@ -101,16 +109,16 @@ k0d2aofcVbHr4fPQOSST0LXDrhFl5Fqo5um296zpJGvRUeO6S44U/EfJAGShtqWw
     self.assertEqual([], desc.get_unrecognized_lines())
 
     read_values_start = [337920, 437248, 3995648, 48726016]
-    self.assertEqual(read_values_start, desc.read_history_values[:4])
+    self.assertEqual(read_values_start, list(desc.read_history_values[:4]))
 
     write_values_start = [343040, 991232, 5649408, 49548288]
-    self.assertEqual(write_values_start, desc.write_history_values[:4])
+    self.assertEqual(write_values_start, list(desc.write_history_values[:4]))
 
     dir_read_values_start = [0, 71680, 99328, 25600]
-    self.assertEqual(dir_read_values_start, desc.dir_read_history_values[:4])
+    self.assertEqual(dir_read_values_start, list(desc.dir_read_history_values[:4]))
 
     dir_write_values_start = [5120, 664576, 2419712, 578560]
-    self.assertEqual(dir_write_values_start, desc.dir_write_history_values[:4])
+    self.assertEqual(dir_write_values_start, list(desc.dir_write_history_values[:4]))
 
     self.assertEqual({}, desc.dir_v2_requests)
     self.assertEqual({}, desc.dir_v3_requests)
@@ -121,6 +129,39 @@ k0d2aofcVbHr4fPQOSST0LXDrhFl5Fqo5um296zpJGvRUeO6S44U/EfJAGShtqWw
     self.assertEqual({}, desc.dir_v2_responses_unknown)
     self.assertEqual({}, desc.dir_v2_responses_unknown)
 
+  def test_metrics_relay_descriptor_with_mmap(self):
+    """
+    Memory maps an extrainfo descriptor from metrics.
+    """
+
+    desc = next(stem.descriptor.parse_file(get_resource('extrainfo_relay_descriptor'), 'extra-info 1.0', use_mmap = True))
+    self.assertEqual('NINJA', desc.nickname)
+    self.assertEqual('B2289C3EAB83ECD6EB916A2F481A02E6B76A0A48', desc.fingerprint)
+    self.assertEqual(datetime.datetime(2012, 5, 5, 17, 3, 50), desc.published)
+    self.assertEqual('00A57A9AAB5EA113898E2DD02A755E31AFC27227', desc.digest())
+    self.assertEqual([], desc.get_unrecognized_lines())
+    self.assertTrue(desc.get_bytes().startswith(b'extra-info NINJA'))
+
+  def test_metrics_relay_descriptor_with_fields(self):
+    """
+    Only parses some attributes of an extrainfo descriptor from metrics.
+    """
+
+    for validate in (True, False):
+      with open(get_resource('extrainfo_relay_descriptor'), 'rb') as descriptor_file:
+        desc = next(stem.descriptor.parse_file(descriptor_file, 'extra-info 1.0', validate = validate, fields = ('nickname', 'read_history_values')))
+
+      self.assertEqual('NINJA', desc.nickname)
+      self.assertEqual('B2289C3EAB83ECD6EB916A2F481A02E6B76A0A48', desc.fingerprint)
+      self.assertEqual(28, len(desc.read_history_values))
+      self.assertEqual(None, desc.published)
+      self.assertEqual(None, desc.write_history_values)
+      self.assertEqual(None, desc.signature)
+      self.assertEqual([], desc.get_unrecognized_lines())
+
+    with open(get_resource('extrainfo_relay_descriptor'), 'rb') as descriptor_file:
+      self.assertRaises(ValueError, list, stem.descriptor.parse_file(descriptor_file, 'extra-info 1.0', fields = ('nickname', 'bogus')))
+
   def test_minimal_extrainfo_descriptor(self):
     """
     Basic sanity check that we can parse an extrainfo descriptor with minimal
@@ -475,7 +516,7 @@ k0d2aofcVbHr4fPQOSST0LXDrhFl5Fqo5um296zpJGvRUeO6S44U/EfJAGShtqWw
         desc = get_relay_extrainfo_descriptor({keyword: '2012-05-03 12:07:50 (500 s)%s' % test_values})
         self.assertEqual(datetime.datetime(2012, 5, 3, 12, 7, 50), getattr(desc, end_attr))
         self.assertEqual(500, getattr(desc, interval_attr))
-        self.assertEqual(expected_values, getattr(desc, values_attr))
+        self.assertEqual(expected_values, list(getattr(desc, values_attr)))
 
       test_entries = (
         '',
@@ -495,6 +536,92 @@ k0d2aofcVbHr4fPQOSST0LXDrhFl5Fqo5um296zpJGvRUeO6S44U/EfJAGShtqWw
         self.assertEqual(None, getattr(desc, interval_attr))
         self.assertEqual(None, getattr(desc, values_attr))
 
+  def test_resample_history(self):
+    """
+    Provides bandwidth histories in intervals of various lengths.
+    """
+
+    end = datetime.datetime(2015, 1, 1, 0, 30)  # 1420072200
+    values = [10, 20, 30, 40]
+
+    self.assertEqual((1420068600, [10, 20, 30, 40]), self._as_list(resample_history(end, 900, values, 900)))
+    self.assertEqual((1420068600, [30, 70]), self._as_list(resample_history(end, 900, values, 1800)))
+    self.assertEqual((1420066800, [30, 70]), self._as_list(resample_history(end, 900, values, 3600)))
+    self.assertEqual((1420068900, [10, 0, 0, 20, 0, 0, 30, 0, 0, 40]), self._as_list(resample_history(end, 900, values, 300)))
+    self.assertEqual((1420072200, []), self._as_list(resample_history(end, 900, [], 1800)))
+
+  def test_sum_histories(self):
+    """
+    Sums the bandwidth history of several descriptors, including ones that
+    overlap.
+    """
+
+    first = get_relay_extrainfo_descriptor({'write-history': '2015-01-01 00:30:00 (900 s) 10,20,30,40'})
+    overlapping = get_relay_extrainfo_descriptor({'write-history': '2015-01-01 01:00:00 (900 s) 30,40,50,60'})
+    other_relay = get_relay_extrainfo_descriptor({'extra-info': 'other FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF', 'write-history': '2015-01-01 00:00:00 (900 s) 5,5'})
+    without_history = get_relay_extrainfo_descriptor()
+
+    self.assertEqual((1420068600, [15, 25, 30, 40, 50, 60]), self._as_list(sum_histories([first, overlapping, other_relay, without_history])))
+    self.assertEqual((1420068600, [15, 25, 30, 40, 50, 60]), self._as_list(sum_histories([other_relay, overlapping, first])))
+    self.assertEqual((1420068600, [40, 70, 110]), self._as_list(sum_histories([first, overlapping, other_relay], resolution = 1800)))
+    self.assertEqual((None, []), self._as_list(sum_histories([first, overlapping], HistoryType.READ)))
+    self.assertEqual((None, []), self._as_list(sum_histories([])))
+
+  def test_statistics_aggregator(self):
+    """
+    Sums the usage statistics of several descriptors.
+    """
+
+    aggregator = StatisticsAggregator()
+
+    aggregator.add(get_relay_extrainfo_descriptor({
+      'entry-ips': 'us=16,de=8',
+      'exit-streams-opened': '80=100,443=50,other=10',
+      'dirreq-v3-resp': 'ok=800,not-enough-sigs=0,unavailable=4,not-found=0,not-modified=0,busy=0',
+      'cell-processed-cells': '10,9,8,7,6,5,4,3,2,1',
+      'cell-circuits-per-decile': '20',
+    }))
+
+    aggregator.add(get_relay_extrainfo_descriptor({
+      'entry-ips': 'de=16,??=8',
+      'exit-streams-opened': '80=20,6667=4',
+      'cell-processed-cells': '30,29,28,27,26,25,24,23,22,21',
+      'cell-circuits-per-decile': '10',
+    }))
+
+    aggregator.add(get_relay_extrainfo_descriptor())
+    aggregator.add(get_bridge_extrainfo_descriptor({'bridge-ips': 'us=8,ir=24'}))
+
+    self.assertEqual(4, aggregator.descriptors)
+    self.assertEqual({'us': 16, 'de': 24, '??': 8}, aggregator.get_counts('entry_ips'))
+    self.assertEqual({'us': 8, 'ir': 24}, aggregator.get_counts('bridge_ips'))
+    self.assertEqual({}, aggregator.get_counts('geoip_client_origins'))
+    self.assertEqual({80: 120, 443: 50, 6667: 4, 'other': 10}, aggregator.get_counts('exit_streams_opened'))
+    self.assertEqual({DirResponse.OK: 800, DirResponse.UNAVAILABLE: 4}, aggregator.get_counts('dir_v3_responses'))
+
+    self.assertEqual([20.0, 19.0, 18.0, 17.0, 16.0, 15.0, 14.0, 13.0, 12.0, 11.0], aggregator.get_means('cell_processed_cells'))
+    self.assertEqual(15.0, aggregator.get_means('cell_circuits_per_decile'))
+    self.assertEqual(None, aggregator.get_means('cell_queued_cells'))
+
+    self.assertEqual(2, aggregator.get_reporting('entry_ips'))
+    self.assertEqual(1, aggregator.get_reporting('dir_v3_responses'))
+    self.assertEqual(0, aggregator.get_reporting('cell_time_in_queue'))
+
+    self.assertRaises(ValueError, aggregator.get_counts, 'cell_processed_cells')
+    self.assertRaises(ValueError, aggregator.get_means, 'entry_ips')
+    self.assertRaises(ValueError, aggregator.get_reporting, 'nickname')
+
+    # descriptors only need our FIELDS
+
+    with open(get_resource('extrainfo_relay_descriptor'), 'rb') as descriptor_file:
+      desc = next(stem.descriptor.parse_file(descriptor_file, 'extra-info 1.0', fields = StatisticsAggregator.FIELDS))
+
+    aggregator = StatisticsAggregator()
+    aggregator.add(desc)
+
+    self.assertEqual(1, aggregator.descriptors)
+    self.assertEqual(None, desc.nickname)
+
   def test_port_mapping_lines(self):
     """
     Uses valid and invalid data to tests lines of the form...
@@ -617,6 +744,10 @@ k0d2aofcVbHr4fPQOSST0LXDrhFl5Fqo5um296zpJGvRUeO6S44U/EfJAGShtqWw
     self.assertEqual({'obfs3': (None, None, None), 'obfs4': (None, None, None)}, desc.transport)
     self.assertEqual([], desc.get_unrecognized_lines())
 
+  def _as_list(self, history):
+    start, values = history
+    return start, list(values)
+
   def _expect_invalid_attr(self, desc_text, attr = None, expected_value = None):
     """
     Asserts that construction will fail due to desc_text having a malformed
@@ -81,6 +81,25 @@ class TestMicrodescriptor(unittest.TestCase):
       self.assertEqual({b'@last-listed': b'2013-02-24 00:18:36'}, router.get_annotations())
       self.assertEqual([b'@last-listed 2013-02-24 00:18:36'], router.get_annotation_lines())
 
+  def test_local_microdescriptors_with_mmap(self):
+    """
+    Memory maps tor's cached-microdescs, checking that we get the same results
+    as when reading it.
+    """
+
+    descriptor_path = get_resource('cached-microdescs')
+    descriptors = list(stem.descriptor.parse_file(descriptor_path, 'microdescriptor 1.0', use_mmap = True))
+
+    with open(descriptor_path, 'rb') as descriptor_file:
+      expected = list(stem.descriptor.parse_file(descriptor_file, 'microdescriptor 1.0'))
+
+    self.assertEqual(3, len(descriptors))
+    self.assertEqual([desc.get_bytes() for desc in expected], [desc.get_bytes() for desc in descriptors])
+    self.assertEqual([desc.get_annotation_lines() for desc in expected], [desc.get_annotation_lines() for desc in descriptors])
+    self.assertEqual([desc.digest for desc in expected], [desc.digest for desc in descriptors])
+    self.assertEqual(SECOND_ONION_KEY, descriptors[1].onion_key)
+    self.assertEqual(['$6141629FA0D15A6AEAEF3A1BEB76E64C767B3174'], descriptors[1].family)
+
   def test_minimal_microdescriptor(self):
     """
     Basic sanity check that we can parse a microdescriptor with minimal
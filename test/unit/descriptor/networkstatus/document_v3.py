@@ -2,12 +2,20 @@
 Unit tests for the NetworkStatusDocumentV3 of stem.descriptor.networkstatus.
 """
 
+import base64
 import datetime
+import hashlib
 import io
+import os
+import shutil
+import tempfile
 import unittest
 
 import stem.descriptor
+import stem.prereq
+import stem.util.str_tools
 import stem.version
+import test.runner
 
 from stem import Flag, str_type
 
@@ -17,6 +25,7 @@ from stem.descriptor.networkstatus import (
   DEFAULT_PARAMS,
   DirectoryAuthority,
   NetworkStatusDocumentV3,
+  validate_file_signatures,
   _parse_file,
 )
 
@@ -29,6 +38,7 @@ from test.mocking import (
   get_router_status_entry_v3,
   get_router_status_entry_micro_v3,
   get_directory_authority,
+  get_key_certificate,
   get_network_status_document_v3,
   CRYPTO_BLOB,
   DOC_SIG,
@@ -37,6 +47,14 @@ from test.mocking import (
 
 from test.unit.descriptor import get_resource
 
+try:
+  # added in python 3.3
+  from unittest.mock import Mock, patch
+except ImportError:
+  from mock import Mock, patch
+
+KEY_CERT_FINGERPRINT = '27B6B5996C426270A5C95488AA5BCEB6BCC86956'
+
 BANDWIDTH_WEIGHT_ENTRIES = (
   'Wbd', 'Wbe', 'Wbg', 'Wbm',
   'Wdb',
@@ -70,6 +88,296 @@ class TestNetworkStatusDocument(unittest.TestCase):
         self.assertEqual(80, router.or_port)
         self.assertEqual(None, router.dir_port)
 
+  def test_metrics_consensus_with_workers(self):
+    """
+    Parses the router status entries of a consensus in a process pool.
+    """
+
+    consensus_path = get_resource('metrics_consensus')
+    expected = list(stem.descriptor.parse_file(consensus_path))
+    routers = list(stem.descriptor.parse_file(consensus_path, workers = 2))
+
+    self.assertEqual([str(router) for router in expected], [str(router) for router in routers])
+    self.assertEqual([router.fingerprint for router in expected], [router.fingerprint for router in routers])
+    self.assertEqual('sumkledi', routers[0].nickname)
+
+    # entries should share a single document
+
+    self.assertEqual(expected[0].document.valid_after, routers[0].document.valid_after)
+    self.assertTrue(all(router.document is routers[0].document for router in routers))
+
+  def test_metrics_consensus_with_fields(self):
+    """
+    Network status documents can't be parsed for only some fields.
+    """
+
+    consensus_path = get_resource('metrics_consensus')
+
+    for document_handler in (stem.descriptor.DocumentHandler.ENTRIES, stem.descriptor.DocumentHandler.DOCUMENT, stem.descriptor.DocumentHandler.BARE_DOCUMENT):
+      for workers in (None, 2):
+        descriptors = stem.descriptor.parse_file(consensus_path, document_handler = document_handler, workers = workers, fields = ('nickname',))
+        self.assertRaises(ValueError, list, descriptors)
+
+  def test_metrics_consensus_compact(self):
+    """
+    Parses a consensus, discarding content that's only needed to parse its
+    router status entries.
+    """
+
+    consensus_path = get_resource('metrics_consensus')
+    expected = list(stem.descriptor.parse_file(consensus_path, validate = True))
+
+    for validate in (True, False):
+      routers = list(stem.descriptor.parse_file(consensus_path, validate = validate, compact = True))
+
+      self.assertEqual([str(router) for router in expected], [str(router) for router in routers])
+
+      for router, expected_router in zip(routers, expected):
+        self.assertFalse('_entries' in router.__dict__)
+        self.assertEqual(expected_router.nickname, router.nickname)
+        self.assertEqual(expected_router.published, router.published)
+        self.assertEqual(expected_router.flags, router.flags)
+        self.assertEqual(expected_router.exit_policy, router.exit_policy)
+        self.assertEqual([], router.get_unrecognized_lines())
+
+    document = next(stem.descriptor.parse_file(consensus_path, document_handler = stem.descriptor.DocumentHandler.DOCUMENT, compact = True))
+    router = document.routers['0013D22389CD50D0B784A3E4061CB31E8CE8CEB5']
+
+    self.assertEqual('sumkledi', router.nickname)
+    self.assertEqual(['Exit', 'Fast', 'Named', 'Running', 'Valid'], router.flags)
+    self.assertFalse('_entries' in router.__dict__)
+
+    # attributes that are empty or unset are dropped, but still provided
+
+    for attr in ('_path', '_archive_path', '_lazy_loading', '_unrecognized_lines', 'dir_port', 'or_addresses'):
+      self.assertFalse(attr in router.__dict__)
+
+    self.assertEqual(None, router.dir_port)
+    self.assertEqual(False, router._lazy_loading)
+    self.assertEqual([], router.get_unrecognized_lines())
+
+    router.or_addresses.append(('2001:db8::1', 9001, True))
+    self.assertEqual([('2001:db8::1', 9001, True)], router.or_addresses)
+    self.assertTrue(all(other.or_addresses == [] for other in document.routers.values() if other is not router))
+
+  def test_lazy_routers(self):
+    """
+    Router status entries should only be parsed when they're accessed, while
+    still behaving like a dict.
+    """
+
+    with open(get_resource('cached-consensus'), 'rb') as consensus_file:
+      content = consensus_file.read()
+
+    expected = NetworkStatusDocumentV3(content, validate = True).routers
+
+    with patch('stem.descriptor.router_status_entry.RouterStatusEntryV3.__init__', Mock(side_effect = ValueError('parsed'))):
+      document = NetworkStatusDocumentV3(content)
+
+      self.assertEqual(9, len(document.routers))
+      self.assertTrue('0013D22389CD50D0B784A3E4061CB31E8CE8CEB5' in document.routers)
+      self.assertFalse('FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF' in document.routers)
+      self.assertEqual(list(expected.keys()), list(document.routers.keys()))
+      self.assertRaises(ValueError, document.routers.__getitem__, '0013D22389CD50D0B784A3E4061CB31E8CE8CEB5')
+
+    router = document.routers['0013D22389CD50D0B784A3E4061CB31E8CE8CEB5']
+
+    self.assertEqual('sumkledi', router.nickname)
+    self.assertTrue(router is document.routers['0013D22389CD50D0B784A3E4061CB31E8CE8CEB5'])
+    self.assertTrue(router.document is document)
+    self.assertEqual(None, document.routers.get('FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF'))
+    self.assertRaises(KeyError, document.routers.__getitem__, 'FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF')
+
+    self.assertEqual([str(entry) for entry in expected.values()], [str(entry) for entry in document.routers.values()])
+    self.assertEqual(expected, document.routers)
+    self.assertEqual(dict(expected), dict(document.routers))
+
+    routers_copy = document.routers.copy()
+    self.assertEqual(dict, type(routers_copy))
+    self.assertEqual(expected, routers_copy)
+
+    del routers_copy['0013D22389CD50D0B784A3E4061CB31E8CE8CEB5']
+    self.assertEqual(9, len(document.routers))
+
+    del document.routers['0013D22389CD50D0B784A3E4061CB31E8CE8CEB5']
+    self.assertEqual(8, len(document.routers))
+
+    document.routers['0013D22389CD50D0B784A3E4061CB31E8CE8CEB5'] = router
+    self.assertEqual(9, len(document.routers))
+    self.assertEqual(expected, document.routers)
+
+  def test_consensus_diff(self):
+    """
+    Makes and applies consensus diffs for a relay that changed, left, and
+    joined the consensus.
+    """
+
+    if not stem.prereq.is_sha3_available():
+      test.runner.skip(self, '(requires sha3)')
+      return
+
+    with open(get_resource('cached-consensus'), 'rb') as consensus_file:
+      content = consensus_file.read()
+
+    document = NetworkStatusDocumentV3(content)
+    lines = content.split(b'\n')
+    router_lines = [index for index, line in enumerate(lines) if line.startswith(b'r ')]
+
+    changed_lines = list(lines)
+    changed_lines[router_lines[0] + 1] = b's Exit Fast Running Valid'
+
+    removed_lines = list(lines)
+    del removed_lines[router_lines[0]:router_lines[1]]
+
+    for target_lines in (changed_lines, removed_lines):
+      target_content = b'\n'.join(target_lines)
+      target = NetworkStatusDocumentV3(target_content)
+
+      diff = document.diff(target)
+      self.assertTrue(diff.startswith('network-status-diff-version 1\nhash '))
+
+      result = document.apply_diff(diff, validate = True)
+      self.assertEqual(target_content, result.get_bytes())
+      self.assertEqual(sorted(target.routers.keys()), sorted(result.routers.keys()))
+      self.assertTrue(all(router.document is result for router in result.routers.values()))
+
+      # and in reverse, which adds a relay if we removed one
+
+      result = target.apply_diff(target.diff(document), validate = True)
+      self.assertEqual(content, result.get_bytes())
+      self.assertEqual(['Exit', 'Fast', 'Named', 'Running', 'Valid'], result.routers['0013D22389CD50D0B784A3E4061CB31E8CE8CEB5'].flags)
+
+    # entries we copy are only parsed if they haven't been already, so the
+    # relay that's removed never is
+
+    lazy_document = NetworkStatusDocumentV3(content)
+    removed_fingerprint = list(lazy_document.routers)[0]
+    lazy_document.apply_diff(lazy_document.diff(NetworkStatusDocumentV3(b'\n'.join(removed_lines))))
+    self.assertEqual([removed_fingerprint], list(lazy_document.routers._spans.keys()))
+
+    # only changed entries should be parsed
+
+    list(document.routers.values())
+    target = NetworkStatusDocumentV3(b'\n'.join(changed_lines))
+    diff = document.diff(target)
+
+    self.assertEqual(3, len(diff.splitlines()[2:]))
+
+    with patch('stem.descriptor.router_status_entry.RouterStatusEntryV3.__init__', Mock(side_effect = ValueError('parsed'))):
+      self.assertRaises(ValueError, document.apply_diff, diff)
+
+    diff = document.diff(NetworkStatusDocumentV3(b'\n'.join(lines)))
+
+    with patch('stem.descriptor.router_status_entry.RouterStatusEntryV3.__init__', Mock(side_effect = ValueError('parsed'))):
+      self.assertEqual(content, document.apply_diff(diff).get_bytes())
+
+  def test_validate_signatures(self):
+    """
+    Checks the signatures of a document that we sign.
+    """
+
+    if not stem.prereq.is_crypto_available():
+      test.runner.skip(self, '(requires pycrypto)')
+      return
+
+    key_cert, signing_key = _make_key_certificate()
+    other_key_cert, other_signing_key = _make_key_certificate()
+
+    for method in (None, 'sha1', 'sha256'):
+      content = _sign_document(get_network_status_document_v3(exclude = ('directory-signature',), content = True), signing_key, method)
+      document = NetworkStatusDocumentV3(content)
+
+      self.assertEqual(document.signatures, document.validate_signatures([other_key_cert, key_cert]))
+      self.assertRaises(ValueError, document.validate_signatures, [other_key_cert])
+      self.assertRaises(ValueError, document.validate_signatures, [])
+
+      tampered = NetworkStatusDocumentV3(content.replace(b'valid-after 2012-09-02 22:00:00', b'valid-after 2012-09-02 23:00:00'))
+      self.assertRaises(ValueError, tampered.validate_signatures, [key_cert])
+
+    # signing keys larger than 1024 bits have larger signatures
+
+    large_key_cert, large_signing_key = _make_key_certificate(2048)
+    document = NetworkStatusDocumentV3(_sign_document(get_network_status_document_v3(exclude = ('directory-signature',), content = True), large_signing_key))
+
+    self.assertEqual(document.signatures, document.validate_signatures([large_key_cert]))
+    self.assertRaises(ValueError, document.validate_signatures, [key_cert])
+
+    # signed by one of two authorities, which isn't a majority
+
+    content = get_network_status_document_v3(exclude = ('directory-signature',), authorities = (get_directory_authority(), get_directory_authority()), content = True)
+    document = NetworkStatusDocumentV3(_sign_document(content, signing_key))
+    self.assertRaises(ValueError, document.validate_signatures, [key_cert])
+
+  def test_validate_file_signatures(self):
+    """
+    Checks the signatures of documents on disk.
+    """
+
+    if not stem.prereq.is_crypto_available():
+      test.runner.skip(self, '(requires pycrypto)')
+      return
+
+    key_cert, signing_key = _make_key_certificate()
+    content = _sign_document(get_network_status_document_v3(exclude = ('directory-signature',), content = True), signing_key)
+
+    temp_directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, temp_directory)
+
+    valid_path = os.path.join(temp_directory, 'valid')
+    invalid_path = os.path.join(temp_directory, 'invalid')
+    missing_path = os.path.join(temp_directory, 'missing')
+
+    with open(valid_path, 'wb') as document_file:
+      document_file.write(content)
+
+    with open(invalid_path, 'wb') as document_file:
+      document_file.write(content.replace(b'valid-after 2012-09-02 22:00:00', b'valid-after 2012-09-02 23:00:00'))
+
+    paths = [valid_path, invalid_path, missing_path, valid_path]
+
+    for workers in (None, 2):
+      results = list(validate_file_signatures(paths, [key_cert], workers = workers))
+
+      self.assertEqual(paths, [path for path, _, _ in results])
+      self.assertEqual([1, 0, 0, 1], [len(signatures) for _, signatures, _ in results])
+      self.assertEqual(None, results[0][2])
+      self.assertTrue(isinstance(results[1][2], ValueError))
+      self.assertTrue(isinstance(results[2][2], IOError))
+
+  def test_consensus_diff_malformed(self):
+    """
+    Applies consensus diffs that are malformed or for a different document.
+    """
+
+    if not stem.prereq.is_sha3_available():
+      test.runner.skip(self, '(requires sha3)')
+      return
+
+    with open(get_resource('cached-consensus'), 'rb') as consensus_file:
+      document = NetworkStatusDocumentV3(consensus_file.read())
+
+    diff = document.diff(document)
+    hash_line = diff.splitlines()[1]
+
+    test_values = (
+      '',
+      'network-status-diff-version 2\n%s\n' % hash_line,
+      'network-status-diff-version 1\nhash ABCD\n',
+      'network-status-diff-version 1\nhash %s %s\n' % ('0' * 64, '0' * 64),
+      'network-status-diff-version 1\n%s\n37x\n' % hash_line,
+      'network-status-diff-version 1\n%s\n37c\ns Running\n' % hash_line,
+      'network-status-diff-version 1\n%s\n5d\n37d\n' % hash_line,
+      'network-status-diff-version 1\n%s\n37d\n' % hash_line,
+    )
+
+    for test_value in test_values:
+      self.assertRaises(ValueError, document.apply_diff, test_value)
+
+    # we can't check the digests without sha3
+
+    with patch('stem.prereq.is_sha3_available', Mock(return_value = False)):
+      self.assertRaises(ImportError, document.apply_diff, diff)
+
   def test_consensus_v3(self):
     """
     Checks that version 3 consensus documents are properly parsed.
@@ -1163,3 +1471,44 @@ DnN5aFtYKiTc19qIC7Nmo+afPdDEf0MlJvEOP5EWl3w=
 
     document = NetworkStatusDocumentV3(content, validate = False)
     self.assertEqual((authority,), document.directory_authorities)
+
+
+def _make_key_certificate(key_size = 1024):
+  """
+  Provides a key certificate with a newly generated signing key, along with
+  a (private key, key digest) tuple for making signatures with it.
+  """
+
+  from Crypto.PublicKey import RSA
+  from Crypto.Util import asn1
+
+  private_key = RSA.generate(key_size)
+  key_as_der = asn1.DerSequence([private_key.n, private_key.e]).encode()
+  key_as_pem = '\n-----BEGIN RSA PUBLIC KEY-----\n%s\n-----END RSA PUBLIC KEY-----' % _wrap_base64(key_as_der)
+
+  key_cert = get_key_certificate({'dir-signing-key': key_as_pem})
+  return key_cert, (private_key, hashlib.sha1(key_as_der).hexdigest().upper())
+
+
+def _sign_document(content, signing_key, method = None):
+  """
+  Appends a directory signature to a document that lacks one.
+  """
+
+  from Crypto.Util.number import bytes_to_long, long_to_bytes
+
+  private_key, key_digest = signing_key
+  content = content.rstrip(b'\n') + b'\ndirectory-signature '
+  digest = hashlib.new(method if method else 'sha1', content).digest()
+
+  block_size = len(long_to_bytes(private_key.n))
+  padded = b'\x00\x01' + b'\xff' * (block_size - len(digest) - 3) + b'\x00' + digest
+  signature = long_to_bytes(pow(bytes_to_long(padded), private_key.d, private_key.n), block_size)
+
+  signature_line = ' '.join(([method] if method else []) + [KEY_CERT_FINGERPRINT, key_digest])
+  return content + stem.util.str_tools._to_bytes('%s\n-----BEGIN SIGNATURE-----\n%s\n-----END SIGNATURE-----\n' % (signature_line, _wrap_base64(signature)))
+
+
+def _wrap_base64(content):
+  encoded = stem.util.str_tools._to_unicode(base64.b64encode(content))
+  return '\n'.join([encoded[i:i + 64] for i in range(0, len(encoded), 64)])
@@ -0,0 +1,94 @@
+"""
+Unit tests for stem.descriptor.profiler.
+"""
+
+import re
+import unittest
+
+import stem.descriptor
+
+from stem.descriptor.profiler import ParserProfiler
+
+from test.unit.descriptor import get_resource
+
+
+class TestParserProfiler(unittest.TestCase):
+  def tearDown(self):
+    stem.descriptor._PROFILER = None
+
+  def test_lazy_loading(self):
+    """
+    Records the parsers of attributes that we lazy load.
+    """
+
+    with ParserProfiler() as profiler:
+      for desc in stem.descriptor.parse_file(get_resource('metrics_server_desc_multiple')):
+        desc.exit_policy
+        desc.platform
+
+    stats = dict(((entry.descriptor_type, entry.parser), entry) for entry in profiler.stats())
+
+    self.assertEqual(2, stats[('RelayDescriptor', '_parse_exit_policy')].count)
+    self.assertEqual(2, stats[('RelayDescriptor', '_parse_platform_line')].count)
+    self.assertTrue(('RelayDescriptor', '_parse_contact_line') not in stats)
+    self.assertTrue(all([entry.runtime >= 0 for entry in stats.values()]))
+
+  def test_validated(self):
+    """
+    Records parsers that run as validated descriptors are constructed.
+    """
+
+    with ParserProfiler() as profiler:
+      with open(get_resource('extrainfo_relay_descriptor'), 'rb') as descriptor_file:
+        desc = next(stem.descriptor.parse_file(descriptor_file, 'extra-info 1.0', validate = True))
+
+    stats = dict(((entry.descriptor_type, entry.parser), entry.count) for entry in profiler.stats())
+
+    self.assertEqual(1, stats[('RelayExtraInfoDescriptor', '_parse_extra_info_line')])
+    self.assertEqual(1, stats[('RelayExtraInfoDescriptor', '_parse_read_history_line')])
+    self.assertEqual(1, stats[('RelayExtraInfoDescriptor', '_parse_router_signature_line')])
+    self.assertEqual(['RelayExtraInfoDescriptor'], list(profiler.runtime_by_type().keys()))
+
+    # parsing after we've stopped isn't included
+
+    desc = next(stem.descriptor.parse_file(get_resource('metrics_server_desc_multiple')))
+    desc.exit_policy
+
+    self.assertEqual(['RelayExtraInfoDescriptor'], list(profiler.runtime_by_type().keys()))
+
+  def test_report(self):
+    """
+    Provides a table of our statistics.
+    """
+
+    profiler = ParserProfiler()
+    self.assertEqual(['Descriptor Type', 'Parser', 'Calls', 'Runtime', 'Per Call'], re.split(' {2,}', profiler.report()))
+
+    with profiler:
+      for desc in stem.descriptor.parse_file(get_resource('cached-consensus')):
+        desc.flags
+
+    report_lines = profiler.report().splitlines()
+
+    self.assertTrue(report_lines[0].startswith('Descriptor Type'))
+    self.assertTrue(any([line.startswith('RouterStatusEntryV3') and '_parse_s_line' in line for line in report_lines]))
+    self.assertTrue(any([line.startswith('RouterStatusEntryV3') and ' total ' in line for line in report_lines]))
+
+    profiler.reset()
+    self.assertEqual([], profiler.stats())
+
+  def test_only_one_running(self):
+    """
+    Only one profiler can run at a time.
+    """
+
+    profiler = ParserProfiler()
+    other_profiler = ParserProfiler()
+
+    with profiler:
+      self.assertRaises(ValueError, other_profiler.start)
+      profiler.start()  # starting again is a no-op
+
+    other_profiler.start()
+    other_profiler.stop()
+    self.assertEqual(None, stem.descriptor._PROFILER)
@@ -405,6 +405,22 @@ class TestDescriptorReader(unittest.TestCase):
       read_descriptors = [str(desc) for desc in list(reader)]
       self.assertEqual(expected_results, read_descriptors)
 
+  def test_archived_with_workers(self):
+    """
+    Reads an archive's descriptors in a process pool.
+    """
+
+    expected_results = _get_raw_tar_descriptors()
+    test_path = os.path.join(DESCRIPTOR_TEST_DATA, 'descriptor_archive.tar')
+
+    with stem.descriptor.reader.DescriptorReader(test_path, workers = 2) as reader:
+      read_descriptors = list(reader)
+
+    self.assertEqual(expected_results, [str(desc) for desc in read_descriptors])
+
+    for desc in read_descriptors:
+      self.assertEqual(test_path, desc.get_path())
+
   def test_stop(self):
     """
     Runs a DescriptorReader over the root directory, then checks that calling
@@ -0,0 +1,126 @@
+"""
+Unit tests for stem.descriptor.relay_selection.
+"""
+
+import random
+import unittest
+
+import stem.descriptor
+
+from stem.descriptor import DocumentHandler
+from stem.descriptor.relay_selection import Position, RelaySelector
+from stem.descriptor.router_status_entry import RouterStatusEntryV3
+
+from test.unit.descriptor import get_resource
+
+SUMKLEDI = '0013D22389CD50D0B784A3E4061CB31E8CE8CEB5'
+PH3X = '00C2C2A16AEDB51D5E5FB7D6168FC66B343D822F'
+NARGOTHROND = '00D8BFAF9446854C5F677B229A50D716B7F63BAF'
+EXIT_111111 = '00EEF41B6B4AAC069C8E32084ED4A6CC016B4ACF'
+
+
+class TestRelaySelector(unittest.TestCase):
+  def setUp(self):
+    with open(get_resource('cached-consensus'), 'rb') as consensus_file:
+      self.consensus = next(stem.descriptor.parse_file(consensus_file, 'network-status-consensus-3 1.0', document_handler = DocumentHandler.DOCUMENT))
+
+  def test_relays(self):
+    """
+    Checks the relays that are eligible for each position.
+    """
+
+    selector = RelaySelector(self.consensus)
+
+    self.assertEqual(set([PH3X, NARGOTHROND]), set([relay.fingerprint for relay in selector.relays(Position.GUARD)]))
+    self.assertEqual(set([SUMKLEDI, EXIT_111111]), set([relay.fingerprint for relay in selector.relays(Position.EXIT)]))
+    self.assertEqual(9, len(selector.relays(Position.MIDDLE)))
+
+  def test_get_probability(self):
+    """
+    Checks that probabilities are scaled by the consensus' bandwidth-weights.
+    """
+
+    selector = RelaySelector(self.consensus)
+
+    self.assertAlmostEqual(38.0 / 67, selector.get_probability(SUMKLEDI, Position.EXIT))
+    self.assertAlmostEqual(29.0 / 67, selector.get_probability(EXIT_111111, Position.EXIT))
+    self.assertAlmostEqual(55300.0 / 55843, selector.get_probability(PH3X, Position.GUARD))
+    self.assertEqual(0.0, selector.get_probability(SUMKLEDI, Position.GUARD))
+    self.assertEqual(0.0, selector.get_probability('FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF', Position.GUARD))
+
+    # Wme is zero, so exits are never middle relays
+
+    self.assertEqual(0.0, selector.get_probability(SUMKLEDI, Position.MIDDLE))
+    self.assertAlmostEqual(1.0, sum(selector.get_probability(relay.fingerprint, Position.MIDDLE) for relay in selector.relays(Position.MIDDLE)))
+
+  def test_select(self):
+    """
+    Selects relays in proportion to their weight.
+    """
+
+    selector = RelaySelector(self.consensus, rng = random.Random(42))
+    selections = [selector.select(Position.EXIT).fingerprint for i in range(2000)]
+
+    self.assertEqual(set([SUMKLEDI, EXIT_111111]), set(selections))
+    self.assertTrue(0.5 < float(selections.count(SUMKLEDI)) / len(selections) < 0.63)
+
+    for i in range(100):
+      self.assertNotEqual(SUMKLEDI, selector.select(Position.MIDDLE).fingerprint)
+
+  def test_select_with_exclusions(self):
+    """
+    Doesn't select relays that are excluded, or in their family or /16.
+    """
+
+    selector = RelaySelector(self.consensus, rng = random.Random(42))
+    ph3x, nargothrond = self.consensus.routers[PH3X], self.consensus.routers[NARGOTHROND]
+
+    for i in range(20):
+      self.assertEqual(NARGOTHROND, selector.select(Position.GUARD, [ph3x]).fingerprint)
+
+    self.assertRaises(ValueError, selector.select, Position.GUARD, [ph3x, nargothrond])
+
+    # relays are only in the same family if each lists the other
+
+    families = {SUMKLEDI: ['$' + EXIT_111111], EXIT_111111: [SUMKLEDI.lower()]}
+    selector = RelaySelector(self.consensus, families = families)
+    self.assertRaises(ValueError, selector.select, Position.EXIT, [self.consensus.routers[SUMKLEDI]])
+
+    selector = RelaySelector(self.consensus, families = {SUMKLEDI: [EXIT_111111]})
+    self.assertEqual(EXIT_111111, selector.select(Position.EXIT, [self.consensus.routers[SUMKLEDI]]).fingerprint)
+
+    # exclude a /16 by making a relay that shares it
+
+    ph3x_neighbor = RouterStatusEntryV3(ph3x.get_bytes().replace(b'86.59.119.83', b'178.218.1.1'))
+    self.assertEqual(EXIT_111111, selector.select(Position.EXIT, [ph3x_neighbor]).fingerprint)
+
+    selector = RelaySelector(self.consensus, distinct_subnets = False)
+    selections = set([selector.select(Position.EXIT, [ph3x_neighbor]).fingerprint for i in range(50)])
+    self.assertEqual(set([SUMKLEDI, EXIT_111111]), selections)
+
+  def test_select_path(self):
+    """
+    Selects paths of distinct relays.
+    """
+
+    selector = RelaySelector(self.consensus, rng = random.Random(42))
+
+    for i in range(50):
+      guard, middle, exit = selector.select_path()
+
+      self.assertTrue(guard.fingerprint in (PH3X, NARGOTHROND))
+      self.assertTrue(exit.fingerprint in (SUMKLEDI, EXIT_111111))
+      self.assertEqual(3, len(set([guard.fingerprint, middle.fingerprint, exit.fingerprint])))
+
+  def test_bare_document(self):
+    """
+    Documents without router status entries have nothing to select.
+    """
+
+    with open(get_resource('cached-consensus'), 'rb') as consensus_file:
+      consensus = next(stem.descriptor.parse_file(consensus_file, 'network-status-consensus-3 1.0', document_handler = DocumentHandler.BARE_DOCUMENT))
+
+    selector = RelaySelector(consensus)
+
+    self.assertEqual([], selector.relays(Position.GUARD))
+    self.assertRaises(ValueError, selector.select_path)
@@ -6,7 +6,7 @@ import datetime
 import unittest
 
 from stem import Flag
-from stem.descriptor.router_status_entry import RouterStatusEntryV3, _base64_to_hex
+from stem.descriptor.router_status_entry import FLAG_BITS, RouterStatusEntryV3, filter_by_flags, flag_mask, _base64_to_hex
 from stem.exit_policy import MicroExitPolicy
 from stem.version import Version
 
@@ -374,6 +374,42 @@ class TestRouterStatusEntry(unittest.TestCase):
       content = get_router_status_entry_v3({'s': s_line}, content = True)
       self._expect_invalid_attr(content, 'flags', expected)
 
+  def test_flag_mask(self):
+    """
+    Checks the bitmask of our flags.
+    """
+
+    entry = get_router_status_entry_v3({'s': 'Fast Valid Ugabuga'})
+
+    self.assertEqual(FLAG_BITS[Flag.FAST] | FLAG_BITS[Flag.VALID], entry.flag_mask)
+    self.assertEqual(entry.flag_mask, flag_mask([Flag.VALID, Flag.FAST, 'Ugabuga']))
+    self.assertEqual(0, get_router_status_entry_v3({'s': ''}).flag_mask)
+    self.assertEqual(len(list(Flag)), len(set(FLAG_BITS.values())))
+
+  def test_filter_by_flags(self):
+    """
+    Filters entries by the flags they have.
+    """
+
+    fast = get_router_status_entry_v3({'s': 'Fast Running'})
+    exit = get_router_status_entry_v3({'s': 'Exit Fast Running'})
+    bad_exit = get_router_status_entry_v3({'s': 'BadExit Exit Running Ugabuga'})
+    guard = get_router_status_entry_v3({'s': 'Guard Stable'})
+    entries = [fast, exit, bad_exit, guard]
+
+    self.assertEqual(entries, filter_by_flags(entries))
+    self.assertEqual([fast, exit], filter_by_flags(entries, [Flag.FAST, Flag.RUNNING]))
+    self.assertEqual([exit], filter_by_flags(entries, [Flag.EXIT], exclude_flags = [Flag.BADEXIT]))
+    self.assertEqual([exit, bad_exit, guard], filter_by_flags(entries, any_flags = [Flag.EXIT, Flag.GUARD]))
+    self.assertEqual([], filter_by_flags(entries, [Flag.GUARD], any_flags = [Flag.EXIT]))
+
+    # flags we don't have bits for
+
+    self.assertEqual([bad_exit], filter_by_flags(entries, ['Ugabuga']))
+    self.assertEqual([fast, exit, bad_exit], filter_by_flags(entries, any_flags = ['Ugabuga', Flag.FAST]))
+    self.assertEqual([fast], filter_by_flags(entries, any_flags = ['Ugabuga', Flag.FAST], exclude_flags = [Flag.EXIT]))
+    self.assertEqual([fast, exit], filter_by_flags(entries, [Flag.RUNNING], exclude_flags = ['Ugabuga']))
+
   def test_versions(self):
     """
     Handles a variety of version inputs.
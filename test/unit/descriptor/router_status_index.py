@@ -0,0 +1,185 @@
+"""
+Unit tests for stem.descriptor.router_status_index.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import stem.descriptor
+
+from stem.descriptor.router_status_entry import RouterStatusEntryV3
+from stem.descriptor.router_status_index import RouterStatusIndex
+
+from test.unit.descriptor import get_resource
+
+try:
+  # added in python 3.3
+  from unittest.mock import patch
+except ImportError:
+  from mock import patch
+
+
+class TestRouterStatusIndex(unittest.TestCase):
+  def setUp(self):
+    self.temp_directory = tempfile.mkdtemp()
+    self.consensus_path = os.path.join(self.temp_directory, 'cached-consensus')
+    shutil.copyfile(get_resource('cached-consensus'), self.consensus_path)
+
+  def tearDown(self):
+    shutil.rmtree(self.temp_directory)
+
+  def test_cached_consensus(self):
+    """
+    Provides the same router status entries as reading the whole consensus.
+    """
+
+    with open(self.consensus_path, 'rb') as descriptor_file:
+      expected = list(stem.descriptor.parse_file(descriptor_file, 'network-status-consensus-3 1.0'))
+
+    index = RouterStatusIndex(self.consensus_path, validate = True)
+
+    self.assertEqual(len(expected), len(index))
+    self.assertEqual([entry.fingerprint for entry in expected], index.fingerprints())
+
+    for expected_entry in expected:
+      entry = index.get(expected_entry.fingerprint)
+
+      self.assertTrue(isinstance(entry, RouterStatusEntryV3))
+      self.assertEqual(str(expected_entry), str(entry))
+      self.assertEqual(expected_entry.nickname, entry.nickname)
+      self.assertEqual(expected_entry.flags, entry.flags)
+      self.assertTrue(entry.document is index.get_document())
+
+    document = index.get_document()
+    self.assertEqual(expected[0].document.valid_after, document.valid_after)
+    self.assertEqual({}, document.routers)
+    self.assertEqual(os.path.abspath(self.consensus_path), document.get_path())
+
+    fingerprint = expected[0].fingerprint
+    self.assertTrue(fingerprint in index)
+    self.assertTrue(fingerprint.lower() in index)
+    self.assertEqual(expected[0].nickname, index.get(fingerprint.lower()).nickname)
+
+    self.assertFalse('9695DFC35FFEB861329B9F1AB04C46397020CE31' in index)
+    self.assertEqual(None, index.get('9695DFC35FFEB861329B9F1AB04C46397020CE31'))
+    self.assertEqual('nope', index.get('9695DFC35FFEB861329B9F1AB04C46397020CE31', 'nope'))
+
+  def test_saved_index(self):
+    """
+    Reads the offsets we saved rather than scanning the consensus again, unless
+    it has been modified.
+    """
+
+    index = RouterStatusIndex(self.consensus_path)
+    self.assertEqual(self.consensus_path + '.index', index.index_path)
+    self.assertTrue(os.path.exists(index.index_path))
+
+    with patch('stem.descriptor.router_status_index.RouterStatusIndex._scan') as scan_mock:
+      saved_index = RouterStatusIndex(self.consensus_path)
+      self.assertFalse(scan_mock.called)
+
+    self.assertEqual(index.fingerprints(), saved_index.fingerprints())
+    self.assertEqual(index._sections, saved_index._sections)
+
+    for fingerprint in index.fingerprints():
+      self.assertEqual(str(index.get(fingerprint)), str(saved_index.get(fingerprint)))
+
+    # prepending an annotation shifts all of the entries
+
+    with open(self.consensus_path, 'rb') as consensus_file:
+      content = consensus_file.read()
+
+    with open(self.consensus_path, 'wb') as consensus_file:
+      consensus_file.write(b'@type network-status-consensus-3 1.0\n' + content)
+
+    modified_index = RouterStatusIndex(self.consensus_path)
+    self.assertEqual(index.fingerprints(), modified_index.fingerprints())
+
+    for fingerprint in index.fingerprints():
+      self.assertEqual(str(index.get(fingerprint)), str(modified_index.get(fingerprint)))
+
+  def test_replaced_document(self):
+    """
+    Scans the consensus again when it's replaced, whichever method we're
+    asked for first.
+    """
+
+    with open(self.consensus_path, 'rb') as consensus_file:
+      content = consensus_file.read()
+
+    lines = content.split(b'\n')
+    router_lines = [index for index, line in enumerate(lines) if line.startswith(b'r ')]
+    replacement = b'\n'.join(lines[:router_lines[0]] + lines[router_lines[1]:])
+
+    for check in ('fingerprints', 'contains', 'len'):
+      with open(self.consensus_path, 'wb') as consensus_file:
+        consensus_file.write(content)
+
+      index = RouterStatusIndex(self.consensus_path)
+      self.assertEqual(9, len(index))
+
+      replacement_path = self.consensus_path + '.new'
+
+      with open(replacement_path, 'wb') as consensus_file:
+        consensus_file.write(replacement)
+
+      os.rename(replacement_path, self.consensus_path)
+
+      if check == 'fingerprints':
+        self.assertEqual(8, len(index.fingerprints()))
+      elif check == 'contains':
+        self.assertFalse('0013D22389CD50D0B784A3E4061CB31E8CE8CEB5' in index)
+      else:
+        self.assertEqual(8, len(index))
+
+      self.assertEqual(None, index.get('0013D22389CD50D0B784A3E4061CB31E8CE8CEB5'))
+
+  def test_unsaved_index(self):
+    """
+    Constructs an index without saving it, or when we can't write it.
+    """
+
+    index = RouterStatusIndex(self.consensus_path, save = False)
+    self.assertEqual(None, index.index_path)
+    self.assertEqual(['cached-consensus'], os.listdir(self.temp_directory))
+
+    index_path = os.path.join(self.temp_directory, 'no_such_directory', 'index')
+    index = RouterStatusIndex(self.consensus_path, index_path = index_path)
+    self.assertEqual(index_path, index.index_path)
+    self.assertEqual(['cached-consensus'], os.listdir(self.temp_directory))
+    self.assertEqual(9, len(index))
+
+  def test_malformed_index(self):
+    """
+    Scans the consensus again if our saved offsets are malformed.
+    """
+
+    index_path = self.consensus_path + '.index'
+
+    with open(index_path, 'w') as index_file:
+      index_file.write('stem-router-status-index 1\nnot an index\n')
+
+    index = RouterStatusIndex(self.consensus_path)
+    self.assertEqual(9, len(index))
+
+    with open(index_path) as index_file:
+      self.assertEqual(12, len(index_file.read().splitlines()))
+
+  def test_malformed_r_line(self):
+    """
+    Router status entries without a valid identity can't be indexed.
+    """
+
+    with open(self.consensus_path, 'rb') as consensus_file:
+      content = consensus_file.read()
+
+    with open(self.consensus_path, 'wb') as consensus_file:
+      consensus_file.write(content.replace(b'r sumkledi ABPSI4nNUNC3hKPkBhyzHozozrU', b'r sumkledi ABPSI4nNUNC3hKPkBhyzHozozr'))
+
+    self.assertRaises(ValueError, RouterStatusIndex, self.consensus_path, True)
+
+    index = RouterStatusIndex(self.consensus_path)
+    self.assertEqual(8, len(index))
+    self.assertFalse('0013D22389CD50D0B784A3E4061CB31E8CE8CEB5' in index)
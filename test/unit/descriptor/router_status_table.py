@@ -0,0 +1,219 @@
+"""
+Unit tests for stem.descriptor.router_status_table.
+"""
+
+import binascii
+import calendar
+import unittest
+
+import stem.descriptor
+
+from stem import Flag
+from stem.descriptor import DocumentHandler
+from stem.descriptor.router_status_table import FLAG_BITS, DigestColumn, RouterStatusTable
+
+from test.mocking import (
+  get_router_status_entry_v3,
+  get_router_status_entry_micro_v3,
+)
+
+from test.unit.descriptor import get_resource
+
+
+class TestRouterStatusTable(unittest.TestCase):
+  def test_cached_consensus(self):
+    """
+    Checks that a table has the same attributes as the router status entries
+    of the document.
+    """
+
+    consensus_path = get_resource('cached-consensus')
+
+    with open(consensus_path, 'rb') as descriptor_file:
+      entries = list(stem.descriptor.parse_file(descriptor_file, 'network-status-consensus-3 1.0'))
+
+    with open(consensus_path, 'rb') as descriptor_file:
+      tables = list(stem.descriptor.parse_file(descriptor_file, 'network-status-consensus-3 1.0', document_handler = DocumentHandler.COLUMNAR))
+
+    self.assertEqual(1, len(tables))
+
+    table = tables[0]
+    self.assertEqual(len(entries), len(table))
+    self.assertEqual(consensus_path, table.get_path())
+    self.assertEqual(12, table.document.consensus_method)
+
+    for index, entry in enumerate(entries):
+      row = table.get_row(index)
+
+      self.assertEqual(entry.nickname, row['nickname'])
+      self.assertEqual(entry.fingerprint, row['fingerprint'])
+      self.assertEqual(entry.digest, row['digest'])
+      self.assertEqual(calendar.timegm(entry.published.timetuple()), row['published'])
+      self.assertEqual(entry.or_port, row['or_port'])
+      self.assertEqual(entry.dir_port or 0, row['dir_port'])
+      self.assertEqual(set(entry.flags), set(row['flags']))
+      self.assertEqual(entry.version_line, row['version_line'])
+      self.assertEqual(entry.bandwidth or 0, row['bandwidth'])
+      self.assertEqual(entry.measured or 0, row['measured'])
+
+    row = table.get_row(0)
+    self.assertEqual('sumkledi', row['nickname'])
+    self.assertEqual(3000686053, row['address'])  # 178.218.213.229
+
+  def test_to_table(self):
+    """
+    Makes a table from a document that we've already read.
+    """
+
+    with open(get_resource('cached-consensus'), 'rb') as descriptor_file:
+      document = next(stem.descriptor.parse_file(descriptor_file, 'network-status-consensus-3 1.0', document_handler = DocumentHandler.DOCUMENT))
+
+    table = document.to_table()
+
+    self.assertTrue(table.document is document)
+    self.assertEqual([router.fingerprint for router in document.routers.values()], list(table.fingerprint))
+
+  def test_matches(self):
+    """
+    Selects relays by their flags.
+    """
+
+    table = RouterStatusTable(self._content(
+      ('relay1', 'Exit Fast Guard Running', 'Bandwidth=10 Measured=15'),
+      ('relay2', 'Fast Guard Running', 'Bandwidth=20'),
+      ('relay3', 'Exit Running', 'Bandwidth=40 Measured=30'),
+    ), validate = True)
+
+    self.assertEqual([0, 1, 2], table.matches())
+    self.assertEqual([0, 1], table.matches(flags = [Flag.GUARD]))
+    self.assertEqual([0], table.matches(flags = [Flag.GUARD, Flag.EXIT]))
+    self.assertEqual([1], table.matches(flags = [Flag.GUARD], exclude_flags = [Flag.EXIT]))
+    self.assertEqual([2], table.matches(exclude_flags = [Flag.FAST]))
+    self.assertEqual([], table.matches(flags = [Flag.AUTHORITY]))
+    self.assertEqual([], table.matches(flags = ['NotAFlag']))
+    self.assertEqual([0, 1, 2], table.matches(exclude_flags = ['NotAFlag']))
+
+    self.assertEqual(70, table.bandwidth_total())
+    self.assertEqual(45, table.bandwidth_total(measured = True))
+    self.assertEqual(30, table.bandwidth_total(flags = [Flag.GUARD]))
+    self.assertEqual(50, table.bandwidth_total(flags = [Flag.EXIT]))
+    self.assertEqual(45, table.bandwidth_total(flags = [Flag.EXIT], measured = True))
+    self.assertEqual(20, table.bandwidth_total(flags = [Flag.GUARD], exclude_flags = [Flag.EXIT]))
+    self.assertEqual(0, table.bandwidth_total(flags = ['NotAFlag']))
+
+    self.assertEqual(FLAG_BITS[Flag.EXIT] | FLAG_BITS[Flag.FAST], table.flag_mask([Flag.EXIT, Flag.FAST]))
+    self.assertEqual(None, table.flag_mask(['NotAFlag']))
+
+  def test_unrecognized_flags(self):
+    """
+    Includes flags that aren't amongst our stem.Flag enumeration.
+    """
+
+    table = RouterStatusTable(self._content(
+      ('relay1', 'Fast Pumpkin', 'Bandwidth=10'),
+      ('relay2', 'Pumpkin Running', 'Bandwidth=20'),
+    ), validate = True)
+
+    self.assertEqual(len(FLAG_BITS) + 1, len(table.flag_bits))
+    self.assertEqual([Flag.FAST, 'Pumpkin'], table.get_flags(0))
+    self.assertEqual([Flag.RUNNING, 'Pumpkin'], table.get_flags(1))
+    self.assertEqual(30, table.bandwidth_total(flags = ['Pumpkin']))
+
+  def test_microdescriptor_flavored(self):
+    """
+    Reads router status entries from a microdescriptor flavored consensus.
+    """
+
+    content = get_router_status_entry_micro_v3(content = True)
+    table = RouterStatusTable(content, validate = True, is_microdescriptor = True)
+
+    self.assertEqual(1, len(table))
+    self.assertEqual('Konata', table.nickname[0])
+    self.assertEqual('011209176CDBAA2AC1F48C2C5B4990CE771C5B0C', table.fingerprint[0])
+    self.assertEqual(None, table.digest[0])
+    self.assertEqual([Flag.FAST, Flag.GUARD, Flag.HSDIR, Flag.NAMED, Flag.RUNNING, Flag.STABLE, Flag.V2DIR, Flag.VALID], table.get_flags(0))
+
+  def test_malformed_entry(self):
+    """
+    Includes a router status entry with an invalid address.
+    """
+
+    valid_entry = get_router_status_entry_v3({'s': 'Fast Running'}, content = True)
+    malformed_entry = get_router_status_entry_v3({'r': 'Konata ARIJF2zbqirB9IwsW0mQznccWww oQZFLYe9e4A7bOkWKR7TaNxb0JE 2012-08-06 11:19:31 71.35.150 9001 0'}, content = True)
+    content = valid_entry + b'\n' + malformed_entry + b'\n' + valid_entry
+
+    self.assertRaises(ValueError, RouterStatusTable, content, True)
+
+    table = RouterStatusTable(content)
+    self.assertEqual(2, len(table))
+    self.assertEqual([Flag.FAST, Flag.RUNNING], table.get_flags(1))
+
+    # values too large for our columns
+
+    for r_line in ('Konata ARIJF2zbqirB9IwsW0mQznccWww oQZFLYe9e4A7bOkWKR7TaNxb0JE 2012-08-06 11:19:31 71.35.150.29 70000 0', 'Konata ARIJF2zbqirB9IwsW0mQznccWww oQZFLYe9e4A7bOkWKR7TaNxb0JE 1812-08-06 11:19:31 71.35.150.29 9001 0'):
+      malformed_entry = get_router_status_entry_v3({'r': r_line}, content = True)
+      content = valid_entry + b'\n' + malformed_entry + b'\n' + valid_entry
+
+      self.assertRaises(ValueError, RouterStatusTable, content, True)
+      self.assertEqual(2, len(RouterStatusTable(content)))
+
+    content = self._content(('relay1', 'Fast', 'Bandwidth=100000000000000000000000'))
+    self.assertRaises(ValueError, RouterStatusTable, content, True)
+    self.assertEqual(0, RouterStatusTable(content).bandwidth[0])
+
+  def test_too_many_flags(self):
+    """
+    Includes more flags than we have bits for.
+    """
+
+    flags = ' '.join(['Flag%i' % index for index in range(40)])
+    content = self._content(('relay1', flags, 'Bandwidth=10'))
+
+    self.assertRaises(ValueError, RouterStatusTable, content, True)
+
+    table = RouterStatusTable(content)
+    self.assertEqual(1, len(table))
+    self.assertEqual(32, len(table.flag_bits))
+    self.assertTrue('Flag0' in table.get_flags(0))
+
+  def test_digest_column(self):
+    """
+    Looks up relays by their raw and hex fingerprints.
+    """
+
+    with open(get_resource('cached-consensus'), 'rb') as descriptor_file:
+      document = next(stem.descriptor.parse_file(descriptor_file, 'network-status-consensus-3 1.0', document_handler = DocumentHandler.DOCUMENT))
+
+    table = document.to_table()
+    fingerprints = [router.fingerprint for router in document.routers.values()]
+
+    self.assertEqual(180, len(table.fingerprint._digests))
+    self.assertEqual(fingerprints[-1], table.fingerprint[-1])
+    self.assertEqual(binascii.a2b_hex(fingerprints[3]), table.fingerprint.get_bytes(3))
+    self.assertEqual([router.digest for router in document.routers.values()], list(table.digest))
+
+    for index, fingerprint in enumerate(fingerprints):
+      self.assertEqual(index, table.fingerprint.index(fingerprint))
+      self.assertEqual(index, table.fingerprint.index(fingerprint.lower()))
+      self.assertEqual(index, table.fingerprint.index(binascii.a2b_hex(fingerprint)))
+
+    self.assertTrue(fingerprints[0] in table.fingerprint)
+    self.assertFalse('FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF' in table.fingerprint)
+    self.assertFalse('hello world' in table.fingerprint)
+    self.assertRaises(ValueError, table.fingerprint.index, 'FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF')
+    self.assertRaises(IndexError, table.fingerprint.get_bytes, 9)
+
+    self.assertEqual(0, len(DigestColumn()))
+    self.assertRaises(ValueError, DigestColumn, b'too short')
+
+  def _content(self, *relays):
+    entries = []
+
+    for nickname, flags, bandwidth in relays:
+      entries.append(get_router_status_entry_v3({
+        'r': '%s p1aag7VwarGxqctS7/fS0y5FU+s oQZFLYe9e4A7bOkWKR7TaNxb0JE 2012-08-06 11:19:31 71.35.150.29 9001 0' % nickname,
+        's': flags,
+        'w': bandwidth,
+      }, content = True))
+
+    return b'\n'.join(entries)
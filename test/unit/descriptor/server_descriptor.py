@@ -4,6 +4,7 @@ Unit tests for stem.descriptor.server_descriptor.
 
 import datetime
 import io
+import os
 import tarfile
 import unittest
 
@@ -148,6 +149,102 @@ Qlx9HNCqCY877ztFRC624ja2ql6A2hBcuoYMbkHjcQ4=
       self.assertEqual('Unnamed', descriptors[1].nickname)
       self.assertEqual('5366F1D198759F8894EA6E5FF768C667F59AFD24', descriptors[1].fingerprint)
 
+  def test_metrics_descriptor_multiple_with_mmap(self):
+    """
+    Memory maps a file with multiple server descriptors from metrics.
+    """
+
+    descriptor_path = get_resource('metrics_server_desc_multiple')
+    descriptors = list(stem.descriptor.parse_file(descriptor_path, 'server-descriptor 1.0', use_mmap = True))
+
+    self.assertEqual(2, len(descriptors))
+
+    self.assertEqual('anonion', descriptors[0].nickname)
+    self.assertEqual('9A5EC5BB866517E53962AF4D3E776536694B069E', descriptors[0].fingerprint)
+
+    self.assertEqual('Unnamed', descriptors[1].nickname)
+    self.assertEqual('5366F1D198759F8894EA6E5FF768C667F59AFD24', descriptors[1].fingerprint)
+
+    with open(descriptor_path, 'rb') as descriptor_file:
+      expected = list(stem.descriptor.parse_file(descriptor_file, 'server-descriptor 1.0'))
+
+    self.assertEqual([desc.get_bytes() for desc in expected], [desc.get_bytes() for desc in descriptors])
+    self.assertEqual([str(desc) for desc in expected], [str(desc) for desc in descriptors])
+    self.assertEqual([desc.digest() for desc in expected], [desc.digest() for desc in descriptors])
+    self.assertEqual([desc.platform for desc in expected], [desc.platform for desc in descriptors])
+    self.assertEqual([desc.contact for desc in expected], [desc.contact for desc in descriptors])
+
+  def test_metrics_descriptor_multiple_in_chunks(self):
+    """
+    Reads a file with multiple server descriptors a little at a time,
+    providing each descriptor without waiting for the rest of the file.
+    """
+
+    with open(get_resource('metrics_server_desc_multiple'), 'rb') as descriptor_file:
+      expected = list(stem.descriptor.parse_file(descriptor_file, 'server-descriptor 1.0'))
+      descriptor_file.seek(0)
+      content = descriptor_file.read()
+
+    for chunk_size in (1, 100, len(content)):
+      descriptor_file = io.BytesIO(content)
+      spans = stem.descriptor._SpanReader(descriptor_file, stem.descriptor.server_descriptor._descriptor_spans, chunk_size)
+      descriptors = []
+
+      for span_content, _, descriptor_start, descriptor_end in spans:
+        descriptors.append(span_content[descriptor_start:descriptor_end])
+
+        if chunk_size < len(content) and len(descriptors) == 1:
+          self.assertTrue(descriptor_file.tell() < len(content))
+
+      self.assertEqual([desc.get_bytes() for desc in expected], descriptors)
+      self.assertEqual(b'', spans.remainder.strip())
+
+  def test_metrics_descriptor_multiple_with_workers(self):
+    """
+    Parses a file with multiple server descriptors in a process pool.
+    """
+
+    descriptor_path = get_resource('metrics_server_desc_multiple')
+    expected = list(stem.descriptor.parse_file(descriptor_path, 'server-descriptor 1.0'))
+
+    for ordered in (True, False):
+      descriptors = list(stem.descriptor.parse_file(descriptor_path, 'server-descriptor 1.0', workers = 2, ordered = ordered))
+
+      if not ordered:
+        descriptors.sort(key = lambda desc: desc.nickname.lower())
+
+      self.assertEqual(['anonion', 'Unnamed'], [desc.nickname for desc in descriptors])
+      self.assertEqual([desc.fingerprint for desc in expected], [desc.fingerprint for desc in descriptors])
+      self.assertEqual([str(desc) for desc in expected], [str(desc) for desc in descriptors])
+      self.assertEqual([os.path.abspath(descriptor_path)] * 2, [desc.get_path() for desc in descriptors])
+
+  def test_metrics_descriptor_multiple_with_fields(self):
+    """
+    Only parses some attributes of server descriptors from metrics.
+    """
+
+    descriptor_path = get_resource('metrics_server_desc_multiple')
+    expected = list(stem.descriptor.parse_file(descriptor_path, 'server-descriptor 1.0'))
+
+    for validate in (True, False):
+      descriptors = list(stem.descriptor.parse_file(descriptor_path, 'server-descriptor 1.0', validate = validate, fields = ('fingerprint', 'published', 'exit_policy')))
+
+      self.assertEqual(2, len(descriptors))
+
+      for desc, expected_desc in zip(descriptors, expected):
+        self.assertEqual(expected_desc.fingerprint, desc.fingerprint)
+        self.assertEqual(expected_desc.published, desc.published)
+        self.assertEqual(expected_desc.exit_policy, desc.exit_policy)
+        self.assertEqual(expected_desc.digest(), desc.digest())
+
+        self.assertEqual(None, desc.nickname)
+        self.assertEqual(None, desc.platform)
+        self.assertEqual(None, desc.signing_key)
+
+    descriptors = list(stem.descriptor.parse_file(descriptor_path, 'server-descriptor 1.0', fields = ('nickname',)))
+    self.assertEqual(['anonion', 'Unnamed'], [desc.nickname for desc in descriptors])
+    self.assertEqual([None, None], [desc.exit_policy for desc in descriptors])
+
   def test_old_descriptor(self):
     """
     Parses a relay server descriptor from 2005.
@@ -189,10 +286,10 @@ Qlx9HNCqCY877ztFRC624ja2ql6A2hBcuoYMbkHjcQ4=
     # the initial contents for the line and parsed values.
 
     read_values_start = [20774, 489973, 510022, 511163, 20949]
-    self.assertEqual(read_values_start, desc.read_history_values[:5])
+    self.assertEqual(read_values_start, list(desc.read_history_values[:5]))
 
     write_values_start = [81, 8848, 8927, 8927, 83, 8848, 8931, 8929, 81, 8846]
-    self.assertEqual(write_values_start, desc.write_history_values[:10])
+    self.assertEqual(write_values_start, list(desc.write_history_values[:10]))
 
   def test_non_ascii_descriptor(self):
     """
@@ -434,6 +531,27 @@ Qlx9HNCqCY877ztFRC624ja2ql6A2hBcuoYMbkHjcQ4=
     desc = RelayDescriptor(desc_text, validate = False)
     self.assertEqual(b'', desc.platform)
 
+  def test_keyword_offsets(self):
+    """
+    Checks the line offsets we record when tokenizing, and that the attributes
+    we derive from them match what we'd get by searching our content.
+    """
+
+    desc_text = get_relay_server_descriptor({'opt contact': 'Damian <atagar AT torproject DOT org>'}, content = True)
+    desc = RelayDescriptor(desc_text, validate = False)
+    line_start, value_start, line_end = desc._offsets['contact']
+
+    self.assertEqual(b'opt contact Damian <atagar AT torproject DOT org>', desc_text[line_start:line_end])
+    self.assertEqual(b'Damian <atagar AT torproject DOT org>', desc.contact)
+    self.assertEqual(desc_text.find(b'router-signature\n'), desc._offsets['router-signature'][0])
+
+    unindexed_desc = RelayDescriptor(desc_text, validate = False)
+    unindexed_desc._offsets = None
+
+    self.assertEqual(unindexed_desc.contact, desc.contact)
+    self.assertEqual(unindexed_desc.platform, desc.platform)
+    self.assertEqual(unindexed_desc.digest(), desc.digest())
+
   def test_platform_for_node_tor(self):
     """
     Parse a platform line belonging to a node-Tor relay.
@@ -444,6 +562,27 @@ Qlx9HNCqCY877ztFRC624ja2ql6A2hBcuoYMbkHjcQ4=
     self.assertEqual(stem.version.Version('0.1.0'), desc.tor_version)
     self.assertEqual('Linux x86_64', desc.operating_system)
 
+  def test_shared_values(self):
+    """
+    Descriptors share a single copy of the values they commonly have in common.
+    """
+
+    platform = 'Tor 0.2.4.23 on ' + 'Linux x86_64'  # build the value so it isn't a constant
+    attr = {'platform': platform, 'protocols': 'Link 1 2 Circuit 1'}
+
+    first_desc = get_relay_server_descriptor(attr)
+    second_desc = get_relay_server_descriptor(attr)
+
+    self.assertEqual(b'Tor 0.2.4.23 on Linux x86_64', second_desc.platform)
+    self.assertTrue(first_desc.platform is second_desc.platform)
+    self.assertTrue(first_desc.operating_system is second_desc.operating_system)
+    self.assertTrue(first_desc.tor_version is second_desc.tor_version)
+    self.assertTrue(first_desc.link_protocols[0] is second_desc.link_protocols[0])
+
+    # though they're separate lists so modifying one doesn't change the other
+
+    self.assertFalse(first_desc.link_protocols is second_desc.link_protocols)
+
   def test_protocols_no_circuit_versions(self):
     """
     Constructs with a protocols line without circuit versions.
@@ -495,7 +634,7 @@ Qlx9HNCqCY877ztFRC624ja2ql6A2hBcuoYMbkHjcQ4=
 
       self.assertEqual(expected_end, attr[0])
       self.assertEqual(900, attr[1])
-      self.assertEqual(expected_values, attr[2])
+      self.assertEqual(expected_values, list(attr[2]))
 
   def test_read_history_empty(self):
     """
@@ -506,7 +645,7 @@ Qlx9HNCqCY877ztFRC624ja2ql6A2hBcuoYMbkHjcQ4=
     desc = get_relay_server_descriptor({'opt read-history': value})
     self.assertEqual(datetime.datetime(2005, 12, 17, 1, 23, 11), desc.read_history_end)
     self.assertEqual(900, desc.read_history_interval)
-    self.assertEqual([], desc.read_history_values)
+    self.assertEqual([], list(desc.read_history_values))
 
   @patch('stem.descriptor.server_descriptor.RelayDescriptor._verify_digest', Mock())
   def test_annotations(self):
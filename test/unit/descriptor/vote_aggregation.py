@@ -0,0 +1,136 @@
+"""
+Unit tests for stem.descriptor.vote_aggregation.
+"""
+
+import unittest
+
+from stem import Flag
+from stem.descriptor.networkstatus import NetworkStatusDocumentV3
+from stem.descriptor.vote_aggregation import aggregate_votes, known_flags
+
+from test.unit.descriptor import get_resource
+
+SUMKLEDI = '0013D22389CD50D0B784A3E4061CB31E8CE8CEB5'
+UNNAMED = '0045EB8B820DC410197B28B4C2F259A02E7C9D9B'
+ANONIONROUTER = '00786E43CCC5409753F25E36031C5CEA6EA43702'
+PORNOSTEFFI = '009AE464B34020C462EC9DD0E68B35881253337F'
+
+
+class TestVoteAggregation(unittest.TestCase):
+  def setUp(self):
+    with open(get_resource('vote'), 'rb') as vote_file:
+      self.content = vote_file.read()
+
+  def _vote(self, *replacements):
+    content = self.content
+
+    for old, new in replacements:
+      if old not in content:
+        self.fail('%s is not in our vote' % old)
+
+      content = content.replace(old, new)
+
+    return NetworkStatusDocumentV3(content)
+
+  def _without_pornosteffi(self):
+    start = self.content.find(b'r pornosteffi')
+    return (self.content[start:self.content.find(b'directory-footer')], b'')
+
+  def test_single_vote(self):
+    """
+    Aggregates a single vote, which only includes the running relays.
+    """
+
+    vote = self._vote()
+    consensus = aggregate_votes([vote])
+
+    self.assertEqual([UNNAMED, ANONIONROUTER, PORNOSTEFFI], list(consensus.fingerprint))
+    self.assertEqual(['Unnamed', 'ANONIONROUTER', 'pornosteffi'], consensus.nickname)
+    self.assertEqual([Flag.FAST, Flag.HSDIR, Flag.RUNNING, Flag.V2DIR, Flag.VALID], consensus.get_flags(0))
+    self.assertEqual(vote.routers[UNNAMED].digest, consensus.digest[0])
+    self.assertEqual('Tor 0.2.2.37', consensus.version_line[0])
+
+    # a single measurement isn't enough, so we use the claimed bandwidth
+
+    self.assertEqual([92, 196, 32], list(consensus.bandwidth))
+    self.assertEqual([0, 0, 0], list(consensus.measured))
+
+    # votes can be either documents or tables
+
+    table_consensus = aggregate_votes([vote.to_table()])
+    self.assertEqual([consensus.get_row(index) for index in range(3)], [table_consensus.get_row(index) for index in range(3)])
+
+  def test_majority(self):
+    """
+    Includes relays listed by the majority of authorities, and takes the median
+    of their bandwidth measurements.
+    """
+
+    votes = [
+      self._vote(),
+      self._vote((b's Exit Valid', b's Exit Running Valid'), (b'Measured=36', b'Measured=50'), self._without_pornosteffi()),
+      self._vote((b's Exit Valid', b's Exit Running Valid'), (b'Measured=36', b'Measured=10')),
+    ]
+
+    consensus = aggregate_votes(votes)
+
+    self.assertEqual([SUMKLEDI, UNNAMED, ANONIONROUTER, PORNOSTEFFI], list(consensus.fingerprint))
+    self.assertEqual([Flag.EXIT, Flag.RUNNING, Flag.VALID], consensus.get_flags(0))
+    self.assertEqual([36, 15, 100, 32], list(consensus.bandwidth))
+    self.assertEqual([36, 15, 100, 0], list(consensus.measured))
+
+    # relays need to be listed by more than half of the authorities
+
+    consensus = aggregate_votes(votes, authority_count = 5)
+    self.assertEqual([SUMKLEDI, UNNAMED, ANONIONROUTER], list(consensus.fingerprint))
+
+    consensus = aggregate_votes(votes, authority_count = 7)
+    self.assertEqual(0, len(consensus))
+
+    # low median of the claimed bandwidth if there's too few measurements
+
+    consensus = aggregate_votes([votes[0], self._vote((b'Bandwidth=92', b'Bandwidth=80'))])
+    self.assertEqual(80, consensus.bandwidth[0])
+
+  def test_known_flags(self):
+    """
+    Flags are assigned by the majority of votes that know about them.
+    """
+
+    without_hsdir = self._vote((b's Fast HSDir Running V2Dir Valid', b's Fast Running V2Dir Valid'))
+    unaware_of_hsdir = self._vote((b' HSDir Running', b' Running'))
+
+    self.assertEqual(['Authority', 'BadExit', 'Exit', 'Fast', 'Guard', 'Running', 'Stable', 'V2Dir', 'Valid'], known_flags([unaware_of_hsdir]))
+    self.assertEqual(['Authority', 'BadExit', 'Exit', 'Fast', 'Guard', 'HSDir', 'Running', 'Stable', 'V2Dir', 'Valid'], known_flags([self._vote(), unaware_of_hsdir]))
+
+    consensus = aggregate_votes([self._vote(), without_hsdir, unaware_of_hsdir])
+    self.assertFalse(Flag.HSDIR in consensus.get_flags(0))
+
+    consensus = aggregate_votes([self._vote(), unaware_of_hsdir])
+    self.assertTrue(Flag.HSDIR in consensus.get_flags(0))
+
+  def test_ties(self):
+    """
+    Ties go to the most recently published descriptor and latest version.
+    """
+
+    updated = self._vote((b'2012-07-11 10:47:26 79.139.135.90', b'2012-07-11 11:47:26 79.139.135.92'), (b'Tor 0.2.2.37\nw Bandwidth=92', b'Tor 0.2.3.10-alpha\nw Bandwidth=92'))
+
+    for votes in ([self._vote(), updated], [updated, self._vote()]):
+      row = aggregate_votes(votes).get_row(0)
+
+      self.assertEqual(1342007246, row['published'])
+      self.assertEqual(1334544220, row['address'])  # 79.139.135.92
+      self.assertEqual('Tor 0.2.3.10-alpha', row['version_line'])
+
+  def test_invalid_votes(self):
+    """
+    Provides things that can't be aggregated.
+    """
+
+    with open(get_resource('cached-consensus'), 'rb') as consensus_file:
+      consensus = NetworkStatusDocumentV3(consensus_file.read())
+
+    self.assertRaises(ValueError, aggregate_votes, [])
+    self.assertRaises(ValueError, aggregate_votes, [consensus])
+    self.assertRaises(ValueError, aggregate_votes, [self._vote(), 'hello world'])
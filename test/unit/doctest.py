@@ -8,6 +8,7 @@ import doctest
 import os
 import unittest
 
+import stem.descriptor.extrainfo_descriptor
 import stem.descriptor.router_status_entry
 import stem.util.connection
 import stem.util.str_tools
@@ -49,6 +50,12 @@ class TestDocumentation(unittest.TestCase):
           '_base64_to_hex': stem.descriptor.router_status_entry._base64_to_hex,
         }
 
+        test_run = doctest.testfile(path, **args)
+      elif path.endswith('/stem/descriptor/extrainfo_descriptor.py'):
+        args['globs'] = {
+          'resample_history': stem.descriptor.extrainfo_descriptor.resample_history,
+        }
+
         test_run = doctest.testfile(path, **args)
       elif path.endswith('/stem/util/connection.py'):
         args['globs'] = {
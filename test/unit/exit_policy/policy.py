@@ -8,6 +8,8 @@ import unittest
 from stem.exit_policy import (
   DEFAULT_POLICY_RULES,
   get_config_policy,
+  get_shared_policy,
+  get_shared_micro_policy,
   ExitPolicy,
   MicroExitPolicy,
   ExitPolicyRule,
@@ -286,6 +288,34 @@ class TestExitPolicy(unittest.TestCase):
     for test_input in test_inputs:
       self.assertRaises(ValueError, get_config_policy, test_input)
 
+  def test_shared_policies(self):
+    """
+    Checks that policies with the same rules are the same instance.
+    """
+
+    policy = get_shared_policy('accept *:80', 'accept *:443', 'reject *:*')
+
+    self.assertTrue(policy is get_shared_policy(' accept *:80', b'accept *:443', 'reject *:* '))
+    self.assertFalse(policy is get_shared_policy('accept *:80', 'reject *:*'))
+    self.assertEqual(ExitPolicy('accept *:80', 'accept *:443', 'reject *:*'), policy)
+    self.assertTrue(policy.can_exit_to('74.125.28.106', 443))
+
+    # rules can only be strings
+
+    self.assertRaises(TypeError, get_shared_policy, 'accept *:80', ExitPolicyRule('reject *:*'))
+
+    micro_policy = get_shared_micro_policy('accept 80,443')
+
+    self.assertTrue(micro_policy is get_shared_micro_policy('accept 80,443'))
+    self.assertFalse(micro_policy is get_shared_micro_policy('accept 80'))
+    self.assertEqual(MicroExitPolicy('accept 80,443'), micro_policy)
+    self.assertRaises(ValueError, get_shared_micro_policy, 'accept 80,,443')
+
+    # exit policies and microdescriptor policies of the same string differ
+
+    self.assertFalse(get_shared_policy('reject 1-65535') is get_shared_micro_policy('reject 1-65535'))
+    self.assertTrue(isinstance(get_shared_micro_policy('reject 1-65535'), MicroExitPolicy))
+
   def test_pickleability(self):
     """
     Checks that we can unpickle ExitPolicy instances.